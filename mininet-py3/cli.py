@@ -25,38 +25,70 @@ list all nodes ('nodes'), to print out the network topology
 and bandwidth ('iperf'.)
 """
 
-from subprocess import call
+from subprocess import call, STDOUT
 from cmd import Cmd
 from os import isatty
 from select import poll, POLLIN
 import sys
 import time
 import os
+import re
+import json
 import atexit
+import threading
+from fnmatch import fnmatch
 
 from mininet.log import info, output, error
 from mininet.term import makeTerms, runX11
 from mininet.util import ( quietRun, dumpNodeConnections,
-                           dumpPorts )
+                           dumpPorts, waitListening )
+from mininet.counters import CounterCollector
+from mininet.profiling import profilers, report
+
+# Node commands that may change interface addresses, which invalidate the
+# IP cache of the CLI.
+
+addressCmds = re.compile( r'\b(ifconfig|ip|dhclient|udhcpc|ifup|ifdown)\b' )
 
 class CLI( Cmd ):
     "Simple command-line interface to talk to nodes."
 
     prompt = 'opennet> '
 
-    def __init__( self, mininet, stdin=sys.stdin, script=None ):
+    # Processes run at once by concurrent commands (ppingall, trafficmatrix):
+    # every one of them generates traffic the realtime simulator must keep up with.
+    concurrency = 16
+
+    # Characters read at once from node output
+    readSize = 65536
+
+    def __init__( self, mininet, stdin=sys.stdin, script=None, batch=None ):
         """Start and run interactive or batch mode CLI
            mininet: Mininet network object
            stdin: standard input for CLI
-           script: script to run in batch mode"""
+           script: script to run in batch mode
+           batch: relay node output without forwarding stdin to nodes
+           (default: when stdin is not a tty)"""
         self.mn = mininet
         # Local variable bindings for py command
         self.locals = { 'net': mininet }
+        # Default IP address of nodes, by name, for node name substitution
+        self.ipCache = {}
         # Attempt to handle input
         self.stdin = stdin
         self.inPoller = poll()
         self.inPoller.register( stdin )
         self.inputFile = script
+        self.batch = not self.isatty() if batch is None else batch
+        # Pollers of waitForNode, by node and mode
+        self.relayPollers = {}
+        # Set to stop the background refresh of simstat watch
+        self.simstatStop = None
+        # Session recording file and start time, see do_record
+        self.recording = None
+        self.recordStart = 0
+        # Nesting depth of onecmd(), only top level commands are recorded
+        self.cmdDepth = 0
         Cmd.__init__( self )
         info( '*** Starting CLI:\n' )
 
@@ -109,6 +141,27 @@ class CLI( Cmd ):
                     pass
                 # pylint: enable=broad-except
 
+    # Commands which are not recorded
+    unrecorded = ( 'record', 'replay', 'exit', 'quit', 'EOF' )
+
+    def onecmd( self, line ):
+        """Run a command line. While recording, log top level commands with
+           their start time and elapsed time."""
+        line = line.strip()
+        record = ( self.recording is not None and not self.cmdDepth and
+                   line and line.split()[ 0 ] not in self.unrecorded )
+        start = time.time()
+        self.cmdDepth += 1
+        try:
+            return Cmd.onecmd( self, line )
+        finally:
+            self.cmdDepth -= 1
+            if record:
+                self.recording.write( json.dumps(
+                    { 'time': start - self.recordStart,
+                      'elapsed': time.time() - start, 'cmd': line } ) + '\n' )
+                self.recording.flush()
+
     def emptyline( self ):
         "Don't repeat last command when you hit return."
         pass
@@ -134,7 +187,11 @@ class CLI( Cmd ):
         'noecho:\n'
         '  mininet> noecho h2 vi foo.py\n'
         'However, starting up an xterm/gterm is generally better:\n'
-        '  mininet> xterm h2\n\n'
+        '  mininet> xterm h2\n'
+        '\n'
+        'A command can be run on many nodes at once with par:\n'
+        '  mininet> par h* ping -c1 h1\n'
+        'Its output per node is then available to py as par.\n\n'
     )
 
     def do_help( self, line ):
@@ -168,6 +225,8 @@ class CLI( Cmd ):
     def do_py( self, line ):
         """Evaluate a Python expression.
            Node names may be used, e.g.: py h1.cmd('ls')"""
+        # Python code may change anything, including addresses
+        self.ipCache.clear()
         try:
             result = eval( line, globals(), self.getLocals() )
             if not result:
@@ -185,6 +244,7 @@ class CLI( Cmd ):
     def do_px( self, line ):
         """Execute a Python statement.
             Node names may be used, e.g.: px print h1.cmd('ls')"""
+        self.ipCache.clear()
         try:
             exec( line, globals(), self.getLocals() )
         except Exception as e:
@@ -208,6 +268,111 @@ class CLI( Cmd ):
         "Ping between first two hosts, returns all ping results."
         self.mn.pingPairFull()
 
+    def do_ppingall( self, line ):
+        """Ping between all hosts, running pings concurrently.
+           Usage: ppingall [-j jobs] [-c count] [-W timeout]
+           jobs: pings running at once (default: CLI.concurrency)"""
+        args = line.split()
+        try:
+            opts = popOptions( args, { 'j': self.concurrency, 'c': 1,
+                                       'W': 1 } )
+            if opts[ 'j' ] < 1:
+                raise ValueError( 'jobs must be at least 1' )
+        except ValueError as e:
+            error( '%s\nusage: ppingall [-j jobs] [-c count] '
+                   '[-W timeout]\n' % e )
+            return
+        hosts = [ host for host in self.mn.hosts if host.intfs ]
+        jobs = [ ( ( src, dst ), src,
+                   [ 'ping', '-c', str( opts[ 'c' ] ),
+                     '-W', str( opts[ 'W' ] ), dst.IP() ] )
+                 for src in hosts for dst in hosts if src != dst ]
+        output( '*** Ping: testing ping reachability, %d pings, %d at once\n'
+                % ( len( jobs ), opts[ 'j' ] ) )
+        start = time.time()
+        results = runConcurrently( jobs, opts[ 'j' ] )
+        elapsed = time.time() - start
+        sent = received = 0
+        for src in hosts:
+            output( '%s -> ' % src.name )
+            for dst in hosts:
+                if src != dst:
+                    pingSent, pingReceived = parsePing(
+                        results[ ( src, dst ) ] )
+                    sent += pingSent
+                    received += pingReceived
+                    output( ( '%s ' % dst.name ) if pingReceived else 'X ' )
+            output( '\n' )
+        if sent:
+            output( '*** Results: %i%% dropped (%d/%d received) in %.1fs\n' %
+                    ( 100.0 * ( sent - received ) / sent, received, sent,
+                      elapsed ) )
+        else:
+            output( '*** Warning: No packets sent\n' )
+
+    def do_trafficmatrix( self, line ):
+        """Run iperf between many pairs of hosts concurrently.
+           Usage: trafficmatrix [-u bw] [-t seconds] [-j jobs] [src dst ...]
+           bw: UDP target bandwidth, e.g. 10M (default: TCP)
+           jobs: clients running at once (default: CLI.concurrency)
+           Without pairs, every host sends to the next one."""
+        args = line.split()
+        try:
+            opts = popOptions( args, { 'u': '', 't': 5,
+                                       'j': self.concurrency } )
+            if opts[ 'j' ] < 1:
+                raise ValueError( 'jobs must be at least 1' )
+        except ValueError as e:
+            error( '%s\nusage: trafficmatrix [-u bw] [-t seconds] '
+                   '[-j jobs] [src dst ...]\n' % e )
+            return
+        for arg in args:
+            if arg not in self.mn:
+                error( "node '%s' not in network\n" % arg )
+                return
+        if len( args ) % 2:
+            error( 'trafficmatrix expects pairs of hosts: src dst\n' )
+            return
+        if args:
+            nodes = [ self.mn[ arg ] for arg in args ]
+            pairs = list( zip( nodes[ ::2 ], nodes[ 1::2 ] ) )
+        else:
+            hosts = self.mn.hosts
+            pairs = [ ( src, hosts[ ( i + 1 ) % len( hosts ) ] )
+                      for i, src in enumerate( hosts ) if len( hosts ) > 1 ]
+        iperfArgs = [ 'iperf', '-p', '5001', '-f', 'm' ]
+        if opts[ 'u' ]:
+            iperfArgs += [ '-u' ]
+        servers = []
+        for dst in set( dst for _src, dst in pairs ):
+            servers.append( dst.popen( iperfArgs + [ '-s' ] ) )
+        try:
+            if not opts[ 'u' ]:
+                # Probe each server from a client of its own.
+                clients = dict( ( dst, src ) for src, dst in pairs )
+                for dst, src in clients.items():
+                    waitListening( src, dst.IP(), 5001, timeout=5 )
+            bwArgs = [ '-b', opts[ 'u' ] ] if opts[ 'u' ] else []
+            jobs = [ ( ( src, dst ), src,
+                       iperfArgs + [ '-t', str( opts[ 't' ] ), '-c',
+                                     dst.IP() ] + bwArgs )
+                     for src, dst in pairs ]
+            output( '*** Iperf: %d %s flows, %d at once\n' %
+                    ( len( jobs ), 'UDP' if opts[ 'u' ] else 'TCP',
+                      opts[ 'j' ] ) )
+            results = runConcurrently( jobs, opts[ 'j' ] )
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+        total = 0.0
+        output( '%-10s %-10s %12s\n' % ( 'src', 'dst', 'Mbits/sec' ) )
+        for src, dst in pairs:
+            mbps = parseIperf( results[ ( src, dst ) ] )
+            total += mbps
+            output( '%-10s %-10s %12.2f\n' % ( src.name, dst.name, mbps ) )
+        output( '%-21s %12.2f\n' % ( 'total', total ) )
+
     def do_iperf( self, line ):
         """Simple iperf TCP test between two (optionally specified) hosts.
            Usage: iperf node1 node2"""
@@ -271,6 +436,7 @@ class CLI( Cmd ):
             error( 'invalid type: link end1 end2 [up down]\n' )
         else:
             self.mn.configLinkStatus( *args )
+            self.ipCache.clear()
 
     def do_xterm( self, line, term='xterm' ):
         """Spawn xterm(s) for the given node(s).
@@ -350,6 +516,77 @@ class CLI( Cmd ):
         self.inputFile.close()
         self.inputFile = None
 
+    def do_record( self, line ):
+        """Record the commands of this session, with their start time and
+           elapsed time, one JSON object per line, for replay.
+           Usage: record <file> | record stop"""
+        args = line.split()
+        if len( args ) != 1:
+            error( 'usage: record <file> | record stop\n' )
+            return
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
+        if args[ 0 ] != 'stop':
+            try:
+                self.recording = open( args[ 0 ], 'w' )
+            except IOError as e:
+                error( 'cannot record to %s: %s\n' % ( args[ 0 ], e ) )
+                return
+            self.recordStart = time.time()
+
+    def do_replay( self, line ):
+        """Replay a recorded session and print the elapsed time of each
+           command, recorded and replayed.
+           Usage: replay [-f] [-o report] <file>
+           -f: run commands as fast as possible instead of at their
+           recorded times
+           report: write the replay timings, in the recording format with
+           the recorded elapsed time added, e.g. to compare versions"""
+        args = line.split()
+        try:
+            opts = popOptions( args, { 'f': False, 'o': '' } )
+        except ValueError as e:
+            error( '%s\nusage: replay [-f] [-o report] <file>\n' % e )
+            return
+        if len( args ) != 1:
+            error( 'usage: replay [-f] [-o report] <file>\n' )
+            return
+        try:
+            with open( args[ 0 ] ) as f:
+                commands = [ json.loads( l ) for l in f if l.strip() ]
+        except ( IOError, ValueError ) as e:
+            error( 'cannot read recording %s: %s\n' % ( args[ 0 ], e ) )
+            return
+        results = []
+        replayStart = time.time()
+        for command in commands:
+            if not opts[ 'f' ]:
+                delay = command[ 'time' ] - ( time.time() - replayStart )
+                if delay > 0:
+                    time.sleep( delay )
+            start = time.time()
+            self.onecmd( command[ 'cmd' ] )
+            results.append( { 'time': start - replayStart,
+                              'elapsed': time.time() - start,
+                              'recorded': command[ 'elapsed' ],
+                              'cmd': command[ 'cmd' ] } )
+        output( '%4s %12s %12s %7s  %s\n' %
+                ( '#', 'recorded s', 'replay s', 'ratio', 'command' ) )
+        for i, result in enumerate( results ):
+            ratio = ( result[ 'elapsed' ] / result[ 'recorded' ]
+                      if result[ 'recorded' ] > 0 else 0 )
+            output( '%4d %12.6f %12.6f %7.2f  %s\n' %
+                    ( i, result[ 'recorded' ], result[ 'elapsed' ], ratio,
+                      result[ 'cmd' ] ) )
+        output( '%4s %12.6f %12.6f\n' %
+                ( 'sum', sum( r[ 'recorded' ] for r in results ),
+                  sum( r[ 'elapsed' ] for r in results ) ) )
+        if opts[ 'o' ]:
+            with open( opts[ 'o' ], 'w' ) as f:
+                for result in results:
+                    f.write( json.dumps( result ) + '\n' )
+
     def do_dpctl( self, line ):
         """Run dpctl (or ovs-ofctl) command on all switches.
            Usage: dpctl command [arg1] [arg2] ..."""
@@ -368,11 +605,207 @@ class CLI( Cmd ):
         elapsed = time.time() - start
         self.stdout.write("*** Elapsed time: %0.6f secs\n" % elapsed)
 
+    def do_profile( self, line ):
+        """Run a command under a profiler, then print where its time went
+           (ns-3, node shells, Python) and its top functions.
+           Usage: profile [-m cprofile|sample] [-n top] [-o file] command
+           file: write the profile (pstats file, or collapsed stacks with
+           -m sample)"""
+        args = line.split()
+        try:
+            opts = popOptions( args, { 'm': 'cprofile', 'n': 20, 'o': '' } )
+        except ValueError as e:
+            error( '%s\nusage: profile [-m cprofile|sample] [-n top] '
+                   '[-o file] command\n' % e )
+            return
+        if opts[ 'm' ] not in profilers or not args:
+            error( 'usage: profile [-m %s] [-n top] [-o file] command\n' %
+                   '|'.join( profilers ) )
+            return
+        profiler = profilers[ opts[ 'm' ] ]()
+        with profiler:
+            self.onecmd( ' '.join( args ) )
+        output( report( profiler, opts[ 'n' ] ) )
+        if opts[ 'o' ]:
+            profiler.dump( opts[ 'o' ] )
+            output( '*** Profile written to %s\n' % opts[ 'o' ] )
+
     def do_links( self, _line ):
         "Report on links"
         for link in self.mn.links:
             print(link, link.status())
 
+    def do_rates( self, line ):
+        """Show interface rates measured over an interval.
+           Counters are read once per network namespace.
+           Usage: rates [interval] [node ...]"""
+        args = line.split()
+        interval = 1.0
+        if args and args[ 0 ] not in self.mn:
+            try:
+                interval = float( args.pop( 0 ) )
+            except ValueError:
+                error( 'invalid interval: rates [interval] [node ...]\n' )
+                return
+        for arg in args:
+            if arg not in self.mn:
+                error( 'invalid node: %s\n' % arg )
+                return
+        nodes = [ self.mn[ arg ] for arg in args ] or self.mn.values()
+        intfs = [ intf for node in nodes for intf in node.intfList()
+                  if intf.name != 'lo' ]
+        collector = CounterCollector( intfs=intfs )
+        rates = collector.measure( interval )
+        output( '%-16s %10s %10s %10s %10s %9s %9s\n' %
+                ( 'interface', 'rx Mbit/s', 'tx Mbit/s', 'rx pkt/s',
+                  'tx pkt/s', 'rx drop/s', 'tx drop/s' ) )
+        for name, row in zip( collector.names, rates ):
+            rxB, rxP, rxD, txB, txP, txD = row
+            output( '%-16s %10.3f %10.3f %10.0f %10.0f %9.0f %9.0f\n' %
+                    ( name, rxB * 8e-6, txB * 8e-6, rxP, txP, rxD, txD ) )
+
+    def do_par( self, line ):
+        """Run a command on many nodes concurrently and print the output
+           of each node. Node names in the command are replaced with IP
+           addresses, and the output per node is left in the py variable par.
+           Usage: par <nodes> cmd {args}
+           nodes: comma separated node name globs and node types
+           (hosts, switches, controllers), e.g. h*,s1 or hosts"""
+        args = line.split( None, 1 )
+        if len( args ) != 2:
+            error( 'usage: par <nodes> cmd {args}\n' )
+            return
+        nodes = self.selectNodes( args[ 0 ] )
+        if not nodes:
+            error( 'no node matches %s\n' % args[ 0 ] )
+            return
+        outputs = self.fanOut( nodes, self.substituteIPs( args[ 1 ] ) )
+        if addressCmds.search( args[ 1 ] ):
+            self.ipCache.clear()
+        for node in nodes:
+            output( '*** ' + node.name + ' ' + ( '-' * 72 ) + '\n' )
+            output( outputs[ node.name ] )
+        self.locals[ 'par' ] = outputs
+
+    def selectNodes( self, selector ):
+        """Return the nodes matching a selector, in network order.
+           selector: comma separated node name globs and node types"""
+        types = { 'hosts': self.mn.hosts, 'switches': self.mn.switches,
+                  'controllers': self.mn.controllers }
+        selected = set()
+        for pattern in selector.split( ',' ):
+            if pattern in types:
+                selected.update( types[ pattern ] )
+            else:
+                selected.update( node for node in self.mn.values()
+                                 if fnmatch( node.name, pattern ) )
+        return [ node for node in self.mn.values() if node in selected ]
+
+    def fanOut( self, nodes, cmd ):
+        """Send a command to many nodes and wait for all of them, reading
+           their output with a single poll loop.
+           nodes: list of nodes, whose shells must be idle
+           cmd: command string
+           returns: dict mapping node names to outputs"""
+        outputs = dict( ( node.name, '' ) for node in nodes )
+        fdToNode = {}
+        poller = poll()
+        for node in nodes:
+            node.sendCmd( cmd )
+            fdToNode[ node.stdout.fileno() ] = node
+            poller.register( node.stdout, POLLIN )
+        waiting = set( nodes )
+        while waiting:
+            try:
+                # Output may already be buffered in a node, without its
+                # fd being readable.
+                buffered = [ node for node in waiting if node.readbuf ]
+                ready = [ fdToNode[ fd ] for fd, _event in
+                          poller.poll( 0 if buffered else None ) ]
+                for node in set( buffered + ready ):
+                    outputs[ node.name ] += node.monitor( timeoutms=0 )
+                    if not node.waiting:
+                        waiting.discard( node )
+                        poller.unregister( node.stdout )
+            except KeyboardInterrupt:
+                for node in waiting:
+                    node.sendInt()
+        return outputs
+
+    def substituteIPs( self, line ):
+        """Replace node names in a command line with IP addresses.
+           If nodeIP() returns None, then use node name"""
+        return ' '.join( self.nodeIP( arg ) or arg if arg in self.mn else arg
+                         for arg in line.split( ' ' ) )
+
+    def nodeIP( self, name ):
+        """Return the IP address of the default interface of a node.
+           updateIP() runs a command in the node, so addresses are cached
+           until a command that may change them (link, switch, py, px, or a
+           node command matching addressCmds) clears the cache."""
+        if name not in self.ipCache:
+            self.ipCache[ name ] = self.mn[ name ].defaultIntf().updateIP()
+        return self.ipCache[ name ]
+
+    def do_ipcache( self, line ):
+        """Show or clear the IP addresses cached for node name substitution.
+           Usage: ipcache [clear]"""
+        if line.strip() == 'clear':
+            self.ipCache.clear()
+        elif line.strip():
+            error( 'usage: ipcache [clear]\n' )
+        else:
+            for name in sorted( self.ipCache ):
+                output( '%s: %s\n' % ( name, self.ipCache[ name ] ) )
+
+    def do_simstat( self, line ):
+        """Show simulator health: realtime lateness, simulator CPU load,
+           events per second, packet and drop rates of each segment and
+           TBIntf link states, measured over interval seconds (default 1).
+           Lateness and CPU load need ns3.start( realtimeProbe=True ).
+           With watch, refresh every interval seconds in the background
+           while the CLI stays usable, until simstat stop.
+           Usage: simstat [interval] | simstat watch [interval] | simstat stop"""
+        args = line.split()
+        watch = bool( args ) and args[ 0 ] == 'watch'
+        if watch:
+            args.pop( 0 )
+        elif args == [ 'stop' ]:
+            if self.simstatStop:
+                self.simstatStop.set()
+                self.simstatStop = None
+            return
+        try:
+            interval = float( args[ 0 ] ) if args else 1.0
+        except ValueError:
+            error( 'usage: simstat [interval] | simstat watch [interval] | '
+                   'simstat stop\n' )
+            return
+        try:
+            from mininet import ns3
+        except ImportError as e:
+            error( 'simstat needs the ns-3 bindings: %s\n' % e )
+            return
+        if not watch:
+            previous = ns3.simStats()
+            time.sleep( interval )
+            output( formatSimStats( ns3.simStats( previous ) ) )
+            return
+        if self.simstatStop:
+            self.simstatStop.set()
+        self.simstatStop = stop = threading.Event()
+
+        def refresh():
+            "Print simulator health every interval seconds until stopped."
+            previous = ns3.simStats()
+            while not stop.wait( interval ):
+                previous = ns3.simStats( previous )
+                output( '\n' + formatSimStats( previous ) )
+
+        thread = threading.Thread( target=refresh )
+        thread.daemon = True
+        thread.start()
+
     def do_switch( self, line ):
         "Starts or stops a switch"
         args = line.split()
@@ -394,6 +827,7 @@ class CLI( Cmd ):
             else:
                 error( 'invalid command: '
                        'switch <switch name> {start, stop}\n' )
+            self.ipCache.clear()
 
     def default( self, line ):
         """Called on an input line when the command prefix is not recognized.
@@ -408,49 +842,49 @@ class CLI( Cmd ):
                 print("*** Enter a command for node: %s <cmd>" % first)
                 return
             node = self.mn[ first ]
-            rest = args.split( ' ' )
             # Substitute IP addresses for node names in command
-            # If updateIP() returns None, then use node name
-            rest = [ self.mn[ arg ].defaultIntf().updateIP() or arg
-                     if arg in self.mn else arg
-                     for arg in rest ]
-            rest = ' '.join( rest )
+            rest = self.substituteIPs( args )
             # Run cmd on node:
             node.sendCmd( rest )
             self.waitForNode( node )
+            if addressCmds.search( args ):
+                self.ipCache.clear()
         else:
             error( '*** Unknown command: %s\n' % line )
 
     def waitForNode( self, node ):
-        "Wait for a node to finish, and print its output."
-        # Pollers
-        nodePoller = poll()
-        nodePoller.register( node.stdout )
-        bothPoller = poll()
-        bothPoller.register( self.stdin, POLLIN )
-        bothPoller.register( node.stdout, POLLIN )
-        if self.isatty():
+        """Wait for a node to finish, and print its output.
+           Output is relayed in large reads. Unless in batch mode (or
+           running a script), stdin is forwarded to the node."""
+        batch = self.batch or self.inputFile is not None
+        poller = self.relayPollers.get( ( node, batch ) )
+        if poller is None:
+            poller = poll()
+            poller.register( node.stdout, POLLIN )
+            if not batch:
+                poller.register( self.stdin, POLLIN )
+            self.relayPollers[ ( node, batch ) ] = poller
+        nodeFd = node.stdout.fileno()
+        stdinFd = self.stdin.fileno()
+        if not batch and self.isatty():
             # Buffer by character, so that interactive
             # commands sort of work
             quietRun( 'stty -icanon min 1' )
-        while True:
+        while node.waiting:
             try:
-                bothPoller.poll()
-                # XXX BL: this doesn't quite do what we want.
-                if False and self.inputFile:
-                    key = self.inputFile.read( 1 )
-                    if key is not '':
-                        node.write( key )
-                    else:
-                        self.inputFile = None
-                if isReadable( self.inPoller ):
-                    key = self.stdin.read( 1 )
-                    node.write( key )
-                if isReadable( nodePoller ):
-                    data = node.monitor()
-                    output( data )
-                if not node.waiting:
-                    break
+                # Output may already be buffered in the node.
+                ready = ( [ ( nodeFd, POLLIN ) ] if node.readbuf
+                          else poller.poll() )
+                for fd, _event in ready:
+                    if fd == stdinFd:
+                        data = os.read( stdinFd, 4096 )
+                        if data:
+                            node.write( data.decode( errors='replace' ) )
+                        else:
+                            # End of input: stop polling it
+                            poller.unregister( stdinFd )
+                    elif fd == nodeFd:
+                        output( readOutput( node, self.readSize ) )
             except KeyboardInterrupt:
                 # There is an at least one race condition here, since
                 # it's possible to interrupt ourselves after we've
@@ -466,6 +900,120 @@ class CLI( Cmd ):
 
 # Helper functions
 
+def popOptions( args, defaults ):
+    """Remove -x value options from a list of arguments.
+       args: list of arguments, modified in place
+       defaults: dict mapping option letters to default values; options are
+       converted to the type of their default, options defaulting to False
+       are flags without value
+       returns: dict of option values"""
+    opts = dict( defaults )
+    while args and args[ 0 ].startswith( '-' ) and args[ 0 ][ 1: ] in opts:
+        if defaults[ args[ 0 ][ 1: ] ] is False:
+            opts[ args.pop( 0 )[ 1: ] ] = True
+            continue
+        if len( args ) < 2:
+            raise ValueError( 'missing value for %s' % args[ 0 ] )
+        key = args.pop( 0 )[ 1: ]
+        opts[ key ] = type( defaults[ key ] )( args.pop( 0 ) )
+    return opts
+
+def parsePing( pingOutput ):
+    """Parse the summary of a ping run.
+       returns: ( packets sent, packets received ), ( 1, 0 ) when the
+       destination was unreachable or the output has no summary"""
+    if re.search( r'[uU]nreachable', pingOutput ):
+        return 1, 0
+    m = re.search( r'(\d+) packets transmitted, (\d+)( packets)? received',
+                   pingOutput )
+    if m is None:
+        error( '*** Error: could not parse ping output: %s\n' % pingOutput )
+        return 1, 0
+    return int( m.group( 1 ) ), int( m.group( 2 ) )
+
+def parseIperf( iperfOutput ):
+    """Parse the bandwidth reported last by an iperf run with -f m.
+       returns: Mbits/sec, 0 when the output has no bandwidth"""
+    m = re.findall( r'([\d\.]+) Mbits/sec', iperfOutput )
+    if not m:
+        error( 'could not parse iperf output: %s\n' % iperfOutput )
+        return 0.0
+    return float( m[ -1 ] )
+
+def runConcurrently( jobs, limit ):
+    """Run commands in nodes, at most limit of them at once, and gather their
+       output with a single poll loop.
+       jobs: list of ( key, node, cmd ) tuples, cmd being a list
+       limit: maximum number of processes running at once
+       returns: dict mapping each key to the output (stdout and stderr)"""
+    pending = list( reversed( jobs ) )
+    running = {}
+    outputs = {}
+    poller = poll()
+    while pending or running:
+        while pending and len( running ) < limit:
+            key, node, cmd = pending.pop()
+            popen = node.popen( cmd, stderr=STDOUT )
+            fd = popen.stdout.fileno()
+            running[ fd ] = ( key, popen )
+            outputs[ key ] = []
+            poller.register( fd, POLLIN )
+        for fd, event in poller.poll():
+            key, popen = running[ fd ]
+            data = os.read( fd, 4096 ) if event & POLLIN else b''
+            if data:
+                outputs[ key ].append( data )
+            else:
+                poller.unregister( fd )
+                popen.stdout.close()
+                popen.wait()
+                del running[ fd ]
+    return dict( ( key, b''.join( data ).decode( errors='replace' ) )
+                 for key, data in outputs.items() )
+
+def readOutput( node, size ):
+    """Read up to size characters of a command's output, like node.monitor()
+       but in one read. Sets node.waiting to False when the command
+       has completed."""
+    data = node.read( size )
+    marker = chr( 1 ) + r'\d+\r\n'
+    if chr( 1 ) in data:
+        # Suppress the job and PID of a backgrounded command
+        data = re.sub( r'\[\d+\] \d+\r\n', '', data )
+        # Marker can be read in chunks; continue until all of it is read
+        while not re.findall( marker, data ):
+            data += node.read( 1024 )
+        node.lastPid = int( re.findall( marker, data )[ 0 ][ 1: ] )
+        data = re.sub( marker, '', data )
+    # Look for sentinel
+    if chr( 127 ) in data:
+        node.waiting = False
+        data = data.replace( chr( 127 ), '' )
+    return data
+
+def formatSimStats( stats ):
+    "Format a snapshot of ns3.simStats() as a text table."
+    def value( v, fmt ):
+        return '-' if v is None else fmt % v
+    lines = [ '*** Simulator: lateness %s s, CPU %s, %s events/s' %
+              ( value( stats[ 'lateness' ], '%.4f' ),
+                value( stats[ 'cpu' ], '%.2f' ),
+                value( stats[ 'eventRate' ], '%.0f' ) ) ]
+    if stats[ 'segments' ]:
+        lines.append( '%-4s %-22s %10s %10s %10s %10s' %
+                      ( '#', 'segment', 'tx pkt/s', 'tx Mbit/s', 'rx pkt/s',
+                        'drop/s' ) )
+        for i, ( segment, rates ) in enumerate( stats[ 'segments' ] ):
+            txP, txB, rxP, drops = rates
+            lines.append( '%-4d %-22s %10.0f %10.3f %10.0f %10.0f' %
+                          ( i, type( segment ).__name__, txP, txB * 8e-6,
+                            rxP, drops ) )
+    for intf, connected, moved in stats[ 'intfs' ]:
+        lines.append( '%-16s %-10s %s' %
+                      ( intf.name, 'up' if connected else 'down',
+                        '' if moved else '(not in node namespace)' ) )
+    return '\n'.join( lines ) + '\n'
+
 def isReadable( poller ):
     "Check whether a Poll object has a readable fd."
     for fdmask in poller.poll( 0 ):
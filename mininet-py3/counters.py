@@ -0,0 +1,117 @@
+"""
+Bulk interface counter collection for OpenNet topologies.
+
+Reading counters with node.cmd( 'cat /sys/class/net/...' ) costs one shell
+round trip per interface and per sample. /proc/<pid>/net/dev lists the
+counters of every interface of the network namespace <pid> lives in, so
+CounterCollector reads it once per namespace and per sample, directly from
+the Mininet process: no shell, no setns. Nodes sharing a namespace (e.g.
+switches in the root namespace) are read once.
+
+Rates are computed for all interfaces at once, as NumPy arrays when NumPy
+is available, otherwise as lists.
+"""
+
+import os
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Counters kept for each interface, in column order.
+
+FIELDS = ( 'rxBytes', 'rxPackets', 'rxDrops', 'txBytes', 'txPackets', 'txDrops' )
+
+# Columns of these counters in a /proc/net/dev line, after the interface name.
+
+netDevColumns = ( 0, 1, 3, 8, 9, 11 )
+
+def readNetDev( pid ):
+    """Read the counters of all interfaces of the network namespace of pid.
+       Returns a dict mapping interface names to tuples ordered as FIELDS."""
+    counters = {}
+    with open( '/proc/%s/net/dev' % pid ) as f:
+        # Skip the two header lines.
+        lines = f.readlines()[ 2: ]
+    for line in lines:
+        name, _, values = line.partition( ':' )
+        values = values.split()
+        counters[ name.strip() ] = tuple( int( values[ c ] ) for c in netDevColumns )
+    return counters
+
+def namespaceOf( pid ):
+    """Return an identifier of the network namespace of pid."""
+    return os.stat( '/proc/%s/ns/net' % pid ).st_ino
+
+class CounterCollector( object ):
+    "Sample rx/tx counters of many interfaces with one read per namespace."
+
+    def __init__( self, net=None, intfs=None ):
+        """net: Mininet network, all interfaces of its nodes are sampled (optional)
+           intfs: list of interfaces to sample instead (optional), e.g. ns3.allTBIntfs"""
+        if intfs is None:
+            intfs = [ intf for node in net.values() for intf in node.intfList()
+                      if intf.name != 'lo' ]
+        self.intfs = list( intfs )
+        self.names = [ intf.name for intf in self.intfs ]
+        self.previous = None
+        self.last = None
+
+    def groups( self ):
+        """Group interface indexes by network namespace.
+           Returns a dict mapping a pid of the namespace to the list of indexes."""
+        groups = {}
+        nodePids = {}
+        nsPids = {}
+        for i, intf in enumerate( self.intfs ):
+            node = intf.node
+            if node not in nodePids:
+                pid = node.pid if getattr( node, 'inNamespace', False ) else os.getpid()
+                nodePids[ node ] = nsPids.setdefault( namespaceOf( pid ), pid )
+            groups.setdefault( nodePids[ node ], [] ).append( i )
+        return groups
+
+    def sample( self ):
+        """Read the counters of all interfaces.
+           Interfaces not found in their namespace (e.g. a tap interface not moved
+           yet) read as zero. Returns ( time, counters ), counters being a list
+           (or array) with one row of FIELDS per interface."""
+        rows = [ ( 0, ) * len( FIELDS ) ] * len( self.intfs )
+        # Namespaces are looked up on every sample: TBIntfs change namespace
+        # when the simulator starts.
+        for pid, indexes in self.groups().items():
+            try:
+                counters = readNetDev( pid )
+            except IOError:
+                continue
+            for i in indexes:
+                rows[ i ] = counters.get( self.names[ i ], rows[ i ] )
+        now = time.time()
+        if numpy is not None:
+            rows = numpy.array( rows, dtype=numpy.uint64 )
+        self.previous, self.last = self.last, ( now, rows )
+        return self.last
+
+    def rates( self ):
+        """Per second rates of FIELDS between the last two samples.
+           Returns a NumPy float array (or a list of tuples) with one row per
+           interface, or None before the second sample."""
+        if self.previous is None:
+            return None
+        t0, c0 = self.previous
+        t1, c1 = self.last
+        elapsed = t1 - t0
+        if numpy is not None:
+            # Counters are unsigned: subtract as signed so resets give negative rates.
+            return ( c1.astype( numpy.int64 ) - c0.astype( numpy.int64 ) ) / elapsed
+        return [ tuple( ( b - a ) / elapsed for a, b in zip( r0, r1 ) )
+                 for r0, r1 in zip( c0, c1 ) ]
+
+    def measure( self, interval=1.0 ):
+        """Sample, wait interval seconds, sample again and return rates()."""
+        self.sample()
+        time.sleep( interval )
+        self.sample()
+        return self.rates()
@@ -1,5 +1,6 @@
 import re
 import socket
+import struct
 from time import sleep
 
 import mininet.node
@@ -7,13 +8,88 @@ import mininet.link
 from mininet.log import info
 from mininet.util import moveIntf
 from mininet.cluster.link import RemoteLink
+from mininet.timedilation import TdfController
+# ns-3 event schedulers selectable with start (scheduler=...). mininet.ns3 loads the
+# ns-3 bindings on first use only, so importing it here does not load them.
+from mininet.ns3 import schedulers as SCHEDULERS
+
+# Record layouts of the LTE stats chunks written by the LteStatsCollector of
+# opennet-agent. A chunk file is a flat array of packed little-endian records,
+# so it loads with numpy.fromfile (path, dtype=numpy.dtype (UE_STATS_FIELDS)).
+# Byte counters are deltas over one sampling interval, delays are in seconds,
+# RSRP is in dBm and SINR in dB (NaN when no PHY report was received).
+
+UE_STATS_FIELDS = [('time', '<f8'), ('imsi', '<u8'), ('cellId', '<u2'),
+                   ('dlRlcTxBytes', '<u8'), ('dlRlcRxBytes', '<u8'),
+                   ('ulRlcTxBytes', '<u8'), ('ulRlcRxBytes', '<u8'),
+                   ('dlPdcpTxBytes', '<u8'), ('dlPdcpRxBytes', '<u8'),
+                   ('ulPdcpTxBytes', '<u8'), ('ulPdcpRxBytes', '<u8'),
+                   ('dlRlcDelay', '<f8'), ('ulRlcDelay', '<f8'),
+                   ('dlPdcpDelay', '<f8'), ('ulPdcpDelay', '<f8'),
+                   ('rsrp', '<f8'), ('sinr', '<f8')]
+
+CELL_STATS_FIELDS = [('time', '<f8'), ('cellId', '<u2'), ('ues', '<u2'),
+                     ('dlRlcRxBytes', '<u8'), ('ulRlcRxBytes', '<u8'),
+                     ('dlPdcpRxBytes', '<u8'), ('ulPdcpRxBytes', '<u8'),
+                     ('sinr', '<f8')]
+
+# Record layout of the flow snapshots written by the FlowMonitor of
+# mininet.opennet and by the LteFlowMonitor of opennet-agent. A snapshot
+# holds a '<IId' header (number of flows, number of delay histogram bins,
+# bin width in seconds), the flow records, then one row of '<u4' histogram
+# counts per flow; the last bin also counts longer delays. Addresses are
+# IPv4 addresses as host order integers, delays are in seconds.
+
+FLOW_FIELDS = [('src', '<u4'), ('dst', '<u4'), ('srcPort', '<u2'), ('dstPort', '<u2'),
+               ('protocol', '<u1'), ('txPackets', '<u8'), ('txBytes', '<u8'),
+               ('rxPackets', '<u8'), ('rxBytes', '<u8'), ('lostPackets', '<u8'),
+               ('delaySum', '<f8'), ('jitterSum', '<f8'), ('delayMax', '<f8')]
+
+def statsStruct (fields):
+    """Return the struct.Struct packing one record of the given layout."""
+    codes = {'f8': 'd', 'u8': 'Q', 'u4': 'I', 'u2': 'H', 'u1': 'B'}
+    return struct.Struct ('<' + ''.join (codes[dtype[1:]] for name, dtype in fields))
+
+def loadStats (data, fields):
+    """Decode packed stats records, from a chunk file path or from bytes.
+    Returns a NumPy structured array when NumPy is available, otherwise a
+    list of tuples in field order."""
+    if isinstance (data, str):
+        with open (data, 'rb') as f:
+            data = f.read ()
+    try:
+        import numpy
+    except ImportError:
+        return list (statsStruct (fields).iter_unpack (data))
+    return numpy.frombuffer (data, dtype=numpy.dtype (fields))
+
+def loadFlows (data):
+    """Decode a flow snapshot, from a file path or from bytes.
+    Returns a dict with the flow records ('flows', see FLOW_FIELDS), the delay
+    histograms ('histograms', one row per flow) and the bin width ('binWidth').
+    Records and histograms are NumPy arrays when NumPy is available,
+    otherwise lists of tuples."""
+    if isinstance (data, str):
+        with open (data, 'rb') as f:
+            data = f.read ()
+    count, bins, binWidth = struct.unpack_from ('<IId', data)
+    offset = struct.calcsize ('<IId')
+    end = offset + count * statsStruct (FLOW_FIELDS).size
+    flows = loadStats (data[offset:end], FLOW_FIELDS)
+    counts = loadStats (data[end:end + 4 * count * bins], [('count', '<u4')])
+    if isinstance (counts, list):
+        counts = [c for c, in counts]
+        histograms = [tuple (counts[i * bins:(i + 1) * bins]) for i in range (count)]
+    else:
+        histograms = counts['count'].reshape (count, bins)
+    return {'flows': flows, 'histograms': histograms, 'binWidth': binWidth}
 
 class Lte (object):
     def __init__ (self, tdf=1, mode='Master', imsiBase=0, cellIdBase=0,
                   ueIpBase='7.0.0.1', ueGwIpAddr='7.0.0.1',
                   pgwIpBase='1.0.0.0', pgwMask='255.0.0.0',
                   epcSwitch=None, agentIp=None, agentPort=53724, logFile=None,
-                  homeEnbTxPower=30.0, slaveName='slaveTap'):
+                  homeEnbTxPower=30.0, slaveName='slaveTap', checksum=True):
 
         if epcSwitch == None:
             info ('*** error: epcSwitch is a required argument.\n')
@@ -27,6 +103,11 @@ class Lte (object):
         self.ueGwIpAddr = ueGwIpAddr
         self.tapBridgeIntfs = []
         self.ueIndex = -1
+        self.tdf = tdf
+        self.runInfo = {'tdf': tdf, 'checksumEnabled': bool (checksum)}
+        self.statsConfig = None
+        self.flowConfig = None
+        self.mode = mode
 
         self.startAgent ()
         self.csock = None
@@ -59,7 +140,9 @@ class Lte (object):
         self.csock.sendall (b'LogComponentEnable ("TapEpcEnbApplication", LOG_LEVEL_ALL)\n')
 
         self.csock.sendall (b'GlobalValue.Bind ("SimulatorImplementationType", StringValue ("ns3::RealtimeSimulatorImpl"))\n')
-        self.csock.sendall (b'GlobalValue.Bind ("ChecksumEnabled", BooleanValue (True))\n')
+        # UE and EPC internet stacks exchange packets with Linux hosts, which verify
+        # checksums: only disable them for closed ns-3 experiments.
+        self.csock.sendall (('GlobalValue.Bind ("ChecksumEnabled", BooleanValue ({0}))\n'.format (bool (checksum))).encode ())
 
         self.csock.sendall (b'Config.SetDefault ("ns3::LteSpectrumPhy::CtrlErrorModelEnabled", BooleanValue (False))\n')
         self.csock.sendall (b'Config.SetDefault ("ns3::LteSpectrumPhy::DataErrorModelEnabled", BooleanValue (False))\n')
@@ -111,6 +194,8 @@ class Lte (object):
 
         self.csock.sendall (b'nsThread = Thread (target = run)\n')
         self.csock.sendall (b'tapBridges = []\n')
+        self.csock.sendall (b'backgroundTraffic = []\n')
+        self.backgroundCount = 0
 
     def startAgent (self):
         self.epcSwitch.rcmd ("/usr/bin/opennet-agent.py start")
@@ -193,6 +278,48 @@ class Lte (object):
         self.csock.sendall (('bearer = EpsBearer ({0})\n'.format (qci)).encode())
         self.csock.sendall (('Simulator.Schedule (Seconds (attachDelay), LteHelper.ActivateDedicatedEpsBearer, lteHelper, ueLteDevs.Get ({0}), bearer, tft)\n'.format (ueIndex)).encode())
 
+    def addBackgroundUes (self, count=2, positions=None, flows=None, **traffic):
+        """Add hidden UEs (no Mininet counterpart) attached like the other UEs
+        and run ns-3 traffic from them, see BackgroundTraffic in mininet.ns3.
+        Hidden UEs take addresses from the UE pool and are not counted in ueIndex.
+        count: number of hidden UEs
+        positions: list of (x, y, z) UE positions (optional), default: origin
+        flows: list of (source index, destination) pairs (optional); the destination
+        is the index of a hidden UE or an IPv4 address, e.g. of a host behind the PGW,
+        default: (0, 1), (2, 3), ...
+        traffic: pattern, rate, packetSize, burst, startTime, stopTime, port
+        Returns the index to pass to getTrafficRx ()."""
+        pattern = traffic.get ('pattern', 'onoff')
+        if pattern not in ('onoff', 'poisson', 'bulk'):
+            raise ValueError ('Unknown traffic pattern: {0}'.format (pattern))
+        self.csock.sendall (b'bgUeNodes = NodeContainer ()\n')
+        self.csock.sendall (('bgUeNodes.Create ({0})\n'.format (count)).encode())
+        self.csock.sendall (b'mobility.SetMobilityModel ("ns3::ConstantPositionMobilityModel")\n')
+        self.csock.sendall (b'mobility.Install (bgUeNodes)\n')
+        for i, position in enumerate (positions or []):
+            self.csock.sendall (('bgUeNodes.Get ({0}).GetObject(MobilityModel.GetTypeId()).SetPosition(Vector({1}, {2}, {3}))\n'.format (i, position[0], position[1], position[2])).encode())
+
+        self.csock.sendall (b'bgUeDevs = lteHelper.InstallUeDevice (bgUeNodes)\n')
+        self.csock.sendall (b'internetStack.Install (bgUeNodes)\n')
+        self.csock.sendall (b'bgUeIfaces = tapEpcHelper.AssignUeIpv4Address (bgUeDevs)\n')
+        for i in range (count):
+            # Keep the UE address pool of the Mininet side in step with the agent.
+            self.allocateIp ()
+            self.csock.sendall (('Ipv4StaticRoutingHelper ().GetStaticRouting (bgUeNodes.Get ({0}).GetObject (Ipv4.GetTypeId ())).SetDefaultRoute (Ipv4Address ("{1}"), 1)\n'.format (i, self.ueGwIpAddr)).encode())
+        self.csock.sendall (b'Simulator.Schedule (Seconds (attachDelay), LteHelper.Attach, lteHelper, bgUeDevs)\n')
+
+        if flows == None:
+            flows = [(i, i + 1) for i in range (0, count - 1, 2)]
+        self.csock.sendall (('backgroundTraffic.append (BackgroundTraffic (bgUeNodes, bgUeIfaces, {0!r}, **{1!r}))\n'.format (list (flows), traffic)).encode())
+        self.backgroundCount += 1
+        return self.backgroundCount - 1
+
+    def getTrafficRx (self, index=0):
+        """Fetch the bytes received by the sink of each flow of the hidden UEs."""
+        self.csock.sendall (('backgroundTraffic[{0}].send (csock)\n'.format (index)).encode ())
+        count, = struct.unpack ('<I', self.recvAll (4))
+        return list (struct.unpack ('<{0}Q'.format (count), self.recvAll (8 * count)))
+
     def allocateIp (self):
         pat = '[0-9]*\.[0-9]*\.[0-9]*\.'
         base = (re.findall (pat, self.ueIpBase))[0]
@@ -200,7 +327,14 @@ class Lte (object):
         self.nextAddr += 1
         return ip
 
-    def start (self):
+    def start (self, scheduler=None, cpus=None, policy=None, priority=None, nice=None):
+        """Start the agent simulator thread.
+        scheduler: ns-3 event scheduler (optional), a key of SCHEDULERS
+        (map, heap, list, calendar, priority) or an ns-3 TypeId name
+        cpus: CPU numbers the simulator and TapBridge reader threads are pinned to (optional)
+        policy: scheduling policy of these threads (optional): other, batch, fifo or rr
+        priority: realtime priority for the fifo and rr policies (optional), default: 50
+        nice: nice level of these threads (optional)"""
         self.csock.sendall (b'if nsThread.isAlive ():\n    csock.sendall ("True")\nelse:\n    csock.sendall ("False")\n')
         while True:
             data = self.csock.recv (1024)
@@ -213,6 +347,24 @@ class Lte (object):
 
         self.disableIpv6 (self.epcSwitch)
 
+        if self.statsConfig != None:
+            self.csock.sendall (('lteStats = LteStatsCollector (lteHelper, ueLteDevs, {interval}, "{path}", {lcids}, {chunkSamples}, {window})\n'.format (**self.statsConfig)).encode ())
+        if self.flowConfig != None:
+            pgw = 'pgw' if self.mode == 'Master' else 'None'
+            self.csock.sendall (('lteFlows = LteFlowMonitor (ueLteDevs, {0}, {binWidth}, {bins}, {interval}, {path!r})\n'.format (pgw, **self.flowConfig)).encode ())
+        self.csock.sendall (b'realtimeProbe = RealtimeProbe ()\n')
+        if scheduler != None:
+            typeId = SCHEDULERS.get (scheduler.lower (), scheduler)
+            self.csock.sendall (b'schedulerFactory = ObjectFactory ()\n')
+            self.csock.sendall (('schedulerFactory.SetTypeId ("{0}")\n'.format (typeId)).encode ())
+            self.csock.sendall (b'Simulator.SetScheduler (schedulerFactory)\n')
+            self.runInfo['scheduler'] = typeId
+
+        threadConfig = {'cpus': tuple (cpus) if cpus != None else None, 'policy': policy,
+                        'priority': priority, 'nice': nice}
+        if any (v != None for v in threadConfig.values ()):
+            self.csock.sendall (('nsThread = Thread (target = runSimulator, kwargs = {0!r})\n'.format (threadConfig)).encode ())
+            self.runInfo.update (('simulator' + k.capitalize (), v) for k, v in threadConfig.items () if v != None)
         self.csock.sendall (b'nsThread.start ()\n')
 
         info ('*** moveIntoNamespace\n')
@@ -223,11 +375,103 @@ class Lte (object):
 
         self.enableIpv6 (self.epcSwitch)
 
+    def enableStats (self, interval=0.1, path='/tmp/opennet-lte-stats', lcids=(3,), chunkSamples=600, window=600):
+        """Enable the RLC/PDCP/SINR stats pipeline of the agent.
+        Must be called before start ().
+        interval: sampling interval in simulated seconds
+        path: directory on the agent host receiving the chunk files
+        lcids: logical channel ids sampled for every UE (3 is the default bearer)
+        chunkSamples: number of samples written per chunk file
+        window: number of recent samples kept in memory for getStats ()"""
+        self.statsConfig = {'interval': interval, 'path': path, 'lcids': tuple (lcids),
+                            'chunkSamples': chunkSamples, 'window': window}
+
+    def getStats (self, window=None):
+        """Fetch recent stats samples from the running agent.
+        window: only return samples of the last window simulated seconds (optional)
+        Returns a dict with the per-UE ('ue') and per-cell ('cell') records,
+        see UE_STATS_FIELDS and CELL_STATS_FIELDS, and the time dilation
+        factor ('tdf') the samples were taken with."""
+        if self.statsConfig == None:
+            info ('*** error: stats are not enabled, call enableStats () before start ().\n')
+            return None
+        self.csock.sendall (('lteStats.send (csock, {0})\n'.format (window)).encode ())
+        ueLen, cellLen = struct.unpack ('<II', self.recvAll (8))
+        ue = loadStats (self.recvAll (ueLen), UE_STATS_FIELDS)
+        cell = loadStats (self.recvAll (cellLen), CELL_STATS_FIELDS)
+        return {'ue': ue, 'cell': cell, 'tdf': self.tdf}
+
+    def enableFlowMonitor (self, binWidth=0.0005, bins=200, interval=1.0, path=None):
+        """Enable per-flow delay, jitter and loss statistics of the traffic of
+        the UEs, measured by an ns-3 FlowMonitor on the UE and PGW nodes.
+        Must be called before start ().
+        binWidth: delay histogram bin width in seconds
+        bins: number of delay histogram bins (the last one counts longer delays)
+        interval: snapshot interval in simulated seconds
+        path: directory on the agent host receiving the flows-NNNNNN.bin snapshots (optional)"""
+        self.flowConfig = {'binWidth': binWidth, 'bins': bins, 'interval': interval, 'path': path}
+
+    def getFlows (self):
+        """Fetch the latest flow snapshot from the running agent, see loadFlows ()."""
+        if self.flowConfig == None:
+            info ('*** error: flow monitor is not enabled, call enableFlowMonitor () before start ().\n')
+            return None
+        self.csock.sendall (b'lteFlows.send (csock)\n')
+        size, = struct.unpack ('<I', self.recvAll (4))
+        return loadFlows (self.recvAll (size))
+
+    def getProbeSamples (self, seconds=None):
+        """Fetch (wall, sim, cpu) realtime probe samples of the last seconds from the agent."""
+        self.csock.sendall (('realtimeProbe.send (csock, {0})\n'.format (seconds)).encode ())
+        count, = struct.unpack ('<I', self.recvAll (4))
+        return list (struct.iter_unpack ('<ddd', self.recvAll (24 * count)))
+
+    def calibrateTdf (self, warmup=5.0, controller=None):
+        """Step the time dilation factor up until the running simulator keeps
+        up with the wall clock, measuring lateness and CPU load for warmup
+        seconds at each step. Must be called after start ().
+        The eNB TTI is stretched when devices are created, so a factor raised
+        here only applies to the timers read at runtime; pass the returned
+        factor as tdf for fully dilated runs of the same scenario.
+        warmup: measurement duration per step in seconds
+        controller: TdfController instance (optional)
+        Returns the chosen factor, also recorded in runInfo."""
+        if controller == None:
+            controller = TdfController ()
+        controller.tdf = self.tdf
+        while True:
+            sleep (warmup)
+            controller.observe (self.getProbeSamples (warmup))
+            factor = controller.step ()
+            if factor == None:
+                break
+            info ('*** Raising time dilation factor to {0}\n'.format (factor))
+            self.csock.sendall (('LteTimeDilationFactor.SetTimeDilationFactor ({0})\n'.format (factor)).encode ())
+            self.tdf = factor
+            controller.tdf = factor
+        self.runInfo.update (controller.info ())
+        return self.tdf
+
+    def recvAll (self, size):
+        data = b''
+        while len (data) < size:
+            chunk = self.csock.recv (size - len (data))
+            if not chunk:
+                raise socket.error ('opennet-agent closed the connection')
+            data += chunk
+        return data
+
     def stop (self):
         self.csock.sendall (b'Simulator.Stop (Seconds (1))\n')
         self.csock.sendall (b'while nsThread.isAlive ():\n    sleep (0.1)\n')
+        if self.statsConfig != None:
+            # Write the last, partial stats chunk.
+            self.csock.sendall (b'lteStats.flush ()\n')
 
     def clear (self):
+        if self.statsConfig != None:
+            # Wait for the chunk writer before the agent exits.
+            self.csock.sendall (b'lteStats.close ()\n')
         self.csock.sendall (b'Simulator.Destroy ()\n')
         self.csock.sendall (b'exit ()\n')
         self.csock.close ()
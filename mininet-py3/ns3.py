@@ -35,50 +35,132 @@ NS-3 integration for Mininet.
 
 """
 
-import threading, time, random
+import threading, time, random, collections, tempfile, math, re, os, zlib
 
 from mininet.log import info, error, warn, debug
-from mininet.link import Intf, Link
+from mininet.link import Intf, Link, TCIntf
 from mininet.node import Switch, Node
 from mininet.util import quietRun, moveIntf, errRun
+from mininet.timedilation import TdfController
 
 # ns-3.41 Cppyy bindings use a single namespace import
 # Old style: import ns.core, import ns.network, etc. (ns-3.22 Pybindgen)
 # New style: from ns import ns (ns-3.37+ Cppyy)
-from ns import ns
+# Importing the bindings loads and initialises every ns-3 library, which takes seconds and hundreds of
+# megabytes. Runs which never touch ns-3 should not pay for it, so ns is a LazyNs until its first use.
+
+class LazyNs( object ):
+    """Stand-in for the ns namespace of the ns-3 Cppyy bindings, which imports them on first
+       attribute access, then replaces itself with the real namespace in this module."""
+
+    def load( self ):
+        """Import the bindings and apply the module-wide ns-3 settings."""
+        global ns
+        from ns import ns as bindings
+        ns = bindings
+        # Set ns-3 simulator type to realtime simulator implementation.
+        # You can find more information about realtime modes here:
+        # http://www.nsnam.org/docs/release/3.17/manual/singlehtml/index.html#realtime
+        # http://www.nsnam.org/wiki/index.php/Emulation_and_Realtime_Scheduler
+        ns.core.GlobalValue.Bind( "SimulatorImplementationType", ns.core.StringValue( "ns3::RealtimeSimulatorImpl" ) )
+        return ns
+
+    def __getattr__( self, name ):
+        if name.startswith( '__' ):
+            raise AttributeError( name )
+        if isinstance( ns, LazyNs ):
+            self.load()
+        return getattr( ns, name )
+
+ns = LazyNs()
+
+def loaded():
+    """ Have the ns-3 bindings been loaded?"""
+    return not isinstance( ns, LazyNs )
 
 # Default duration of ns-3 simulation thread. You can freely modify this value.
 
 default_duration = 3600
 
-# Set ns-3 simulator type to realtime simulator implementation.
-# You can find more information about realtime modes here:
-# http://www.nsnam.org/docs/release/3.17/manual/singlehtml/index.html#realtime
-# http://www.nsnam.org/wiki/index.php/Emulation_and_Realtime_Scheduler
+# Checksum computation in ns-3 devices. By default ns-3 does not compute checksums - it is not needed
+# when it runs in simulation mode. However, when it runs in emulation mode and exchanges packets with the real
+# world, bit errors may occur in the real world, so checksum computation is needed where packets may be
+# corrupted, e.g. on wireless segments with error models.
+# ChecksumEnabled is an ns-3 global value: once set, every ns-3 internet stack computes and verifies
+# IP/TCP/UDP checksums on every packet. Therefore each segment declares whether it needs checksums
+# (checksum argument; wireless segments default to True, wired Simple and CSMA segments to False) and
+# start() enables ChecksumEnabled only when one of the segments needs it. Set checksumEnabled to True or
+# False to override this policy.
 
-ns.core.GlobalValue.Bind( "SimulatorImplementationType", ns.core.StringValue( "ns3::RealtimeSimulatorImpl" ) )
+checksumEnabled = None
 
-# Enable checksum computation in ns-3 devices. By default ns-3 does not compute checksums - it is not needed
-# when it runs in simulation mode. However, when it runs in emulation mode and exchanges packets with the real
-# world, bit errors may occur in the real world, so we need to enable checksum computation.
+# Array which tracks all created network segments.
+
+allSegments = []
+
+# ns-3 event schedulers selectable with start( scheduler=... ). The default (Map) is a balanced tree;
+# Heap has cheaper inserts for large event sets, List only suits a handful of pending events and
+# Calendar suits large sets of events spread evenly in time. See docs/PERFORMANCE.md.
+
+schedulers = { 'map': 'ns3::MapScheduler',
+               'heap': 'ns3::HeapScheduler',
+               'list': 'ns3::ListScheduler',
+               'calendar': 'ns3::CalendarScheduler',
+               'priority': 'ns3::PriorityQueueScheduler' }
+
+# Scheduling of the simulator thread, set by start( cpus=..., policy=..., priority=..., nice=... ) and
+# applied by runthread() before the simulator runs. TapBridge reader threads are created by the
+# simulator thread, so they inherit its CPU affinity, policy and nice level.
 
-# ns-3.41 Cppyy requires Python bool, not string "true"
-ns.core.GlobalValue.Bind( "ChecksumEnabled", ns.core.BooleanValue( True ) )
+threadConfig = {}
+
+schedPolicies = { 'other': os.SCHED_OTHER,
+                  'batch': os.SCHED_BATCH,
+                  'fifo': os.SCHED_FIFO,
+                  'rr': os.SCHED_RR }
+
+# Hybrid fidelity mode. SimpleLinks and CSMALinks (which are configured only with DataRate and Delay)
+# can be emulated with a veth pair shaped by Linux tc instead of two TapBridges and the ns-3 realtime
+# thread. It is selected per link with the hybrid argument; links created with hybrid=None follow
+# this default. See docs/PERFORMANCE.md for the fidelity trade-off.
+
+hybridLinks = False
 
 # Arrays which track all created TBIntf objects and Mininet nodes which has assigned an underlying ns-3 node.
 
 allTBIntfs = []
 allNodes = []
 
+# Array which tracks all WiFi segments using a precomputed propagation loss matrix.
+
+allStaticLossSegments = []
+
+# Metadata of the current run (time dilation measurements, ...), meant to be
+# reported alongside experiment results.
+
+runInfo = {}
+
 # These four global functions below are used to control ns-3 simulator thread. They are global, because
 # ns-3 has one global singleton simulator object.
 
-def start():
+def start( scheduler=None, cpus=None, policy=None, priority=None, nice=None, process=False,
+           realtimeProbe=False ):
     """ Start the simulator thread in background.
         It should be called after configuration of all ns-3 objects
         (TBintfs, Segments and Links).
         Attempt of adding an ns-3 object when simulator thread is
-        running may result in segfault. You should stop it first."""
+        running may result in segfault. You should stop it first.
+        scheduler: ns-3 event scheduler (optional), a key of schedulers
+        (map, heap, list, calendar, priority) or an ns-3 TypeId name,
+        default: the ns-3 default (map)
+        cpus: CPU numbers the simulator and TapBridge reader threads are pinned to (optional)
+        policy: scheduling policy of these threads (optional), a key of schedPolicies
+        (other, batch, fifo, rr); fifo and rr need CAP_SYS_NICE
+        priority: realtime priority for the fifo and rr policies (optional), default: 50
+        nice: nice level of these threads (optional)
+        process: also pin all other threads of the Mininet process to cpus (optional)
+        realtimeProbe: sample realtime lateness and simulator CPU load with probe (optional),
+        needed by calibrate() and by the lateness and CPU load of simStats(), default: False"""
     global thread
     if 'thread' in globals() and thread.is_alive():
         warn( "NS-3 simulator thread already running." )
@@ -87,6 +169,19 @@ def start():
     for intf in allTBIntfs:
         if not intf.nsInstalled:
             intf.nsInstall()
+    # Realtime probe events must be scheduled before the simulator thread starts.
+    if realtimeProbe:
+        probe.install()
+    applyChecksumPolicy()
+    # Packet counters of the segments, connected before the simulator thread runs.
+    segmentStats.install()
+    if scheduler is not None:
+        setScheduler( scheduler )
+    threadConfig.clear()
+    threadConfig.update( cpus=cpus, policy=policy, priority=priority, nice=nice )
+    if process and cpus is not None:
+        for task in os.listdir( '/proc/self/task' ):
+            tuneThread( int( task ), cpus=cpus )
     # Set up the simulator thread.
     thread = threading.Thread( target = runthread )
     thread.daemon = True
@@ -106,6 +201,8 @@ def runthread():
         Should not be called manually."""
     # FORK:CHILD
     # Code below is executed in the simulator thread after the fork.
+    # Apply CPU affinity and scheduling before any TapBridge reader thread is created.
+    runInfo.update( tuneThread( threading.get_native_id(), **threadConfig ) )
     # Stop event must be scheduled before simulator start. Not scheduling it
     # may lead leads to segfault.
     ns.core.Simulator.Stop( ns.core.Seconds( default_duration ) )
@@ -125,6 +222,9 @@ def clear():
     """ Clear ns-3 simulator.
         It should be called when simulator is stopped."""
     ns.core.Simulator.Destroy()
+    probe.reset()
+    segmentStats.reset()
+    runInfo.clear()
     for intf in allTBIntfs:
         intf.nsInstalled = False
         #intf.delete()
@@ -132,16 +232,320 @@ def clear():
         del node.nsNode
     del allTBIntfs[:]
     del allNodes[:]
+    del allSegments[:]
+    del allStaticLossSegments[:]
     return
 
-def createAttributes( n0="", v0=ns.core.EmptyAttributeValue(),
-                      n1="", v1=ns.core.EmptyAttributeValue(),
-                      n2="", v2=ns.core.EmptyAttributeValue(),
-                      n3="", v3=ns.core.EmptyAttributeValue(),
-                      n4="", v4=ns.core.EmptyAttributeValue(),
-                      n5="", v5=ns.core.EmptyAttributeValue(),
-                      n6="", v6=ns.core.EmptyAttributeValue(),
-                      n7="", v7=ns.core.EmptyAttributeValue()):
+def applyChecksumPolicy():
+    """ Bind the ChecksumEnabled ns-3 global value according to checksumEnabled
+        or, when it is None, to the needs of the created segments."""
+    enabled = checksumEnabled
+    if enabled is None:
+        enabled = any( segment.checksum for segment in allSegments )
+    # ns-3.41 Cppyy requires Python bool, not string "true"
+    ns.core.GlobalValue.Bind( "ChecksumEnabled", ns.core.BooleanValue( bool( enabled ) ) )
+    runInfo[ 'checksumEnabled' ] = bool( enabled )
+
+def tuneThread( tid, cpus=None, policy=None, priority=None, nice=None ):
+    """ Set the CPU affinity, scheduling policy and nice level of a thread.
+        tid: Linux thread id (0: calling thread)
+        Settings the process is not allowed to apply are reported and skipped.
+        Returns the applied settings, for runInfo."""
+    applied = {}
+    if cpus is not None:
+        try:
+            os.sched_setaffinity( tid, cpus )
+            applied[ 'simulatorCpus' ] = sorted( os.sched_getaffinity( tid ) )
+        except OSError as e:
+            warn( "Cannot set CPU affinity of thread %s: %s\n" % ( tid, e ) )
+    if policy is not None:
+        realtime = policy in ( 'fifo', 'rr' )
+        if priority is None:
+            priority = 50 if realtime else 0
+        try:
+            os.sched_setscheduler( tid, schedPolicies[ policy ], os.sched_param( priority ) )
+            applied[ 'simulatorPolicy' ] = policy
+            applied[ 'simulatorPriority' ] = priority
+        except OSError as e:
+            warn( "Cannot set scheduling policy %s of thread %s: %s\n" % ( policy, tid, e ) )
+    if nice is not None:
+        try:
+            # On Linux, PRIO_PROCESS with a thread id applies to that thread only.
+            os.setpriority( os.PRIO_PROCESS, tid, nice )
+            applied[ 'simulatorNice' ] = os.getpriority( os.PRIO_PROCESS, tid )
+        except OSError as e:
+            warn( "Cannot set nice level of thread %s: %s\n" % ( tid, e ) )
+    return applied
+
+def setScheduler( scheduler ):
+    """ Replace the ns-3 event scheduler, pending events are moved to the new one.
+        scheduler: a key of schedulers or an ns-3 TypeId name
+        Must not be called while the simulator thread is running."""
+    typeId = schedulers.get( scheduler.lower(), scheduler )
+    factory = ns.core.ObjectFactory()
+    factory.SetTypeId( typeId )
+    ns.core.Simulator.SetScheduler( factory )
+    runInfo[ 'scheduler' ] = typeId
+
+def schedule( delay, callback ):
+    """ Schedule a Python callable in the simulator thread, delay seconds from now.
+        callback: callable taking one (unused) argument list
+        Realtime ns-3 scheduling is not thread-safe: call it before start()
+        or from a callable already running in the simulator thread."""
+    event = ns.cppyy.gbl.pythonMakeEvent( callback, [] )
+    ns.core.Simulator.Schedule( ns.core.Seconds( delay ), event )
+
+# RealtimeProbe is a periodic ns-3 event sampling the wall clock, the simulator clock and the CPU
+# time of the simulator thread. The difference between elapsed wall time and elapsed simulated time
+# is the realtime lateness: it grows when the simulator can not keep up with the wall clock.
+
+class RealtimeProbe( object ):
+    """Periodic ns-3 event recording ( wall, sim, cpu ) samples of the simulator thread."""
+    def __init__( self, interval=0.1, window=600 ):
+        """interval: sampling interval in simulated seconds
+           window: number of recent samples kept"""
+        self.interval = interval
+        self.samples = collections.deque( maxlen=window )
+        self.lock = threading.Lock()
+        self.installed = False
+        # Keep a reference to the callable handed over to ns-3.
+        self.callback = lambda args: self.probe()
+
+    def install( self ):
+        """Schedule the first probe event."""
+        if not self.installed:
+            schedule( self.interval, self.callback )
+            self.installed = True
+
+    def reset( self ):
+        """Forget samples and scheduled events (after Simulator.Destroy())."""
+        with self.lock:
+            self.samples.clear()
+        self.installed = False
+
+    def probe( self ):
+        """Called in the simulator thread."""
+        sample = ( time.time(), ns.core.Simulator.Now().GetSeconds(), time.thread_time() )
+        with self.lock:
+            self.samples.append( sample )
+        schedule( self.interval, self.callback )
+
+    def window( self, seconds=None ):
+        """Return samples of the last seconds of wall time (default: all kept)."""
+        with self.lock:
+            samples = list( self.samples )
+        if seconds is not None and samples:
+            samples = [ s for s in samples if s[ 0 ] >= samples[ -1 ][ 0 ] - seconds ]
+        return samples
+
+probe = RealtimeProbe()
+
+def calibrate( warmup=5.0, controller=None ):
+    """ Measure realtime lateness and simulator CPU load during warmup seconds
+        of the running simulation and record the time dilation factor the
+        topology would need to stay faithful in runInfo.
+        Upstream ns-3 has no dilation hook for Simple, CSMA and WiFi segments,
+        so the factor is reported (runInfo['recommendedTdf']) to normalize
+        results, the simulation itself keeps running at TDF 1.
+        The simulator must have been started with realtimeProbe=True.
+        warmup: measurement duration in seconds
+        controller: TdfController instance (optional)
+        Returns the recommended time dilation factor, or None without probe."""
+    if not probe.installed:
+        warn( "Cannot calibrate: start the simulator with start( realtimeProbe=True )\n" )
+        return None
+    if controller is None:
+        controller = TdfController()
+    time.sleep( warmup )
+    controller.observe( probe.window( warmup ) )
+    runInfo.update( controller.info() )
+    return controller.recommend()
+
+# SegmentStats counts the packets sent, received and dropped by the devices of each segment in
+# C++ trace sinks, with relaxed atomic counters. Trace sources are connected by start(), before the
+# simulator thread runs, and the counters of all segments are read in one call from any thread,
+# without stopping the simulator.
+
+segmentStatsCode = """
+#include "ns3/core-module.h"
+#include "ns3/network-module.h"
+#include "ns3/wifi-module.h"
+
+#include <atomic>
+#include <memory>
+#include <vector>
+
+namespace opennet
+{
+using namespace ns3;
+
+class SegmentStats
+{
+  public:
+    // Counters of each segment: txPackets, txBytes, rxPackets, drops.
+    static const uint32_t FIELDS = 4;
+
+    SegmentStats(uint32_t segments)
+        : m_segments(segments),
+          m_counters(new std::atomic<uint64_t>[segments * FIELDS])
+    {
+        for (uint32_t i = 0; i < segments * FIELDS; i++)
+        {
+            m_counters[i] = 0;
+        }
+    }
+
+    // Connect the trace sources of a device to the counters of a segment.
+    // Must not be called while the simulator runs.
+    void Add(uint32_t segment, Ptr<NetDevice> device)
+    {
+        m_sinks.emplace_back(new Sink{&m_counters[segment * FIELDS]});
+        Sink* sink = m_sinks.back().get();
+        Ptr<Object> mac = device;
+        Ptr<WifiNetDevice> wifi = DynamicCast<WifiNetDevice>(device);
+        if (wifi)
+        {
+            mac = wifi->GetMac();
+            Ptr<WifiPhy> phy = wifi->GetPhy();
+            phy->TraceConnectWithoutContext("PhyTxDrop", MakeCallback(&Sink::Drop, sink));
+            phy->TraceConnectWithoutContext("PhyRxDrop", MakeCallback(&Sink::WifiPhyDrop, sink));
+            mac->TraceConnectWithoutContext("MacRxDrop", MakeCallback(&Sink::Drop, sink));
+        }
+        else
+        {
+            mac->TraceConnectWithoutContext("PhyTxDrop", MakeCallback(&Sink::Drop, sink));
+            mac->TraceConnectWithoutContext("PhyRxDrop", MakeCallback(&Sink::Drop, sink));
+        }
+        mac->TraceConnectWithoutContext("MacTx", MakeCallback(&Sink::Tx, sink));
+        mac->TraceConnectWithoutContext("MacRx", MakeCallback(&Sink::Rx, sink));
+        mac->TraceConnectWithoutContext("MacTxDrop", MakeCallback(&Sink::Drop, sink));
+    }
+
+    std::vector<uint64_t> Snapshot() const
+    {
+        std::vector<uint64_t> values(m_segments * FIELDS);
+        for (uint32_t i = 0; i < m_segments * FIELDS; i++)
+        {
+            values[i] = m_counters[i].load(std::memory_order_relaxed);
+        }
+        return values;
+    }
+
+  private:
+    struct Sink
+    {
+        std::atomic<uint64_t>* counters;
+
+        void Tx(Ptr<const Packet> packet)
+        {
+            counters[0].fetch_add(1, std::memory_order_relaxed);
+            counters[1].fetch_add(packet->GetSize(), std::memory_order_relaxed);
+        }
+
+        void Rx(Ptr<const Packet> packet)
+        {
+            counters[2].fetch_add(1, std::memory_order_relaxed);
+        }
+
+        void Drop(Ptr<const Packet> packet)
+        {
+            counters[3].fetch_add(1, std::memory_order_relaxed);
+        }
+
+        void WifiPhyDrop(Ptr<const Packet> packet, WifiPhyRxfailureReason reason)
+        {
+            counters[3].fetch_add(1, std::memory_order_relaxed);
+        }
+    };
+
+    uint32_t m_segments;
+    std::unique_ptr<std::atomic<uint64_t>[]> m_counters;
+    std::vector<std::unique_ptr<Sink>> m_sinks;
+};
+} // namespace opennet
+"""
+
+class SegmentStats( object ):
+    """Packet counters of the segments in allSegments, see segmentStatsCode."""
+
+    fields = ( 'txPackets', 'txBytes', 'rxPackets', 'drops' )
+
+    def __init__( self ):
+        self.defined = False
+        self.stats = None
+        self.segments = []
+        # Counters replaced by a later install(): their sinks stay connected until clear().
+        self.retired = []
+
+    def install( self ):
+        """Count the packets of all segments, called by start() before the
+           simulator thread runs. When segments were added since the last
+           install(), the counters are recreated and start from zero."""
+        if self.stats is not None and self.segments == allSegments:
+            return
+        if not self.defined:
+            ns.cppyy.cppdef( segmentStatsCode )
+            self.defined = True
+        if self.stats is not None:
+            self.retired.append( self.stats )
+        self.segments = list( allSegments )
+        self.stats = ns.cppyy.gbl.opennet.SegmentStats( len( self.segments ) )
+        for i, segment in enumerate( self.segments ):
+            for j in range( segment.channel.GetNDevices() ):
+                self.stats.Add( i, segment.channel.GetDevice( j ) )
+
+    def reset( self ):
+        """Forget the counters (after Simulator.Destroy())."""
+        self.stats = None
+        self.segments = []
+        del self.retired[:]
+
+    def sample( self ):
+        """Return ( wall time, simulator event count, counters ), counters
+           being a list with one row of fields per segment (none before start())."""
+        if self.stats is None:
+            return time.time(), ns.core.Simulator.GetEventCount(), []
+        values = list( self.stats.Snapshot() )
+        n = len( self.fields )
+        rows = [ tuple( values[ i: i + n ] ) for i in range( 0, len( values ), n ) ]
+        return time.time(), ns.core.Simulator.GetEventCount(), rows
+
+segmentStats = SegmentStats()
+
+def simStats( previous=None ):
+    """ Snapshot of the simulator health, for the CLI simstat command.
+        previous: snapshot returned by an earlier call (optional), to compute rates
+        Returns a dict with the realtime lateness and simulator CPU load of the
+        last second (from probe, None unless started with realtimeProbe=True),
+        the events per second and per segment rates since previous, the TBIntf
+        link states and, under 'sample', the raw counters."""
+    stats = { 'lateness': None, 'cpu': None, 'eventRate': None, 'segments': [] }
+    controller = TdfController()
+    samples = probe.window( 1.0 )
+    if len( samples ) >= 2:
+        controller.observe( samples )
+        stats[ 'lateness' ] = controller.lateness
+        stats[ 'cpu' ] = controller.cpu
+    now, events, rows = stats[ 'sample' ] = segmentStats.sample()
+    if previous is not None:
+        then, events0, rows0 = previous[ 'sample' ]
+        elapsed = now - then
+        if elapsed > 0:
+            stats[ 'eventRate' ] = ( events - events0 ) / elapsed
+            stats[ 'segments' ] = [ ( segment, tuple( ( b - a ) / elapsed for a, b in zip( r0, r1 ) ) )
+                                    for segment, r0, r1 in zip( segmentStats.segments, rows0, rows ) ]
+    stats[ 'intfs' ] = [ ( intf, intf.nsInstalled and intf.isConnected(), intf.inRightNamespace )
+                         for intf in allTBIntfs ]
+    return stats
+
+def createAttributes( n0="", v0=None,
+                      n1="", v1=None,
+                      n2="", v2=None,
+                      n3="", v3=None,
+                      n4="", v4=None,
+                      n5="", v5=None,
+                      n6="", v6=None,
+                      n7="", v7=None):
     attrs = { 'n0' : n0, 'v0' : v0,
               'n1' : n1, 'v1' : v1,
               'n2' : n2, 'v2' : v2,
@@ -150,7 +554,9 @@ def createAttributes( n0="", v0=ns.core.EmptyAttributeValue(),
               'n5' : n5, 'v5' : v5,
               'n6' : n6, 'v6' : v6,
               'n7' : n7, 'v7' : v7 }
-    return attrs
+    # Values not given are left to the EmptyAttributeValue defaults of setAttributes, so that
+    # defining this function does not load ns-3.
+    return dict( ( k, v ) for k, v in attrs.items() if v is not None )
 
 def setAttributes( func, typeStr, attrs):
     a = { 'n0' : "", 'v0' : ns.core.EmptyAttributeValue(),
@@ -194,6 +600,13 @@ def createListPositionAllocate(**attrs):
         i = i+1
     return lpa
 
+def createPositionList( positions ):
+    """Create a ListPositionAllocator from a list of (x, y, z) tuples."""
+    lpa = ns.mobility.ListPositionAllocator()
+    for x, y, z in positions:
+        lpa.Add(ns.core.Vector(x, y, z))
+    return lpa
+
 def hasMobilityModel( node ):
     if hasattr( node, 'nsNode' ) and node.nsNode is not None:
         pass
@@ -289,6 +702,10 @@ def setPosition( node, x, y, z ):
         pos = mm.SetPosition( ns.core.Vector( x, y, z ) )
     except AttributeError:
         warn( "ns-3 mobility model not found, not setting position\n" )
+        return
+    # Refresh the precomputed propagation losses of this node.
+    for segment in allStaticLossSegments:
+        segment.updateLoss( node )
 
 def getVelocity( node ):
     ''' Return the ns-3 (x, y, z) velocity of a node.
@@ -334,17 +751,19 @@ class TBIntf( Intf ):
         This is a subclass of Mininet basic Inft object. """
 
     def __init__( self, name, node, port=None,
-                  nsNode=None, nsDevice=None, mode=None, **params ):
+                  nsNode=None, nsDevice=None, mode=None, tapCreated=False, **params ):
         """name: interface name (e.g. h1-eth0)
            node: owning Mininet node (where this intf most likely lives)
            link: parent link if we're part of a link #TODO
            nsNode: underlying ns-3 node
            nsDevice: ns-3 device which the tap interface is bridged with
            mode: mode of TapBridge ns-3 device (UseLocal or UseBridge)
+           tapCreated: tap interface has already been created, e.g. by createTaps()
            other arguments are passed to config()"""
         self.name = name
         # Create a tap interface in the system, ns-3 TapBridge will connect to that interface later.
-        self.createTap()
+        if not tapCreated:
+            self.createTap()
         # Set this Intf to be delayed move. This tells Mininet not to move the interface to the right
         # namespace during Intf.__init__(). Therefore, the interface must be moved manually later.
         # Actually, interfaces are moved right after the simulator thread start, in the start() global
@@ -470,6 +889,92 @@ class TBIntf( Intf ):
         else:
             Intf.delete( self )
 
+# FdIntf is an alternative to the TapBridge path. Instead of a tap interface read and written one frame
+# per syscall by the TapBridge reader thread, the Mininet node gets one end of a veth pair, and the other
+# end stays in the root namespace where an ns-3 FdNetDevice exchanges frames with it through a packet
+# socket (EmuFdNetDevice) or through netmap rings with batched I/O (NetmapNetDevice, requires the
+# netmap kernel module). A BridgeNetDevice on the ns-3 node bridges the FdNetDevice with the segment
+# device, so the segment device must support SendFrom() (Simple, CSMA and WiFi Ap devices do).
+
+class FdIntf( TBIntf ):
+    """Interface object bridged with ns-3 emulated device through a veth pair and an FdNetDevice.
+       This is a subclass of TBIntf, it can be used wherever TBIntf is."""
+
+    helperType = 'EmuFdNetDeviceHelper'
+
+    def createTap( self ):
+        """Create a veth pair in the root namespace: self.name for the Mininet node,
+           self.peerName for the ns-3 FdNetDevice."""
+        self.peerName = 'ns-' + self.name
+        if len( self.peerName ) > 15:
+            # Interface names are limited to 15 characters: keep a prefix of the name and make
+            # the peer name unique with a hash of the whole name.
+            self.peerName = 'ns-%s%08x' % ( self.name[ :4 ], zlib.crc32( self.name.encode() ) )
+        quietRun( 'ip link add ' + self.name + ' type veth peer name ' + self.peerName )
+        # Segmentation and checksum offloads would hand over frames larger than the MTU
+        # or with partial checksums to ns-3.
+        for name in ( self.name, self.peerName ):
+            quietRun( 'ethtool -K ' + name + ' tx off tso off gso off gro off' )
+        quietRun( 'ip link set ' + self.peerName + ' up' )
+
+    def nsInstall( self ):
+        """Install the FdNetDevice and the bridge in the ns-3 simulator."""
+        if not isinstance( self.nsNode, ns.network.Node ):
+            warn( "Cannot install FdIntf to ns-3 Node: "
+                  "nsNode not specified\n" )
+            return
+        if not isinstance( self.nsDevice, ns.network.NetDevice ):
+            warn( "Cannot install FdIntf to ns-3 Node: "
+                  "nsDevice not specified\n" )
+            return
+        if not self.nsDevice.SupportsSendFrom():
+            warn( "Cannot install FdIntf to ns-3 Node: "
+                  "nsDevice does not support SendFrom(), use TBIntf\n" )
+            return
+        helper = getattr( ns.fd_net_device, self.helperType )()
+        helper.SetDeviceName( self.peerName )
+        self.fdDevice = helper.Install( self.nsNode ).Get( 0 )
+        ports = ns.network.NetDeviceContainer()
+        ports.Add( self.fdDevice )
+        ports.Add( self.nsDevice )
+        ns.bridge.BridgeHelper().Install( self.nsNode, ports )
+        self.nsInstalled = True
+
+    def namespaceMove( self ):
+        """Move the Mininet end of the veth pair to the right namespace."""
+        moveIntf( self.name, self.node )
+        self.inRightNamespace = True
+        # IP address has been reset while moving to namespace, needs to be set again.
+        if self.ip is not None:
+            self.setIP( self.ip, self.prefixLen )
+        self.isUp( True )
+
+    def isConnected( self ):
+        """The packet socket (or netmap port) is opened when the device is installed."""
+        return self.nsInstalled
+
+    def rename( self, newname ):
+        "Rename interface"
+        Intf.rename( self, newname )
+
+class NetmapIntf( FdIntf ):
+    """FdIntf exchanging frames with the veth pair through netmap rings (batched I/O)."""
+
+    helperType = 'NetmapNetDeviceHelper'
+
+# Backends which can bridge Mininet nodes with ns-3 devices, selectable per segment.
+
+intfBackends = { 'tapbridge': TBIntf, 'fd': FdIntf, 'netmap': NetmapIntf }
+
+def createTaps( names ):
+    """Create many tap Linux interfaces in the root namespace with a single ip call.
+       names: list of interface names"""
+    with tempfile.NamedTemporaryFile( 'w', prefix='opennet-taps-' ) as batch:
+        for name in names:
+            batch.write( 'tuntap add ' + name + ' mode tap\n' )
+        batch.flush()
+        quietRun( 'ip -batch ' + batch.name )
+
 # Network segment is a Mininet object consistng of ns-3 channel of a specific type. This can be seen as
 # an equivalent of collision domain. Many Mininet nodes can be connected to the one network segment.
 # During connecting, Mininet creates ns-3 device of particular type in the underlying ns-3 node.
@@ -481,6 +986,100 @@ class TBIntf( Intf ):
 # Link and alternatively with it: it supports all methods of its superclass and constructor arguments order
 # is the same.
 
+# Background traffic generated by Mininet processes (e.g. iperf) crosses the kernel, the tap interface and
+# the TapBridge before it reaches the ns-3 channel, which costs a lot of CPU for traffic only there to
+# load the channel. BackgroundTraffic runs ns-3 traffic sources and sinks instead, on hidden ns-3 nodes
+# (nodes without Mininet counterpart) connected to the segment. Hidden nodes get an internet stack and
+# addresses from a private network of their own (172.31.N.0/24 by default), with static ARP entries so
+# that they do not broadcast ARP requests to the Mininet nodes. Use addTraffic() of CSMASegment and
+# WIFISegment to create them.
+
+class HiddenNode( object ):
+    """ns-3 node without Mininet counterpart, e.g. a background traffic endpoint."""
+    def __init__( self, name ):
+        """name: node name, only used for reporting"""
+        self.name = name
+        self.nsNode = ns.network.Node()
+
+    def __repr__( self ):
+        return '<HiddenNode %s>' % self.name
+
+class BackgroundTraffic( object ):
+    """ns-3 traffic sources and sinks running on hidden ns-3 nodes."""
+
+    # Index of the next default 172.31.N.0/24 network.
+    networkIndex = 0
+
+    def __init__( self, nodes, devices, flows=None, pattern='onoff', rate='1Mbps', packetSize=1000,
+                  burst=0.1, startTime=0.0, stopTime=None, network=None, port=9000 ):
+        """nodes: list of HiddenNodes
+           devices: NetDeviceContainer with the segment device of each node
+           flows: list of ( source index, destination index ) node pairs (optional),
+           default: ( 0, 1 ), ( 2, 3 ), ...
+           pattern: onoff (constant bit rate UDP), poisson (UDP bursts with exponentially
+           distributed on and off times) or bulk (saturating TCP)
+           rate: data rate of each onoff flow, mean data rate of each poisson flow
+           packetSize: UDP payload or TCP send size in bytes
+           burst: mean on and off time of poisson flows in seconds
+           startTime, stopTime: simulated time the sources start and stop at (optional)
+           network: network address of the hidden nodes (optional), /24 netmask
+           port: UDP or TCP port of the first flow, flow k uses port + k"""
+        if pattern not in ( 'onoff', 'poisson', 'bulk' ):
+            raise ValueError( 'Unknown traffic pattern: %s' % pattern )
+        self.nodes = nodes
+        self.pattern = pattern
+        container = ns.network.NodeContainer()
+        for node in nodes:
+            container.Add( node.nsNode )
+        stack = ns.internet.InternetStackHelper()
+        stack.SetIpv6StackInstall( False )
+        stack.Install( container )
+        if network is None:
+            network = '172.31.%d.0' % ( BackgroundTraffic.networkIndex % 256 )
+            BackgroundTraffic.networkIndex += 1
+        addressHelper = ns.internet.Ipv4AddressHelper()
+        addressHelper.SetBase( ns.network.Ipv4Address( network ), ns.network.Ipv4Mask( "255.255.255.0" ) )
+        self.interfaces = addressHelper.Assign( devices )
+        ns.internet.NeighborCacheHelper().PopulateNeighborCache( self.interfaces )
+        if flows is None:
+            flows = [ ( i, i + 1 ) for i in range( 0, len( nodes ) - 1, 2 ) ]
+        self.flows = flows
+        factory = "ns3::TcpSocketFactory" if pattern == 'bulk' else "ns3::UdpSocketFactory"
+        self.sources = ns.network.ApplicationContainer()
+        self.sinks = ns.network.ApplicationContainer()
+        for k, ( src, dst ) in enumerate( flows ):
+            local = ns.network.InetSocketAddress( ns.network.Ipv4Address.GetAny(), port + k ).ConvertTo()
+            remote = ns.network.InetSocketAddress( self.interfaces.GetAddress( dst ), port + k ).ConvertTo()
+            sink = ns.applications.PacketSinkHelper( factory, local )
+            self.sinks.Add( sink.Install( nodes[ dst ].nsNode ) )
+            if pattern == 'bulk':
+                source = ns.applications.BulkSendHelper( factory, remote )
+                source.SetAttribute( "MaxBytes", ns.core.UintegerValue( 0 ) )
+                source.SetAttribute( "SendSize", ns.core.UintegerValue( packetSize ) )
+            else:
+                source = ns.applications.OnOffHelper( factory, remote )
+                source.SetConstantRate( ns.network.DataRate( rate ), packetSize )
+                if pattern == 'poisson':
+                    # Equal mean on and off times: send at twice the rate half of the time.
+                    bitRate = 2 * ns.network.DataRate( rate ).GetBitRate()
+                    source.SetAttribute( "DataRate", ns.network.DataRateValue( ns.network.DataRate( bitRate ) ) )
+                    variable = "ns3::ExponentialRandomVariable[Mean=%f]" % burst
+                    source.SetAttribute( "OnTime", ns.core.StringValue( variable ) )
+                    source.SetAttribute( "OffTime", ns.core.StringValue( variable ) )
+            self.sources.Add( source.Install( nodes[ src ].nsNode ) )
+        self.sinks.Start( ns.core.Seconds( 0 ) )
+        self.sources.Start( ns.core.Seconds( startTime ) )
+        if stopTime is not None:
+            self.sources.Stop( ns.core.Seconds( stopTime ) )
+
+    def addresses( self ):
+        """Return the IPv4 addresses of the hidden nodes."""
+        return [ str( self.interfaces.GetAddress( i ) ) for i in range( self.interfaces.GetN() ) ]
+
+    def rxBytes( self ):
+        """Return the number of bytes received by the sink of each flow."""
+        return [ self.sinks.Get( i ).GetTotalRx() for i in range( self.sinks.GetN() ) ]
+
 # SimpleChannel is the simplest channel model available in ns-3. Many devices can be connected to it
 # simultaneously. Devices supports SendFrom(), therefore it can be used in "UseBridge" mode (for example
 # for connecting switches). There is no implemented channel blocking - many devices can transmit
@@ -492,8 +1091,14 @@ class TBIntf( Intf ):
 class SimpleSegment( object ):
     """The simplest channel model available in ns-3.
        SimpleNetDevice supports SendFrom()."""
-    def __init__( self ):
+    def __init__( self, backend='tapbridge', checksum=False ):
+        """backend: how Mininet nodes are bridged with ns-3 devices (optional),
+           one of intfBackends: tapbridge (default), fd or netmap
+           checksum: packets on this segment need ns-3 checksums (optional), default: False"""
         self.channel = ns.network.SimpleChannel()
+        self.intfClass = intfBackends[ backend ]
+        self.checksum = checksum
+        allSegments.append( self )
 
     def add( self, node, port=None, intfName=None, mode=None ):
         """Connect Mininet node to the segment.
@@ -525,22 +1130,29 @@ class SimpleSegment( object ):
             # ...obtain it automatically.
             intfName = node.name + '-eth' + repr( port )
         # In the specified Mininet node, create TBIntf bridged with the 'device'.
-        tb = TBIntf( intfName, node, port, node.nsNode, device, mode )
+        tb = self.intfClass( intfName, node, port, node.nsNode, device, mode )
         return tb
 
 
 class SimpleLink( SimpleSegment, Link ):
     """Link between two nodes using the SimpleChannel ns-3 model"""
     def __init__( self, node1, node2, port1=None, port2=None,
-                  intfName1=None, intfName2=None ):
+                  intfName1=None, intfName2=None, hybrid=None, backend='tapbridge' ):
         """Create simple link to another node, making two new tap interfaces.
         node1: first Mininet node
         node2: second Mininet node
         port1: node1 port number (optional)
         port2: node2 port number (optional)
         intfName1: node1 interface name (optional)
-        intfName2: node2 interface name (optional)"""
-        SimpleSegment.__init__( self )
+        intfName2: node2 interface name (optional)
+        hybrid: use a plain veth pair instead of ns-3 (optional), default: hybridLinks
+        backend: how nodes are bridged with ns-3 devices (optional), default: tapbridge"""
+        self.hybrid = hybridLinks if hybrid is None else hybrid
+        if self.hybrid:
+            # SimpleChannel has neither data rate nor delay, a veth pair is equivalent.
+            Link.__init__( self, node1, node2, port1, port2, intfName1, intfName2 )
+            return
+        SimpleSegment.__init__( self, backend )
         intf1 = SimpleSegment.add( self, node1, port1, intfName1 )
         intf2 = SimpleSegment.add( self, node2, port2, intfName2 )
         intf1.link = self
@@ -557,10 +1169,16 @@ class SimpleLink( SimpleSegment, Link ):
 class CSMASegment( object ):
     """Equivalent of the Ethernet channel
        CsmaNetDevice supports SendFrom()"""
-    def __init__( self, DataRate=None, Delay=None ):
+    def __init__( self, DataRate=None, Delay=None, backend='tapbridge', checksum=False ):
         """DataRate: forced data rate of connected devices (optional), for example: 10Mbps, default: no-limit
-           Delay: channel trasmission delay (optional), for example: 10ns, default: 0"""
+           Delay: channel trasmission delay (optional), for example: 10ns, default: 0
+           backend: how Mininet nodes are bridged with ns-3 devices (optional),
+           one of intfBackends: tapbridge (default), fd or netmap
+           checksum: packets on this segment need ns-3 checksums (optional), default: False"""
         self.channel = ns.csma.CsmaChannel()
+        self.intfClass = intfBackends[ backend ]
+        self.checksum = checksum
+        allSegments.append( self )
         if DataRate is not None:
             self.channel.SetAttribute( "DataRate", ns.network.DataRateValue( ns.network.DataRate( DataRate ) ) )
         if Delay is not None:
@@ -601,14 +1219,31 @@ class CSMASegment( object ):
             # ...obtain it automatically.
             intfName = node.name + '-eth' + repr( port )
         # In the specified Mininet node, create TBIntf bridged with the 'device'.
-        tb = TBIntf( intfName, node, port, node.nsNode, device, mode )
+        tb = self.intfClass( intfName, node, port, node.nsNode, device, mode )
         return tb
 
+    def addTraffic( self, count=2, **traffic ):
+        """Connect hidden ns-3 nodes to the segment and run traffic between them.
+           count: number of hidden nodes
+           traffic: BackgroundTraffic parameters (flows, pattern, rate, ...)
+           Returns the BackgroundTraffic."""
+        nodes = [ HiddenNode( 'bg%d' % i ) for i in range( count ) ]
+        devices = ns.network.NetDeviceContainer()
+        for node in nodes:
+            device = ns.csma.CsmaNetDevice()
+            device.Attach( self.channel )
+            device.SetQueue( ns.CreateObject( "DropTailQueue<Packet>" ) )
+            device.SetAddress( ns.network.Mac48Address.Allocate().ConvertTo() )
+            node.nsNode.AddDevice( device )
+            devices.Add( device )
+        return BackgroundTraffic( nodes, devices, **traffic )
+
 
 class CSMALink( CSMASegment, Link ):
     """Link between two nodes using the CsmaChannel ns-3 model"""
     def __init__( self, node1, node2, port1=None, port2=None,
-                  intfName1=None, intfName2=None, DataRate=None, Delay=None ):
+                  intfName1=None, intfName2=None, DataRate=None, Delay=None, hybrid=None,
+                  backend='tapbridge' ):
         """Create Ethernet link to another node, making two new tap interfaces.
         node1: first Mininet node
         node2: second Mininet node
@@ -617,14 +1252,51 @@ class CSMALink( CSMASegment, Link ):
         intfName1: node1 interface name (optional)
         intfName2: node2 interface name (optional)
         DataRate: forced data rate of connected devices (optional), for example: 10Mbps, default: no-limit
-        Delay: channel trasmission delay (optional), for example: 10ns, default: 0"""
-        CSMASegment.__init__( self, DataRate, Delay )
+        Delay: channel trasmission delay (optional), for example: 10ns, default: 0
+        hybrid: use a veth pair shaped by tc instead of ns-3 (optional), default: hybridLinks
+        backend: how nodes are bridged with ns-3 devices (optional), default: tapbridge"""
+        self.hybrid = hybridLinks if hybrid is None else hybrid
+        if self.hybrid:
+            # Shape both directions with tbf (DataRate) and netem (Delay).
+            params = { 'use_tbf': True }
+            if DataRate is not None:
+                params[ 'bw' ] = dataRateToMbps( DataRate )
+            if Delay is not None:
+                params[ 'delay' ] = '%gus' % timeToMicroSeconds( Delay )
+            Link.__init__( self, node1, node2, port1, port2, intfName1, intfName2,
+                           cls1=TCIntf, cls2=TCIntf, params1=params, params2=dict( params ) )
+            return
+        CSMASegment.__init__( self, DataRate, Delay, backend )
         intf1 = CSMASegment.add( self, node1, port1, intfName1 )
         intf2 = CSMASegment.add( self, node2, port2, intfName2 )
         intf1.link = self
         intf2.link = self
         self.intf1, self.intf2 = intf1, intf2
 
+# Conversion of ns-3 attribute strings to tc parameters, used by the hybrid fidelity mode.
+
+def dataRateToMbps( rate ):
+    """Convert an ns-3 DataRate string (e.g. 10Mbps, 1Gb/s, 100kbps, 2MBps) to Mbit/s."""
+    match = re.match( r'^\s*([0-9.eE+-]+)\s*([kKMG]?)(i?)(b|B)(ps|/s)\s*$', str( rate ) )
+    if match is None:
+        raise ValueError( 'Unsupported DataRate: %s' % rate )
+    value, prefix, binary, unit, _ = match.groups()
+    base = 1024 if binary else 1000
+    scale = { '': 1, 'k': base, 'K': base, 'M': base ** 2, 'G': base ** 3 }[ prefix ]
+    if unit == 'B':
+        scale *= 8
+    return float( value ) * scale / 1e6
+
+def timeToMicroSeconds( delay ):
+    """Convert an ns-3 Time string (e.g. 10ms, 5us, 100ns, 1s) to microseconds."""
+    match = re.match( r'^\s*([0-9.eE+-]+)\s*(s|ms|us|ns|ps|fs|min|h|d)?\s*$', str( delay ) )
+    if match is None:
+        raise ValueError( 'Unsupported Delay: %s' % delay )
+    value, unit = match.groups()
+    scale = { None: 1e6, 's': 1e6, 'ms': 1e3, 'us': 1, 'ns': 1e-3, 'ps': 1e-6, 'fs': 1e-9,
+              'min': 6e7, 'h': 3.6e9, 'd': 8.64e10 }[ unit ]
+    return float( value ) * scale
+
 # Wifi model in ns-3 is much more complicated than wired models. Fortunatelly, there are many
 # tutorials and examples of its usage in the net. Moreover, there is a large community of researchers
 # and programmers around it.
@@ -634,23 +1306,95 @@ class CSMALink( CSMASegment, Link ):
 # In order to facilitate its usage, it provides a series of helpers. Helpers are objects which provides
 # fucntions used to create and set up of various components of Wifi model.
 
+# By default, the Yans channel evaluates the log-distance propagation loss model for every
+# transmitter-receiver pair on every frame. For deployments where nodes do not move, a segment can
+# instead precompute the pairwise losses once (with the same log-distance formula) and store them in a
+# MatrixPropagationLossModel, which is a plain table lookup per frame. The rows of a node are
+# recomputed when it is moved with setPosition(); movements driven by the ns-3 mobility model itself
+# (e.g. setVelocity()) are not reflected in the matrix.
+
 class WIFISegment( object ):
     """Equivalent of radio WiFi channel.
        Only Ap and WDS devices support SendFrom()."""
-    def __init__( self, enableQos=True ):
+    def __init__( self, enableQos=True, staticLoss=False, lossExponent=3.0,
+                  referenceDistance=1.0, referenceLoss=46.6777, backend='tapbridge', checksum=True ):
+        """staticLoss: precompute pairwise propagation losses of static nodes (optional)
+           lossExponent, referenceDistance, referenceLoss: log-distance model parameters
+           used for the precomputed losses, default: same as YansWifiChannelHelper.Default()
+           backend: how Mininet nodes are bridged with ns-3 devices (optional), one of
+           intfBackends: tapbridge (default), fd or netmap (Ap devices only)
+           checksum: packets on this segment need ns-3 checksums (optional), default: True"""
+        self.intfClass = intfBackends[ backend ]
+        self.checksum = checksum
+        allSegments.append( self )
         # Helpers instantiation.
         # ns-3.41 API: WifiHelper() and YansWifiPhyHelper() no longer have Default()
         # WIFI_PHY_STANDARD_80211g is now WIFI_STANDARD_80211g
         # QosWifiMacHelper/NqosWifiMacHelper replaced by WifiMacHelper
         self.wifihelper = ns.wifi.WifiHelper()
         self.wifihelper.SetStandard (ns.wifi.WIFI_STANDARD_80211g)
-        self.phyhelper = ns.wifi.YansWifiPhyHelper()
-        self.channelhelper = ns.wifi.YansWifiChannelHelper.Default()
-        self.phyhelper.SetChannel ( self.channelhelper.Create() )
+        # Mobility models of the ns-3 nodes connected to this segment.
+        self.mobilityModels = {}
+        self.staticLoss = staticLoss
+        self.lossExponent = lossExponent
+        self.referenceDistance = referenceDistance
+        self.referenceLoss = referenceLoss
+        self.createChannel()
         # ns-3.41: QosWifiMacHelper/NqosWifiMacHelper merged into WifiMacHelper
         # QoS is now handled via SetType parameters or WifiHelper configuration
         self.machelper = ns.wifi.WifiMacHelper()
 
+    def createChannel( self ):
+        """Create the PHY helper (phyhelper) and the channel (channel) of the segment."""
+        self.phyhelper = ns.wifi.YansWifiPhyHelper()
+        if self.staticLoss:
+            self.lossModel = ns.propagation.MatrixPropagationLossModel()
+            # Pairs not in the matrix yet can not hear each other.
+            self.lossModel.SetDefaultLoss( 1000 )
+            self.channel = ns.wifi.YansWifiChannel()
+            self.channel.SetPropagationLossModel( self.lossModel )
+            self.channel.SetPropagationDelayModel( ns.propagation.ConstantSpeedPropagationDelayModel() )
+            self.phyhelper.SetChannel( self.channel )
+            allStaticLossSegments.append( self )
+        else:
+            self.channelhelper = ns.wifi.YansWifiChannelHelper.Default()
+            self.channel = self.channelhelper.Create()
+            self.phyhelper.SetChannel ( self.channel )
+
+    def track( self, *nodes ):
+        """Remember the mobility models of nodes connected to the segment
+           and compute their propagation losses if staticLoss is set."""
+        for node in nodes:
+            self.mobilityModels[ node ] = node.nsNode.GetObject( ns.mobility.MobilityModel.GetTypeId() )
+        self.updateLoss( *nodes )
+
+    def pairLoss( self, distance ):
+        """Log-distance propagation loss in dB at distance meters."""
+        if distance <= self.referenceDistance:
+            return self.referenceLoss
+        return self.referenceLoss + 10 * self.lossExponent * math.log10( distance / self.referenceDistance )
+
+    def updateLoss( self, *nodes ):
+        """Recompute the precomputed propagation losses between the given
+           nodes and all other nodes of the segment (staticLoss only).
+           Nodes not connected to the segment are ignored."""
+        if not self.staticLoss:
+            return
+        positions = {}
+        for node, mm in self.mobilityModels.items():
+            pos = mm.GetPosition()
+            positions[ node ] = ( pos.x, pos.y, pos.z )
+        done = set()
+        for node in nodes:
+            if node not in positions:
+                continue
+            done.add( node )
+            for other, pos in positions.items():
+                if other in done:
+                    continue
+                loss = self.pairLoss( math.dist( positions[ node ], pos ) )
+                self.lossModel.SetLoss( self.mobilityModels[ node ], self.mobilityModels[ other ], loss, True )
+
     def add( self, node, port=None, intfName=None, mode=None ):
         """Connect Mininet node to the segment.
            Will create WifiNetDevice with Mac type specified in
@@ -672,6 +1416,7 @@ class WIFISegment( object ):
         mobilityhelper = ns.mobility.MobilityHelper()
         # Install mobility object to the ns-3 node.
         mobilityhelper.Install( node.nsNode )
+        self.track( node )
         # If port number is not specified...
         if port is None:
             # ...obtain it automatically.
@@ -681,7 +1426,7 @@ class WIFISegment( object ):
             # ...obtain it automatically.
             intfName = node.name + '-eth' + repr( port )
         # In the specified Mininet node, create TBIntf bridged with the 'device'.
-        tb = TBIntf( intfName, node, port, node.nsNode, device, mode )
+        tb = self.intfClass( intfName, node, port, node.nsNode, device, mode )
         return tb
 
     def addAdhoc( self, node, port=None, intfName=None, mode=None ):
@@ -726,6 +1471,150 @@ class WIFISegment( object ):
         self.phyhelper.Set ("ChannelNumber", ns.core.UintegerValue (channelNumber))
         return self.add( node, port, intfName, mode )
 
+    def addMany( self, nodes, positions=None, ports=None, intfNames=None, mode=None ):
+        """Connect many Mininet nodes to the segment at once.
+           All WifiNetDevices (with Mac type specified in the MacHelper) are
+           installed with one helper call, all mobility models with another one,
+           and all tap interfaces are created in one batch.
+           nodes: list of Mininet nodes
+           positions: list of (x, y, z) node positions (optional)
+           ports: list of node port numbers (optional)
+           intfNames: list of node tap interface names (optional)
+           mode: TapBridge mode (UseLocal or UseBridge) (optional)
+           Returns the list of created TBIntfs."""
+        container = ns.network.NodeContainer()
+        for node in nodes:
+            # Check if this Mininet node has assigned an underlying ns-3 node.
+            if hasattr( node, 'nsNode' ) and node.nsNode is not None:
+                # If it is assigned, go ahead.
+                pass
+            else:
+                # If not, create new ns-3 node and assign it to this Mininet node.
+                node.nsNode = ns.network.Node()
+                allNodes.append( node )
+            container.Add( node.nsNode )
+        # Install new devices to all ns-3 nodes, using provided helpers.
+        devices = self.wifihelper.Install( self.phyhelper, self.machelper, container )
+        mobilityhelper = ns.mobility.MobilityHelper()
+        if positions is not None:
+            setListPositionAllocate( mobilityhelper, createPositionList( positions ) )
+        # Install mobility objects to all ns-3 nodes.
+        mobilityhelper.Install( container )
+        self.track( *nodes )
+        # If port numbers are not specified...
+        if ports is None:
+            # ...obtain them automatically.
+            ports = [ node.newPort() for node in nodes ]
+        # If interface names are not specified...
+        if intfNames is None:
+            # ...obtain them automatically.
+            intfNames = [ node.name + '-eth' + repr( port ) for node, port in zip( nodes, ports ) ]
+        if self.intfClass is TBIntf:
+            createTaps( intfNames )
+        # In the specified Mininet nodes, create TBIntfs bridged with the created devices.
+        tbs = []
+        for i, node in enumerate( nodes ):
+            tbs.append( self.intfClass( intfNames[ i ], node, ports[ i ], node.nsNode, devices.Get( i ), mode,
+                                        tapCreated=self.intfClass is TBIntf ) )
+        return tbs
+
+    def addAps( self, nodes, ssid="default-ssid", positions=None, channelNumber=1,
+                ports=None, intfNames=None, mode=None ):
+        """Connect many Mininet nodes to the segment as access points.
+           See addAp() and addMany().
+           nodes: list of Mininet nodes
+           ssid: network SSID (optional)
+           positions: list of (x, y, z) node positions (optional)
+           Returns the list of created TBIntfs."""
+        self.machelper.SetType ("ns3::ApWifiMac",
+                                "Ssid", ns.wifi.SsidValue (ns.wifi.Ssid(ssid)),
+                                "BeaconGeneration", ns.core.BooleanValue(True),
+                                "BeaconInterval", ns.core.TimeValue(ns.core.Seconds(2.5)))
+        self.phyhelper.Set ("ChannelNumber", ns.core.UintegerValue (channelNumber))
+        return self.addMany( nodes, positions, ports, intfNames, mode )
+
+    def addStas( self, nodes, ssid="default-ssid", positions=None, channelNumber=1,
+                 ports=None, intfNames=None, mode=None ):
+        """Connect many Mininet nodes to the segment as client stations.
+           See addSta() and addMany().
+           nodes: list of Mininet nodes
+           ssid: network SSID (optional)
+           positions: list of (x, y, z) node positions (optional)
+           Returns the list of created TBIntfs."""
+        self.machelper.SetType ("ns3::StaWifiMac",
+                                "Ssid", ns.wifi.SsidValue (ns.wifi.Ssid(ssid)),
+                                "ScanType", ns.core.EnumValue (ns.wifi.StaWifiMac.ACTIVE))
+        self.phyhelper.Set ("ChannelNumber", ns.core.UintegerValue (channelNumber))
+        return self.addMany( nodes, positions, ports, intfNames, mode )
+
+    def addTraffic( self, count=2, positions=None, mac='adhoc', ssid="default-ssid", channelNumber=1,
+                    **traffic ):
+        """Connect hidden ns-3 nodes to the segment and run traffic between them.
+           count: number of hidden nodes
+           positions: list of (x, y, z) node positions (optional), default: origin
+           mac: adhoc (default) or sta, to associate the nodes with the Ap of ssid
+           traffic: BackgroundTraffic parameters (flows, pattern, rate, ...)
+           Returns the BackgroundTraffic."""
+        if mac == 'sta':
+            self.machelper.SetType ("ns3::StaWifiMac",
+                                    "Ssid", ns.wifi.SsidValue (ns.wifi.Ssid(ssid)),
+                                    "ScanType", ns.core.EnumValue (ns.wifi.StaWifiMac.ACTIVE))
+        else:
+            self.machelper.SetType ("ns3::AdhocWifiMac")
+        self.phyhelper.Set ("ChannelNumber", ns.core.UintegerValue (channelNumber))
+        nodes = [ HiddenNode( 'bg%d' % i ) for i in range( count ) ]
+        container = ns.network.NodeContainer()
+        for node in nodes:
+            container.Add( node.nsNode )
+        devices = self.wifihelper.Install( self.phyhelper, self.machelper, container )
+        mobilityhelper = ns.mobility.MobilityHelper()
+        if positions is not None:
+            setListPositionAllocate( mobilityhelper, createPositionList( positions ) )
+        mobilityhelper.Install( container )
+        self.track( *nodes )
+        return BackgroundTraffic( nodes, devices, **traffic )
+
+# With a Yans channel every transmission is delivered to every PHY attached to the channel, however
+# far it is. In large sparse deployments (campus-sized topologies) most of that per-frame work is spent
+# on receivers which can never decode the frame. The spectrum WiFi PHY uses a SpectrumChannel, which
+# evaluates the path loss of each receiver and drops the transmission for this receiver before any
+# receive event is scheduled when the loss exceeds the channel MaxLossDb attribute. WIFIRangeSegment
+# derives that threshold from a reception (or interference) range in meters, using the same
+# log-distance propagation model the channel applies.
+
+class WIFIRangeSegment( WIFISegment ):
+    """Radio WiFi channel delivering frames only to receivers within range.
+       Only Ap and WDS devices support SendFrom()."""
+    def __init__( self, maxRange=250.0, lossExponent=3.0,
+                  referenceDistance=1.0, referenceLoss=46.6777, backend='tapbridge', checksum=True ):
+        """maxRange: reception or interference range in meters
+           lossExponent, referenceDistance, referenceLoss: log-distance model parameters,
+           default: same as YansWifiChannelHelper.Default()
+           backend, checksum: see WIFISegment"""
+        self.maxRange = maxRange
+        WIFISegment.__init__( self, staticLoss=False, lossExponent=lossExponent,
+                              referenceDistance=referenceDistance, referenceLoss=referenceLoss,
+                              backend=backend, checksum=checksum )
+
+    def createChannel( self ):
+        """Create a spectrum PHY helper and a channel culling receivers out of maxRange."""
+        self.phyhelper = ns.wifi.SpectrumWifiPhyHelper()
+        self.lossModel = ns.propagation.LogDistancePropagationLossModel()
+        self.lossModel.SetAttribute( "Exponent", ns.core.DoubleValue( self.lossExponent ) )
+        self.lossModel.SetAttribute( "ReferenceDistance", ns.core.DoubleValue( self.referenceDistance ) )
+        self.lossModel.SetAttribute( "ReferenceLoss", ns.core.DoubleValue( self.referenceLoss ) )
+        self.channel = ns.spectrum.MultiModelSpectrumChannel()
+        self.channel.AddPropagationLossModel( self.lossModel )
+        self.channel.SetPropagationDelayModel( ns.propagation.ConstantSpeedPropagationDelayModel() )
+        self.setRange( self.maxRange )
+        self.phyhelper.SetChannel( self.channel )
+
+    def setRange( self, maxRange ):
+        """Set the reception or interference range in meters.
+           Receivers farther away than that never see the transmission."""
+        self.maxRange = maxRange
+        self.channel.SetAttribute( "MaxLossDb", ns.core.DoubleValue( self.pairLoss( maxRange ) ) )
+
 class WIFIApStaLink( WIFISegment, Link ):
     """Link between two nodes using infrastructure WiFi channel."""
     def __init__( self, node1, node2, port1=None, port2=None,
@@ -820,6 +1709,7 @@ class WIFIBridgeLink( WIFISegment, Link ):
                                 "ReceiverAddress", ns.network.Mac48AddressValue( ns.network.Mac48Address( tb2.MAC() ) ) )
         # Create and install WifiNetDevice.
         device1 = self.wifihelper.Install( self.phyhelper, self.machelper, node1.nsNode ).Get( 0 )
+        self.track( node1 )
         # Set nsDevice in TapBridge the the created one.
         tb1.nsDevice = device1
         # Install TapBridge to the ns-3 node.
@@ -830,6 +1720,7 @@ class WIFIBridgeLink( WIFISegment, Link ):
                                 "ReceiverAddress", ns.network.Mac48AddressValue( ns.network.Mac48Address( tb1.MAC() ) ) )
         # Create and install WifiNetDevice.
         device2 = self.wifihelper.Install( self.phyhelper, self.machelper, node2.nsNode ).Get( 0 )
+        self.track( node2 )
         # Set nsDevice in TapBridge the the created one.
         tb2.nsDevice = device2
         # Install TapBridge to the ns-3 node.
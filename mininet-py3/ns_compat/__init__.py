@@ -21,10 +21,64 @@ Usage:
 
     # Then old-style imports will work:
     import ns.core  # Will actually import from ns_compat.core
+
+The bindings themselves are only loaded on first access to an ns-3 name, so
+importing ns_compat (or a Mininet module using it) costs nothing in runs
+that never touch ns-3.
 """
 
-from ns import ns as _ns
+import os
 
-# Re-export the main ns namespace
+# Re-export the main ns namespace, loaded on first access
 # This allows `from ns_compat import ns` to work like `from ns import ns`
-ns = _ns
+def __getattr__(name):
+    if name == 'ns':
+        from ns import ns as _ns
+        globals()['ns'] = _ns
+        return _ns
+    raise AttributeError(name)
+
+def _lazyModule(namespace, module):
+    """Return the (__getattr__, __dir__) pair of a shim module resolving its
+    names from the given namespace of the Cppyy bindings.
+
+    The bindings are loaded on the first access to a name. Resolved names are
+    memoized in the module namespace: later accesses are plain module
+    attribute lookups and do not call __getattr__ again.
+
+    namespace: globals() of the shim module
+    module: name of the ns-3 namespace, e.g. 'csma'"""
+    def __getattr__(name):
+        # Module machinery (e.g. __path__ lookups) must not load ns-3
+        if name.startswith('__'):
+            raise AttributeError(name)
+        from ns import ns as _ns
+        value = getattr(getattr(_ns, module), name)
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(namespace.get('__all__', ())))
+
+    return __getattr__, __dir__
+
+def usePchCache(path=None):
+    """Keep the precompiled header (PCH) Cppyy builds from the C++ standard
+    headers at a persistent, writable path.
+
+    Cppyy starts by loading this PCH and builds it when it is missing or
+    stale. Where its default location is not writable (e.g. a system-wide
+    install), it is rebuilt on every start. Must be called before the
+    bindings are loaded; the NS_COMPAT_PCH environment variable does the same
+    when ns_compat is imported. An explicit CLING_STANDARD_PCH is kept.
+
+    path: PCH file, default: ~/.cache/ns_compat/allDict.cxx.pch
+    Returns the PCH path in use."""
+    if path is None:
+        path = os.path.join(os.path.expanduser('~'), '.cache', 'ns_compat',
+                            'allDict.cxx.pch')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return os.environ.setdefault('CLING_STANDARD_PCH', path)
+
+if os.environ.get('NS_COMPAT_PCH'):
+    usePchCache(os.environ['NS_COMPAT_PCH'])
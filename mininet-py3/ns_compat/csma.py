@@ -4,16 +4,12 @@ ns_compat.csma - Compatibility shim for ns.csma module
 Re-exports all attributes from ns-3.41 Cppyy bindings' csma namespace.
 """
 
-from ns import ns as _ns
+from . import _lazyModule
 
-# Get the csma namespace from Cppyy bindings
-_csma = _ns.csma
+# Commonly used classes and functions. They are resolved from the Cppyy
+# bindings on first access, like every other attribute: importing this
+# module does not load ns-3.
+__all__ = ['CsmaHelper', 'CsmaChannel', 'CsmaNetDevice']
 
-# Re-export commonly used classes
-CsmaHelper = _csma.CsmaHelper
-CsmaChannel = _csma.CsmaChannel
-CsmaNetDevice = _csma.CsmaNetDevice
-
-# Allow dynamic attribute access for anything not explicitly listed
-def __getattr__(name):
-    return getattr(_csma, name)
+# Names are resolved and memoized by the module __getattr__
+__getattr__, __dir__ = _lazyModule(globals(), 'csma')
@@ -4,18 +4,14 @@ ns_compat.internet - Compatibility shim for ns.internet module
 Re-exports all attributes from ns-3.41 Cppyy bindings' internet namespace.
 """
 
-from ns import ns as _ns
+from . import _lazyModule
 
-# Get the internet namespace from Cppyy bindings
-_internet = _ns.internet
+# Commonly used classes and functions. They are resolved from the Cppyy
+# bindings on first access, like every other attribute: importing this
+# module does not load ns-3.
+__all__ = ['InternetStackHelper', 'Ipv4AddressHelper',
+           'Ipv4InterfaceContainer', 'Ipv4GlobalRoutingHelper',
+           'Ipv4StaticRoutingHelper']
 
-# Re-export commonly used classes
-InternetStackHelper = _internet.InternetStackHelper
-Ipv4AddressHelper = _internet.Ipv4AddressHelper
-Ipv4InterfaceContainer = _internet.Ipv4InterfaceContainer
-Ipv4GlobalRoutingHelper = _internet.Ipv4GlobalRoutingHelper
-Ipv4StaticRoutingHelper = _internet.Ipv4StaticRoutingHelper
-
-# Allow dynamic attribute access for anything not explicitly listed
-def __getattr__(name):
-    return getattr(_internet, name)
+# Names are resolved and memoized by the module __getattr__
+__getattr__, __dir__ = _lazyModule(globals(), 'internet')
@@ -4,22 +4,14 @@ ns_compat.lte - Compatibility shim for ns.lte module
 Re-exports all attributes from ns-3.41 Cppyy bindings' lte namespace.
 """
 
-from ns import ns as _ns
+from . import _lazyModule
 
-# Get the lte namespace from Cppyy bindings
-_lte = _ns.lte
+# Commonly used classes and functions. They are resolved from the Cppyy
+# bindings on first access, like every other attribute: importing this
+# module does not load ns-3.
+__all__ = ['LteHelper', 'EpcHelper', 'PointToPointEpcHelper',
+           'NoBackhaulEpcHelper', 'LteEnbNetDevice', 'LteUeNetDevice',
+           'LteEnbRrc', 'LteUeRrc', 'EpsBearer']
 
-# Re-export commonly used classes
-LteHelper = _lte.LteHelper
-EpcHelper = _lte.EpcHelper
-PointToPointEpcHelper = _lte.PointToPointEpcHelper
-NoBackhaulEpcHelper = _lte.NoBackhaulEpcHelper
-LteEnbNetDevice = _lte.LteEnbNetDevice
-LteUeNetDevice = _lte.LteUeNetDevice
-LteEnbRrc = _lte.LteEnbRrc
-LteUeRrc = _lte.LteUeRrc
-EpsBearer = _lte.EpsBearer
-
-# Allow dynamic attribute access for anything not explicitly listed
-def __getattr__(name):
-    return getattr(_lte, name)
+# Names are resolved and memoized by the module __getattr__
+__getattr__, __dir__ = _lazyModule(globals(), 'lte')
@@ -4,21 +4,14 @@ ns_compat.mobility - Compatibility shim for ns.mobility module
 Re-exports all attributes from ns-3.41 Cppyy bindings' mobility namespace.
 """
 
-from ns import ns as _ns
+from . import _lazyModule
 
-# Get the mobility namespace from Cppyy bindings
-_mobility = _ns.mobility
+# Commonly used classes and functions. They are resolved from the Cppyy
+# bindings on first access, like every other attribute: importing this
+# module does not load ns-3.
+__all__ = ['MobilityHelper', 'MobilityModel', 'ConstantPositionMobilityModel',
+           'ConstantVelocityMobilityModel', 'RandomWaypointMobilityModel',
+           'ListPositionAllocator', 'GridPositionAllocator', 'Vector']
 
-# Re-export commonly used classes
-MobilityHelper = _mobility.MobilityHelper
-MobilityModel = _mobility.MobilityModel
-ConstantPositionMobilityModel = _mobility.ConstantPositionMobilityModel
-ConstantVelocityMobilityModel = _mobility.ConstantVelocityMobilityModel
-RandomWaypointMobilityModel = _mobility.RandomWaypointMobilityModel
-ListPositionAllocator = _mobility.ListPositionAllocator
-GridPositionAllocator = _mobility.GridPositionAllocator
-Vector = _mobility.Vector
-
-# Allow dynamic attribute access for anything not explicitly listed
-def __getattr__(name):
-    return getattr(_mobility, name)
+# Names are resolved and memoized by the module __getattr__
+__getattr__, __dir__ = _lazyModule(globals(), 'mobility')
@@ -4,27 +4,15 @@ ns_compat.network - Compatibility shim for ns.network module
 Re-exports all attributes from ns-3.41 Cppyy bindings' network namespace.
 """
 
-from ns import ns as _ns
+from . import _lazyModule
 
-# Get the network namespace from Cppyy bindings
-_network = _ns.network
+# Commonly used classes and functions. They are resolved from the Cppyy
+# bindings on first access, like every other attribute: importing this
+# module does not load ns-3.
+__all__ = ['Node', 'NodeContainer', 'NetDevice', 'NetDeviceContainer',
+           'Channel', 'Packet', 'Socket', 'Address', 'Ipv4Address',
+           'Ipv6Address', 'Mac48Address', 'PacketSocketHelper',
+           'SimpleChannel', 'SimpleNetDevice']
 
-# Re-export commonly used classes
-Node = _network.Node
-NodeContainer = _network.NodeContainer
-NetDevice = _network.NetDevice
-NetDeviceContainer = _network.NetDeviceContainer
-Channel = _network.Channel
-Packet = _network.Packet
-Socket = _network.Socket
-Address = _network.Address
-Ipv4Address = _network.Ipv4Address
-Ipv6Address = _network.Ipv6Address
-Mac48Address = _network.Mac48Address
-PacketSocketHelper = _network.PacketSocketHelper
-SimpleChannel = _network.SimpleChannel
-SimpleNetDevice = _network.SimpleNetDevice
-
-# Allow dynamic attribute access for anything not explicitly listed
-def __getattr__(name):
-    return getattr(_network, name)
+# Names are resolved and memoized by the module __getattr__
+__getattr__, __dir__ = _lazyModule(globals(), 'network')
@@ -4,15 +4,12 @@ ns_compat.tap_bridge - Compatibility shim for ns.tap_bridge module
 Re-exports all attributes from ns-3.41 Cppyy bindings' tap-bridge namespace.
 """
 
-from ns import ns as _ns
+from . import _lazyModule
 
-# Get the tap_bridge namespace from Cppyy bindings
-_tap_bridge = _ns.tap_bridge
+# Commonly used classes and functions. They are resolved from the Cppyy
+# bindings on first access, like every other attribute: importing this
+# module does not load ns-3.
+__all__ = ['TapBridgeHelper', 'TapBridge']
 
-# Re-export commonly used classes
-TapBridgeHelper = _tap_bridge.TapBridgeHelper
-TapBridge = _tap_bridge.TapBridge
-
-# Allow dynamic attribute access for anything not explicitly listed
-def __getattr__(name):
-    return getattr(_tap_bridge, name)
+# Names are resolved and memoized by the module __getattr__
+__getattr__, __dir__ = _lazyModule(globals(), 'tap_bridge')
@@ -3,16 +3,21 @@ import sys, os, time, atexit
 from signal import SIGTERM
 
 import socket
+import struct
 import multiprocessing
 
+from math import log10
 from re import findall
-from threading import Thread
+from threading import Thread, Lock
+from collections import deque
+from queue import Queue
 from time import sleep
 
 from datetime import datetime
 
 import mininet.node
 import mininet.link
+from mininet.lte import UE_STATS_FIELDS, CELL_STATS_FIELDS, FLOW_FIELDS, statsStruct
 
 from ns.lte import *
 from ns.core import *
@@ -22,6 +27,8 @@ from ns.mobility import *
 from ns.fd_net_device import *
 from ns.tap_bridge import *
 from ns.wifi import *
+from ns.applications import *
+from ns.flow_monitor import *
 
 class Daemon:
     """
@@ -149,6 +156,334 @@ class Daemon:
         """
         pass
 
+SCHED_POLICIES = {'other': os.SCHED_OTHER, 'batch': os.SCHED_BATCH,
+                  'fifo': os.SCHED_FIFO, 'rr': os.SCHED_RR}
+
+def tuneThread (tid, cpus=None, policy=None, priority=None, nice=None):
+    """
+    Set the CPU affinity, scheduling policy and nice level of a thread
+    (see tuneThread in mininet.ns3). Returns the applied settings.
+    """
+    applied = {}
+    if cpus != None:
+        try:
+            os.sched_setaffinity (tid, cpus)
+            applied['simulatorCpus'] = sorted (os.sched_getaffinity (tid))
+        except OSError as e:
+            print ('cannot set CPU affinity of thread {0}: {1}'.format (tid, e))
+    if policy != None:
+        if priority == None:
+            priority = 50 if policy in ('fifo', 'rr') else 0
+        try:
+            os.sched_setscheduler (tid, SCHED_POLICIES[policy], os.sched_param (priority))
+            applied['simulatorPolicy'] = policy
+            applied['simulatorPriority'] = priority
+        except OSError as e:
+            print ('cannot set scheduling policy {0} of thread {1}: {2}'.format (policy, tid, e))
+    if nice != None:
+        try:
+            os.setpriority (os.PRIO_PROCESS, tid, nice)
+            applied['simulatorNice'] = os.getpriority (os.PRIO_PROCESS, tid)
+        except OSError as e:
+            print ('cannot set nice level of thread {0}: {1}'.format (tid, e))
+    return applied
+
+def runSimulator (duration=86400, cpus=None, policy=None, priority=None, nice=None):
+    """
+    Simulator thread target: tune the thread before the simulator creates
+    its TapBridge reader threads, which inherit the settings, then run.
+    """
+    print ('simulator thread settings: {0}'.format (tuneThread (0, cpus, policy, priority, nice)))
+    sys.stdout.flush ()
+    Simulator.Stop (Seconds (duration))
+    Simulator.Run ()
+
+class RealtimeProbe (object):
+    """
+    Periodic simulator event recording (wall time, simulated time, simulator
+    thread CPU time) samples, used by the Mininet side to measure realtime
+    lateness and simulator load (see mininet.timedilation).
+    Must be created before the simulator thread starts.
+    """
+    def __init__ (self, interval=0.1, window=600):
+        self.interval = interval
+        self.samples = deque (maxlen=window)
+        self.lock = Lock ()
+        Simulator.Schedule (Seconds (interval), self.probe)
+
+    def probe (self):
+        sample = (time.time (), Simulator.Now ().GetSeconds (), time.thread_time ())
+        with self.lock:
+            self.samples.append (sample)
+        Simulator.Schedule (Seconds (self.interval), self.probe)
+
+    def send (self, csock, seconds=None):
+        with self.lock:
+            samples = list (self.samples)
+        if seconds != None and samples:
+            samples = [s for s in samples if s[0] >= samples[-1][0] - seconds]
+        csock.sendall (struct.pack ('<I', len (samples)) + b''.join (struct.pack ('<ddd', *s) for s in samples))
+
+class BackgroundTraffic (object):
+    """
+    ns-3 traffic sources and sinks on hidden nodes, which have an internet
+    stack and no TapBridge (see BackgroundTraffic in mininet.ns3).
+    flows are (source index, destination) pairs; the destination is the
+    index of a node, which gets a sink, or an IPv4 address string.
+    """
+    def __init__ (self, nodes, interfaces, flows, pattern='onoff', rate='1Mbps', packetSize=1000,
+                  burst=0.1, startTime=0.0, stopTime=None, port=9000):
+        factory = "ns3::TcpSocketFactory" if pattern == 'bulk' else "ns3::UdpSocketFactory"
+        self.sources = ApplicationContainer ()
+        self.sinks = ApplicationContainer ()
+        for k, (src, dst) in enumerate (flows):
+            if isinstance (dst, int):
+                sink = PacketSinkHelper (factory, Address (InetSocketAddress (Ipv4Address.GetAny (), port + k)))
+                self.sinks.Add (sink.Install (nodes.Get (dst)))
+                dst = interfaces.GetAddress (dst)
+            else:
+                dst = Ipv4Address (dst)
+            remote = Address (InetSocketAddress (dst, port + k))
+            if pattern == 'bulk':
+                source = BulkSendHelper (factory, remote)
+                source.SetAttribute ("MaxBytes", UintegerValue (0))
+                source.SetAttribute ("SendSize", UintegerValue (packetSize))
+            else:
+                source = OnOffHelper (factory, remote)
+                source.SetConstantRate (DataRate (rate), packetSize)
+                if pattern == 'poisson':
+                    source.SetAttribute ("DataRate", DataRateValue (DataRate (2 * DataRate (rate).GetBitRate ())))
+                    variable = "ns3::ExponentialRandomVariable[Mean={0}]".format (burst)
+                    source.SetAttribute ("OnTime", StringValue (variable))
+                    source.SetAttribute ("OffTime", StringValue (variable))
+            self.sources.Add (source.Install (nodes.Get (src)))
+        self.sinks.Start (Seconds (0))
+        self.sources.Start (Seconds (startTime))
+        if stopTime != None:
+            self.sources.Stop (Seconds (stopTime))
+
+    def send (self, csock):
+        rx = [self.sinks.Get (i).GetTotalRx () for i in range (self.sinks.GetN ())]
+        csock.sendall (struct.pack ('<I', len (rx)) + b''.join (struct.pack ('<Q', r) for r in rx))
+
+class LteStatsCollector (object):
+    """
+    Samples the RLC/PDCP stats calculators and the UE PHY RSRP/SINR reports
+    every interval of simulated time, aggregates them per UE and per cell and
+    stores them as packed records (see UE_STATS_FIELDS and CELL_STATS_FIELDS
+    in mininet.lte). Samples are appended to chunk files by a background
+    writer thread and the most recent ones are kept in memory for send ().
+    flush () writes the last partial chunk once the simulator has stopped,
+    close () also waits for the writer thread.
+    """
+    def __init__ (self, lteHelper, ueLteDevs, interval=0.1, path='/tmp/opennet-lte-stats',
+                  lcids=(3,), chunkSamples=600, window=600):
+        self.ueLteDevs = ueLteDevs
+        self.interval = interval
+        self.path = path
+        self.lcids = lcids
+        self.chunkSamples = chunkSamples
+        self.ueStruct = statsStruct (UE_STATS_FIELDS)
+        self.cellStruct = statsStruct (CELL_STATS_FIELDS)
+        self.recent = deque (maxlen=window)
+        self.lock = Lock ()
+        self.last = {}
+        self.phy = {}
+        self.ueChunk = []
+        self.cellChunk = []
+        self.chunkIndex = 0
+        if not os.path.exists (path):
+            os.makedirs (path)
+
+        # The calculators would otherwise write text files at every epoch and
+        # reset their counters; keep a single epoch and compute deltas here.
+        Config.SetDefault ("ns3::RadioBearerStatsCalculator::EpochDuration", TimeValue (Seconds (10 ** 9)))
+        for attr in ("DlRlcOutputFilename", "UlRlcOutputFilename", "DlPdcpOutputFilename", "UlPdcpOutputFilename"):
+            Config.SetDefault ("ns3::RadioBearerStatsCalculator::" + attr, StringValue ("/dev/null"))
+        lteHelper.EnableRlcTraces ()
+        lteHelper.EnablePdcpTraces ()
+        self.rlcStats = lteHelper.GetRlcStats ()
+        self.pdcpStats = lteHelper.GetPdcpStats ()
+
+        for phyPath in ("/NodeList/*/DeviceList/*/LteUePhy/ReportCurrentCellRsrpSinr",
+                        "/NodeList/*/DeviceList/*/ComponentCarrierMapUe/*/LteUePhy/ReportCurrentCellRsrpSinr"):
+            try:
+                Config.ConnectWithoutContext (phyPath, MakeCallback (self.reportRsrpSinr))
+            except Exception as e:
+                print ('LteStatsCollector: cannot connect {0}: {1}'.format (phyPath, e))
+
+        self.queue = Queue ()
+        self.writerThread = Thread (target=self.writer)
+        self.writerThread.daemon = True
+        self.writerThread.start ()
+        Simulator.Schedule (Seconds (interval), self.sample)
+
+    def reportRsrpSinr (self, cellId, rnti, rsrp, sinr, *args):
+        acc = self.phy.setdefault ((cellId, rnti), [0.0, 0.0, 0])
+        acc[0] += rsrp
+        acc[1] += sinr
+        acc[2] += 1
+
+    def sample (self):
+        now = Simulator.Now ().GetSeconds ()
+        ueRecords = []
+        cells = {}
+        for i in range (self.ueLteDevs.GetN ()):
+            dev = self.ueLteDevs.Get (i).GetObject (LteUeNetDevice.GetTypeId ())
+            imsi = dev.GetImsi ()
+            rrc = dev.GetRrc ()
+            cellId = rrc.GetCellId ()
+            counters = [0] * 8
+            delays = [0.0] * 4
+            for lcid in self.lcids:
+                for j, stats in enumerate ((self.rlcStats, self.pdcpStats)):
+                    counters[4 * j + 0] += stats.GetDlTxData (imsi, lcid)
+                    counters[4 * j + 1] += stats.GetDlRxData (imsi, lcid)
+                    counters[4 * j + 2] += stats.GetUlTxData (imsi, lcid)
+                    counters[4 * j + 3] += stats.GetUlRxData (imsi, lcid)
+                    delays[2 * j + 0] = max (delays[2 * j + 0], stats.GetDlDelay (imsi, lcid) * 1e-9)
+                    delays[2 * j + 1] = max (delays[2 * j + 1], stats.GetUlDelay (imsi, lcid) * 1e-9)
+            last = self.last.get (imsi, [0] * 8)
+            self.last[imsi] = counters
+            deltas = [max (c - l, 0) for c, l in zip (counters, last)]
+            acc = self.phy.pop ((cellId, rrc.GetRnti ()), None)
+            if acc != None and acc[2] > 0 and acc[1] > 0:
+                rsrp = acc[0] / acc[2]
+                sinr = 10 * log10 (acc[1] / acc[2])
+            else:
+                rsrp = sinr = float ('nan')
+            ueRecords.append (self.ueStruct.pack (now, imsi, cellId, *(deltas + delays + [rsrp, sinr])))
+            cell = cells.setdefault (cellId, [0, 0, 0, 0, 0, 0.0, 0])
+            cell[0] += 1
+            cell[1] += deltas[1]
+            cell[2] += deltas[3]
+            cell[3] += deltas[5]
+            cell[4] += deltas[7]
+            if sinr == sinr:
+                cell[5] += sinr
+                cell[6] += 1
+        self.phy.clear ()
+        cellRecords = [self.cellStruct.pack (now, cellId, c[0], c[1], c[2], c[3], c[4],
+                                             c[5] / c[6] if c[6] else float ('nan'))
+                       for cellId, c in sorted (cells.items ())]
+        ueBytes = b''.join (ueRecords)
+        cellBytes = b''.join (cellRecords)
+        with self.lock:
+            self.recent.append ((now, ueBytes, cellBytes))
+        self.ueChunk.append (ueBytes)
+        self.cellChunk.append (cellBytes)
+        if len (self.ueChunk) >= self.chunkSamples:
+            self.flush ()
+        Simulator.Schedule (Seconds (self.interval), self.sample)
+
+    def flush (self):
+        if not self.ueChunk:
+            return
+        self.queue.put ((self.chunkIndex, b''.join (self.ueChunk), b''.join (self.cellChunk)))
+        self.chunkIndex += 1
+        self.ueChunk = []
+        self.cellChunk = []
+
+    def close (self):
+        self.flush ()
+        self.queue.put (None)
+        self.writerThread.join ()
+
+    def writer (self):
+        while True:
+            item = self.queue.get ()
+            if item == None:
+                break
+            index, ueBytes, cellBytes = item
+            for kind, data in (('ue', ueBytes), ('cell', cellBytes)):
+                with open (os.path.join (self.path, '{0}-{1:06d}.bin'.format (kind, index)), 'wb') as f:
+                    f.write (data)
+
+    def send (self, csock, window=None):
+        with self.lock:
+            recent = list (self.recent)
+        if window != None and recent:
+            recent = [r for r in recent if r[0] >= recent[-1][0] - window]
+        ueBytes = b''.join (r[1] for r in recent)
+        cellBytes = b''.join (r[2] for r in recent)
+        csock.sendall (struct.pack ('<II', len (ueBytes), len (cellBytes)) + ueBytes + cellBytes)
+
+class LteFlowMonitor (object):
+    """
+    ns-3 FlowMonitor on the UE nodes (and the PGW node when given). Every
+    interval of simulated time the per-flow statistics are packed into a
+    snapshot (see FLOW_FIELDS and loadFlows in mininet.lte), kept for send ()
+    and, when path is set, written to a file by a background writer thread.
+    The maximum delay is the upper edge of the highest non-empty delay bin.
+    """
+    def __init__ (self, ueLteDevs, pgw=None, binWidth=0.0005, bins=200, interval=1.0, path=None):
+        self.interval = interval
+        self.path = path
+        self.bins = bins
+        self.binWidth = binWidth
+        self.flowStruct = statsStruct (FLOW_FIELDS)
+        nodes = NodeContainer ()
+        for i in range (ueLteDevs.GetN ()):
+            nodes.Add (ueLteDevs.Get (i).GetNode ())
+        if pgw != None:
+            nodes.Add (pgw)
+        self.helper = FlowMonitorHelper ()
+        self.helper.SetMonitorAttribute ("DelayBinWidth", DoubleValue (binWidth))
+        self.helper.SetMonitorAttribute ("JitterBinWidth", DoubleValue (binWidth))
+        self.monitor = self.helper.Install (nodes)
+        self.classifier = self.helper.GetClassifier ()
+        self.lock = Lock ()
+        self.latest = struct.pack ('<IId', 0, bins, binWidth)
+        self.index = 0
+        if path != None:
+            if not os.path.exists (path):
+                os.makedirs (path)
+            self.queue = Queue ()
+            writer = Thread (target=self.writer)
+            writer.daemon = True
+            writer.start ()
+        Simulator.Schedule (Seconds (interval), self.snapshot)
+
+    def snapshot (self):
+        self.monitor.CheckForLostPackets ()
+        records = []
+        histograms = []
+        for flowId, stats in self.monitor.GetFlowStats ():
+            t = self.classifier.FindFlow (flowId)
+            histogram = stats.delayHistogram
+            counts = [0] * self.bins
+            delayMax = 0.0
+            for i in range (histogram.GetNBins ()):
+                count = histogram.GetBinCount (i)
+                if count:
+                    counts[min (i, self.bins - 1)] += count
+                    delayMax = histogram.GetBinEnd (i)
+            records.append (self.flowStruct.pack (t.sourceAddress.Get (), t.destinationAddress.Get (),
+                                                  t.sourcePort, t.destinationPort, t.protocol,
+                                                  stats.txPackets, stats.txBytes, stats.rxPackets,
+                                                  stats.rxBytes, stats.lostPackets,
+                                                  stats.delaySum.GetSeconds (), stats.jitterSum.GetSeconds (),
+                                                  delayMax))
+            histograms.append (struct.pack ('<{0}I'.format (self.bins), *counts))
+        data = struct.pack ('<IId', len (records), self.bins, self.binWidth) + b''.join (records) + b''.join (histograms)
+        with self.lock:
+            self.latest = data
+        if self.path != None:
+            self.queue.put ((self.index, data))
+            self.index += 1
+        Simulator.Schedule (Seconds (self.interval), self.snapshot)
+
+    def writer (self):
+        while True:
+            index, data = self.queue.get ()
+            with open (os.path.join (self.path, 'flows-{0:06d}.bin'.format (index)), 'wb') as f:
+                f.write (data)
+
+    def send (self, csock):
+        with self.lock:
+            data = self.latest
+        csock.sendall (struct.pack ('<I', len (data)) + data)
+
 class OpenNetAgent(Daemon):
     def run (self):
         msock = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
@@ -3,9 +3,17 @@
 import os
 import socket
 import fcntl
+import glob
+import gzip
+import shutil
 import struct
+import tempfile
+import threading
+import time
 # ns-3.41 Cppyy bindings use single namespace import
 from ns import ns
+# Flow snapshots (see loadFlows) share their layout with the LteFlowMonitor of opennet-agent.
+from mininet.lte import loadFlows
 
 def getIntfAddr (intf):
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -20,11 +28,35 @@ def checkDictionaryPath(path):
     return path
 
 class Netanim( object ):
-    def __init__(self, path="/tmp/xml/wifi-wired-bridged4.xml", nodes=None, packetmetadata=True):
+    def __init__(self, path="/tmp/xml/wifi-wired-bridged4.xml", nodes=None, packetmetadata=True,
+                 startTime=None, stopTime=None, maxPackets=0, packets=True, pollInterval=None,
+                 compress=False, maxChunks=0, interval=5.0):
+        """ path: XML trace file
+        packetmetadata: write packet metadata (headers) with each packet
+        startTime, stopTime: simulated seconds between which the animation is traced (optional)
+        maxPackets: packets per XML file; when exceeded, NetAnim goes on in path-1, path-2... (0: no limit)
+        packets: trace packets; False traces nodes, positions and counters only
+        pollInterval: simulated seconds between two mobility position updates (optional)
+        compress: gzip each completed XML file in a background thread
+        maxChunks: number of compressed files kept, older ones are deleted (0: keep all)
+        interval: seconds between two looks for completed files """
         self.path = path
         self.packetmetadata = packetmetadata
         self.nodes = nodes
+        self.startTime = startTime
+        self.stopTime = stopTime
+        self.maxPackets = maxPackets
+        self.packets = packets
+        self.pollInterval = pollInterval
+        self.maxChunks = maxChunks
+        self.interval = interval
         self.netanim = self.Netanim()
+        self.running = compress
+        self.thread = None
+        if compress:
+            self.thread = threading.Thread(target=self.compressLoop)
+            self.thread.daemon = True
+            self.thread.start()
 
     def __str__(self):
         return repr(self)
@@ -38,8 +70,56 @@ class Netanim( object ):
         checkDictionaryPath(self.path)
         netanim = ns.netanim.AnimationInterface(self.path)
         netanim.EnablePacketMetadata(self.packetmetadata)
+        if self.startTime is not None:
+            netanim.SetStartTime(ns.core.Seconds(self.startTime))
+        if self.stopTime is not None:
+            netanim.SetStopTime(ns.core.Seconds(self.stopTime))
+        if self.maxPackets:
+            netanim.SetMaxPktsPerTraceFile(self.maxPackets)
+        if not self.packets:
+            netanim.SkipPacketTracing()
+        if self.pollInterval is not None:
+            netanim.SetMobilityPollInterval(ns.core.Seconds(self.pollInterval))
         return netanim
 
+    def chunks(self):
+        """ Return the uncompressed XML files written so far, oldest first. """
+        def sequence(name):
+            return 0 if name == self.path else int(name[len(self.path) + 1:])
+        names = [name for name in glob.glob(self.path + "-*") if name[len(self.path) + 1:].isdigit()]
+        if os.path.exists(self.path):
+            names.append(self.path)
+        return sorted(names, key=sequence)
+
+    def compress(self, final=False):
+        """ Gzip the completed XML files and delete the oldest beyond maxChunks.
+        final: also compress the last file, which NetAnim may still be writing """
+        chunks = self.chunks()
+        if not final:
+            chunks = chunks[:-1]
+        for chunk in chunks:
+            with open(chunk, 'rb') as src, gzip.open(chunk + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(chunk)
+        if self.maxChunks:
+            compressed = sorted(glob.glob(self.path + '*.gz'), key=os.path.getmtime)
+            for name in compressed[:-self.maxChunks]:
+                os.remove(name)
+
+    def compressLoop(self):
+        """ Compress completed XML files every interval seconds, runs in its own thread. """
+        while self.running:
+            time.sleep(self.interval)
+            self.compress()
+
+    def stop(self):
+        """ Stop compressing; the last file is compressed too once stopTime has passed. """
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            final = self.stopTime is not None and ns.core.Simulator.Now().GetSeconds() >= self.stopTime
+            self.compress(final)
+
     def getNetanimPath(self):
         return self.path
 
@@ -79,6 +159,42 @@ class Pcap( object ):
     def getCSMAPath(self):
         return self.csma_pcap_path
 
+    def capture(self, target, prefix="/tmp/pcap/capture", snaplen=65535, sample=1, maxBytes=0,
+                maxSeconds=0, maxFiles=0, promisc=None, bufferBytes=16 << 20, flushInterval=0.5):
+        """ Capture the frames of segments or devices to a rotated series of pcap files.
+        target: wired segment (its channel is captured from its first device), TBIntf,
+        ns-3 device, or a list of these; a WiFi device only hears the frames in its
+        reception range, so WiFi segments must be captured by device or TBIntf
+        prefix: file name prefix, files are named prefix-NNNNNN.pcap
+        snaplen: bytes kept of each frame
+        sample: keep one frame out of sample
+        maxBytes, maxSeconds: start a new file after that many bytes or wall seconds (0: never)
+        maxFiles: number of files kept, older ones are deleted (0: keep all)
+        promisc: capture frames not addressed to the devices (optional), default: True for segments
+        bufferBytes: memory buffer between the simulator and the writer thread; frames
+        arriving while it is full are dropped and counted
+        flushInterval: seconds between two writes of the buffer
+        Returns the PcapCapture, call stop() on it to close the files. """
+        targets = target if isinstance(target, (list, tuple)) else [target]
+        devices = []
+        for t in targets:
+            if hasattr(t, 'nsDevice'):
+                devices.append(t.nsDevice)
+            elif hasattr(t, 'channel'):
+                if promisc is None:
+                    promisc = True
+                if t.channel.GetNDevices() > 0:
+                    device = t.channel.GetDevice(0)
+                    if device.GetInstanceTypeId().GetName() == 'ns3::WifiNetDevice':
+                        raise ValueError('Can not capture a whole WiFi segment: '
+                                         'capture its devices or TBIntfs instead')
+                    devices.append(device)
+            else:
+                devices.append(t)
+        checkDictionaryPath(prefix)
+        return PcapCapture(devices, prefix, snaplen, sample, maxBytes, maxSeconds, maxFiles,
+                           bool(promisc), bufferBytes, flushInterval)
+
     def enable(self):
 
         """ Setting Wifi pcap """
@@ -91,3 +207,613 @@ class Pcap( object ):
 
         return True
 
+
+# FlowTracker follows IPv4 flows across the ns-3 devices behind TBIntfs. Those ns-3 nodes have
+# no internet stack, so the ns-3 FlowMonitor (which hooks Ipv4L3Protocol) can not be used there.
+# FlowTracker is connected to the MacTx and MacRx trace sources of the devices instead (the
+# WifiMac ones for WiFi devices). It classifies frames by IPv4 5-tuple and matches transmission
+# and reception of a frame by packet uid, which ns-3 keeps when a channel copies the packet.
+# Frames not received within lossTimeout seconds are counted lost. Delays are accumulated in a
+# fixed size histogram per flow. State is guarded by a mutex, so snapshots can be taken from a
+# Python thread while the simulator runs; Export() writes the snapshot file outside the lock.
+
+flowTrackerCode = """
+#include "ns3/core-module.h"
+#include "ns3/network-module.h"
+#include "ns3/wifi-module.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <fstream>
+#include <map>
+#include <mutex>
+#include <tuple>
+#include <vector>
+
+namespace opennet
+{
+using namespace ns3;
+
+#pragma pack(push, 1)
+struct FlowRecord
+{
+    uint32_t src;
+    uint32_t dst;
+    uint16_t srcPort;
+    uint16_t dstPort;
+    uint8_t protocol;
+    uint64_t txPackets;
+    uint64_t txBytes;
+    uint64_t rxPackets;
+    uint64_t rxBytes;
+    uint64_t lostPackets;
+    double delaySum;
+    double jitterSum;
+    double delayMax;
+};
+#pragma pack(pop)
+
+class FlowTracker
+{
+  public:
+    FlowTracker(double binWidth, uint32_t bins, double lossTimeout)
+        : m_binWidth(binWidth),
+          m_bins(bins),
+          m_lossTimeout(Seconds(lossTimeout)),
+          m_txCount(0)
+    {
+    }
+
+    bool Attach(Ptr<NetDevice> device)
+    {
+        Ptr<Object> target = device;
+        Ptr<WifiNetDevice> wifi = DynamicCast<WifiNetDevice>(device);
+        if (wifi)
+        {
+            target = wifi->GetMac();
+        }
+        bool tx = target->TraceConnectWithoutContext("MacTx", MakeCallback(&FlowTracker::Tx, this));
+        bool rx = target->TraceConnectWithoutContext("MacRx", MakeCallback(&FlowTracker::Rx, this));
+        return tx && rx;
+    }
+
+    uint32_t GetNFlows()
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        return m_flows.size();
+    }
+
+    bool Export(std::string path)
+    {
+        std::vector<char> data;
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            uint32_t count = m_flows.size();
+            data.resize(sizeof(uint32_t) * 2 + sizeof(double) +
+                        count * (sizeof(FlowRecord) + m_bins * sizeof(uint32_t)));
+            char* p = data.data();
+            std::memcpy(p, &count, sizeof(uint32_t));
+            std::memcpy(p + sizeof(uint32_t), &m_bins, sizeof(uint32_t));
+            std::memcpy(p + 2 * sizeof(uint32_t), &m_binWidth, sizeof(double));
+            p += 2 * sizeof(uint32_t) + sizeof(double);
+            for (auto& flow : m_flows)
+            {
+                std::memcpy(p, &flow.record, sizeof(FlowRecord));
+                p += sizeof(FlowRecord);
+            }
+            for (auto& flow : m_flows)
+            {
+                std::memcpy(p, flow.histogram.data(), m_bins * sizeof(uint32_t));
+                p += m_bins * sizeof(uint32_t);
+            }
+        }
+        std::ofstream out(path, std::ios::binary | std::ios::trunc);
+        out.write(data.data(), data.size());
+        return out.good();
+    }
+
+  private:
+    struct Flow
+    {
+        FlowRecord record;
+        std::vector<uint32_t> histogram;
+        double lastDelay;
+    };
+
+    typedef std::tuple<uint32_t, uint32_t, uint16_t, uint16_t, uint8_t> FlowKey;
+
+    // Locate the IPv4 header behind an optional Ethernet header and LLC/SNAP header.
+    static bool Parse(Ptr<const Packet> packet, FlowKey& key, uint16_t& length)
+    {
+        uint8_t b[64];
+        uint32_t n = packet->CopyData(b, sizeof(b));
+        uint32_t offset = 0;
+        if (n >= 34 && b[12] == 0x08 && b[13] == 0x00 && (b[14] >> 4) == 4)
+        {
+            offset = 14;
+        }
+        else if (n >= 28 && b[0] == 0xaa && b[1] == 0xaa && b[2] == 0x03)
+        {
+            if (b[6] != 0x08 || b[7] != 0x00)
+            {
+                return false;
+            }
+            offset = 8;
+        }
+        else if (n >= 42 && b[14] == 0xaa && b[15] == 0xaa && b[16] == 0x03)
+        {
+            if (b[20] != 0x08 || b[21] != 0x00)
+            {
+                return false;
+            }
+            offset = 22;
+        }
+        else if (n < 20 || (b[0] >> 4) != 4)
+        {
+            return false;
+        }
+        const uint8_t* ip = b + offset;
+        uint32_t ihl = (ip[0] & 0x0f) * 4;
+        uint8_t protocol = ip[9];
+        uint32_t src = (ip[12] << 24) | (ip[13] << 16) | (ip[14] << 8) | ip[15];
+        uint32_t dst = (ip[16] << 24) | (ip[17] << 16) | (ip[18] << 8) | ip[19];
+        uint16_t srcPort = 0;
+        uint16_t dstPort = 0;
+        if ((protocol == 6 || protocol == 17) && offset + ihl + 4 <= n)
+        {
+            srcPort = (ip[ihl] << 8) | ip[ihl + 1];
+            dstPort = (ip[ihl + 2] << 8) | ip[ihl + 3];
+        }
+        key = FlowKey(src, dst, srcPort, dstPort, protocol);
+        length = (ip[2] << 8) | ip[3];
+        return true;
+    }
+
+    uint32_t GetFlow(const FlowKey& key)
+    {
+        auto it = m_index.find(key);
+        if (it != m_index.end())
+        {
+            return it->second;
+        }
+        Flow flow;
+        std::memset(&flow.record, 0, sizeof(FlowRecord));
+        // Members of the packed record can not be bound to references (std::tie).
+        flow.record.src = std::get<0>(key);
+        flow.record.dst = std::get<1>(key);
+        flow.record.srcPort = std::get<2>(key);
+        flow.record.dstPort = std::get<3>(key);
+        flow.record.protocol = std::get<4>(key);
+        flow.histogram.assign(m_bins, 0);
+        flow.lastDelay = -1;
+        m_flows.push_back(flow);
+        m_index[key] = m_flows.size() - 1;
+        return m_flows.size() - 1;
+    }
+
+    void Purge(Time now)
+    {
+        for (auto it = m_inFlight.begin(); it != m_inFlight.end();)
+        {
+            if (now - it->second.second > m_lossTimeout)
+            {
+                m_flows[it->second.first].record.lostPackets++;
+                it = m_inFlight.erase(it);
+            }
+            else
+            {
+                ++it;
+            }
+        }
+    }
+
+    void Tx(Ptr<const Packet> packet)
+    {
+        FlowKey key;
+        uint16_t length;
+        if (!Parse(packet, key, length))
+        {
+            return;
+        }
+        Time now = Simulator::Now();
+        std::lock_guard<std::mutex> lock(m_mutex);
+        uint64_t uid = packet->GetUid();
+        // A frame relayed by another tracked device keeps its first transmission.
+        if (m_inFlight.find(uid) != m_inFlight.end())
+        {
+            return;
+        }
+        uint32_t index = GetFlow(key);
+        m_flows[index].record.txPackets++;
+        m_flows[index].record.txBytes += length;
+        m_inFlight[uid] = std::make_pair(index, now);
+        if (++m_txCount % 1024 == 0)
+        {
+            Purge(now);
+        }
+    }
+
+    void Rx(Ptr<const Packet> packet)
+    {
+        FlowKey key;
+        uint16_t length;
+        if (!Parse(packet, key, length))
+        {
+            return;
+        }
+        Time now = Simulator::Now();
+        std::lock_guard<std::mutex> lock(m_mutex);
+        auto it = m_inFlight.find(packet->GetUid());
+        if (it == m_inFlight.end())
+        {
+            return;
+        }
+        Flow& flow = m_flows[it->second.first];
+        double delay = (now - it->second.second).GetSeconds();
+        m_inFlight.erase(it);
+        flow.record.rxPackets++;
+        flow.record.rxBytes += length;
+        flow.record.delaySum += delay;
+        if (flow.lastDelay >= 0)
+        {
+            flow.record.jitterSum += std::abs(delay - flow.lastDelay);
+        }
+        flow.lastDelay = delay;
+        if (delay > flow.record.delayMax)
+        {
+            flow.record.delayMax = delay;
+        }
+        uint32_t bin = std::min<uint32_t>(delay / m_binWidth, m_bins - 1);
+        flow.histogram[bin]++;
+    }
+
+    double m_binWidth;
+    uint32_t m_bins;
+    Time m_lossTimeout;
+    uint64_t m_txCount;
+    std::mutex m_mutex;
+    std::vector<Flow> m_flows;
+    std::map<FlowKey, uint32_t> m_index;
+    std::map<uint64_t, std::pair<uint32_t, Time>> m_inFlight;
+};
+} // namespace opennet
+"""
+
+class FlowMonitor( object ):
+    """ Per-flow delay, jitter and loss of IPv4 traffic crossing ns-3 devices.
+    Must be created before the simulator is started. """
+
+    defined = False
+    # Trace sinks point to the C++ trackers, which must outlive the simulation.
+    instances = []
+
+    def __init__(self, devices=None, binWidth=0.0005, bins=200, lossTimeout=1.0, path=None, interval=1.0):
+        """ devices: ns-3 devices to track (optional), default: the devices of all TBIntfs
+        binWidth: delay histogram bin width in seconds
+        bins: number of delay histogram bins
+        lossTimeout: seconds after which a frame not received is counted lost
+        path: directory receiving a flows-NNNNNN.bin snapshot every interval seconds (optional) """
+        if not FlowMonitor.defined:
+            ns.cppyy.cppdef(flowTrackerCode)
+            FlowMonitor.defined = True
+        if devices is None:
+            from mininet import ns3
+            devices = [intf.nsDevice for intf in ns3.allTBIntfs if intf.nsDevice is not None]
+        self.tracker = ns.cppyy.gbl.opennet.FlowTracker(binWidth, bins, lossTimeout)
+        FlowMonitor.instances.append(self)
+        self.devices = []
+        self.unsupported = []
+        for device in devices:
+            if self.tracker.Attach(device):
+                self.devices.append(device)
+            else:
+                # E.g. SimpleNetDevice, which has no MacTx/MacRx trace sources.
+                self.unsupported.append(device)
+        self.path = path
+        self.interval = interval
+        self.running = False
+        if path is not None:
+            checkDictionaryPath(os.path.join(path, ''))
+            self.running = True
+            self.thread = threading.Thread(target=self.exportLoop)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def exportLoop(self):
+        """ Write a snapshot every interval seconds, runs in its own thread. """
+        index = 0
+        while self.running:
+            self.tracker.Export(os.path.join(self.path, 'flows-%06d.bin' % index))
+            index += 1
+            time.sleep(self.interval)
+
+    def stats(self):
+        """ Return a snapshot of the flow statistics, see loadFlows(). """
+        fd, path = tempfile.mkstemp(prefix='opennet-flows-')
+        os.close(fd)
+        try:
+            self.tracker.Export(path)
+            return loadFlows(path)
+        finally:
+            os.remove(path)
+
+    def stop(self):
+        """ Stop the periodic snapshots. """
+        self.running = False
+
+# PcapRing captures frames from ns-3 sniffer trace sources into a memory buffer: the simulator thread
+# only truncates (snaplen), samples and copies frames, and never touches a file. A Python writer thread
+# periodically swaps the buffer and appends it to the current pcap file, outside the lock, starting a
+# new file when the size or time limit is reached and deleting the oldest file beyond maxFiles.
+# Ethernet-like devices (CSMA, FdNetDevice) are captured with their Sniffer (or PromiscSniffer) trace
+# source as DLT_EN10MB, WiFi devices with the MonitorSnifferRx/Tx trace sources of their PHY as
+# DLT_IEEE802_11. Timestamps are simulated time.
+
+pcapRingCode = """
+#include "ns3/core-module.h"
+#include "ns3/network-module.h"
+#include "ns3/wifi-module.h"
+
+#include <algorithm>
+#include <chrono>
+#include <cstdio>
+#include <cstring>
+#include <mutex>
+#include <vector>
+
+namespace opennet
+{
+using namespace ns3;
+
+class PcapRing
+{
+  public:
+    PcapRing(std::string prefix,
+             uint32_t linkType,
+             uint32_t snaplen,
+             uint32_t sample,
+             uint64_t maxBytes,
+             double maxSeconds,
+             uint32_t maxFiles,
+             uint64_t bufferBytes)
+        : m_prefix(prefix),
+          m_linkType(linkType),
+          m_snaplen(snaplen),
+          m_sample(sample > 0 ? sample : 1),
+          m_maxBytes(maxBytes),
+          m_maxSeconds(maxSeconds),
+          m_maxFiles(maxFiles),
+          m_bufferBytes(bufferBytes),
+          m_seen(0),
+          m_captured(0),
+          m_dropped(0),
+          m_file(nullptr),
+          m_fileIndex(0),
+          m_fileBytes(0)
+    {
+    }
+
+    ~PcapRing()
+    {
+        Close();
+    }
+
+    bool Attach(Ptr<NetDevice> device, bool promisc)
+    {
+        Ptr<WifiNetDevice> wifi = DynamicCast<WifiNetDevice>(device);
+        if (wifi)
+        {
+            Ptr<WifiPhy> phy = wifi->GetPhy();
+            bool rx = phy->TraceConnectWithoutContext("MonitorSnifferRx",
+                                                      MakeCallback(&PcapRing::WifiRx, this));
+            bool tx = phy->TraceConnectWithoutContext("MonitorSnifferTx",
+                                                      MakeCallback(&PcapRing::WifiTx, this));
+            return rx && tx;
+        }
+        return device->TraceConnectWithoutContext(promisc ? "PromiscSniffer" : "Sniffer",
+                                                  MakeCallback(&PcapRing::Capture, this));
+    }
+
+    // Write the buffered frames, rotating files as needed. Called from the writer thread.
+    void Flush()
+    {
+        std::vector<uint8_t> data;
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            data.swap(m_buffer);
+        }
+        if (!m_file || (m_maxBytes > 0 && m_fileBytes >= m_maxBytes) ||
+            (m_maxSeconds > 0 &&
+             std::chrono::duration<double>(std::chrono::steady_clock::now() - m_opened).count() >=
+                 m_maxSeconds))
+        {
+            Rotate();
+        }
+        if (m_file && !data.empty())
+        {
+            std::fwrite(data.data(), 1, data.size(), m_file);
+            std::fflush(m_file);
+            m_fileBytes += data.size();
+        }
+    }
+
+    void Close()
+    {
+        if (m_file)
+        {
+            Flush();
+            std::fclose(m_file);
+            m_file = nullptr;
+        }
+    }
+
+    uint64_t GetCaptured()
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        return m_captured;
+    }
+
+    uint64_t GetDropped()
+    {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        return m_dropped;
+    }
+
+    uint32_t GetFileIndex() const
+    {
+        return m_fileIndex;
+    }
+
+  private:
+    std::string FileName(uint32_t index) const
+    {
+        char suffix[32];
+        std::snprintf(suffix, sizeof(suffix), "-%06u.pcap", index);
+        return m_prefix + suffix;
+    }
+
+    void Rotate()
+    {
+        if (m_file)
+        {
+            std::fclose(m_file);
+            m_fileIndex++;
+        }
+        if (m_maxFiles > 0 && m_fileIndex >= m_maxFiles)
+        {
+            std::remove(FileName(m_fileIndex - m_maxFiles).c_str());
+        }
+        m_file = std::fopen(FileName(m_fileIndex).c_str(), "wb");
+        m_opened = std::chrono::steady_clock::now();
+        m_fileBytes = 0;
+        if (m_file)
+        {
+            uint32_t magic = 0xa1b2c3d4;
+            uint16_t version[2] = {2, 4};
+            int32_t zone = 0;
+            uint32_t sigfigs = 0;
+            std::fwrite(&magic, 4, 1, m_file);
+            std::fwrite(version, 2, 2, m_file);
+            std::fwrite(&zone, 4, 1, m_file);
+            std::fwrite(&sigfigs, 4, 1, m_file);
+            std::fwrite(&m_snaplen, 4, 1, m_file);
+            std::fwrite(&m_linkType, 4, 1, m_file);
+            m_fileBytes = 24;
+        }
+    }
+
+    void Capture(Ptr<const Packet> packet)
+    {
+        int64_t us = Simulator::Now().GetMicroSeconds();
+        std::lock_guard<std::mutex> lock(m_mutex);
+        if (m_seen++ % m_sample != 0)
+        {
+            return;
+        }
+        uint32_t size = packet->GetSize();
+        uint32_t incl = std::min(size, m_snaplen);
+        if (m_buffer.size() + 16 + incl > m_bufferBytes)
+        {
+            m_dropped++;
+            return;
+        }
+        uint32_t header[4] = {uint32_t(us / 1000000), uint32_t(us % 1000000), incl, size};
+        size_t offset = m_buffer.size();
+        m_buffer.resize(offset + 16 + incl);
+        std::memcpy(m_buffer.data() + offset, header, 16);
+        packet->CopyData(m_buffer.data() + offset + 16, incl);
+        m_captured++;
+    }
+
+    void WifiRx(Ptr<const Packet> packet,
+                uint16_t channelFreqMhz,
+                WifiTxVector txVector,
+                MpduInfo aMpdu,
+                SignalNoiseDbm signalNoise,
+                uint16_t staId)
+    {
+        Capture(packet);
+    }
+
+    void WifiTx(Ptr<const Packet> packet,
+                uint16_t channelFreqMhz,
+                WifiTxVector txVector,
+                MpduInfo aMpdu,
+                uint16_t staId)
+    {
+        Capture(packet);
+    }
+
+    std::string m_prefix;
+    uint32_t m_linkType;
+    uint32_t m_snaplen;
+    uint32_t m_sample;
+    uint64_t m_maxBytes;
+    double m_maxSeconds;
+    uint32_t m_maxFiles;
+    uint64_t m_bufferBytes;
+    uint64_t m_seen;
+    uint64_t m_captured;
+    uint64_t m_dropped;
+    std::mutex m_mutex;
+    std::vector<uint8_t> m_buffer;
+    FILE* m_file;
+    uint32_t m_fileIndex;
+    uint64_t m_fileBytes;
+    std::chrono::steady_clock::time_point m_opened;
+};
+} // namespace opennet
+"""
+
+class PcapCapture( object ):
+    """ Ring-buffered pcap capture of ns-3 devices, see Pcap.capture(). """
+
+    defined = False
+    # Trace sinks point to the C++ rings, which must outlive the simulation.
+    instances = []
+
+    def __init__(self, devices, prefix, snaplen=65535, sample=1, maxBytes=0, maxSeconds=0, maxFiles=0,
+                 promisc=False, bufferBytes=16 << 20, flushInterval=0.5):
+        if not PcapCapture.defined:
+            ns.cppyy.cppdef(pcapRingCode)
+            PcapCapture.defined = True
+        kinds = set(device.GetInstanceTypeId().GetName() == 'ns3::WifiNetDevice' for device in devices)
+        if len(kinds) > 1:
+            raise ValueError('Can not capture WiFi and Ethernet devices to the same pcap files')
+        # DLT_IEEE802_11 for WiFi devices, DLT_EN10MB otherwise.
+        linkType = 105 if True in kinds else 1
+        self.ring = ns.cppyy.gbl.opennet.PcapRing(prefix, linkType, snaplen, sample, maxBytes,
+                                                  maxSeconds, maxFiles, bufferBytes)
+        PcapCapture.instances.append(self)
+        self.devices = []
+        self.unsupported = []
+        for device in devices:
+            if self.ring.Attach(device, promisc):
+                self.devices.append(device)
+            else:
+                # E.g. SimpleNetDevice, which has no sniffer trace sources.
+                self.unsupported.append(device)
+        self.prefix = prefix
+        self.flushInterval = flushInterval
+        self.running = True
+        self.thread = threading.Thread(target=self.writer)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def writer(self):
+        """ Write the buffered frames every flushInterval seconds, runs in its own thread. """
+        while self.running:
+            time.sleep(self.flushInterval)
+            self.ring.Flush()
+
+    def stats(self):
+        """ Return the number of captured and dropped frames and the current file index. """
+        return {'captured': self.ring.GetCaptured(), 'dropped': self.ring.GetDropped(),
+                'file': self.ring.GetFileIndex()}
+
+    def stop(self):
+        """ Stop the writer thread and close the current file. """
+        self.running = False
+        self.thread.join()
+        self.ring.Close()
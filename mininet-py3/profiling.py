@@ -0,0 +1,203 @@
+"""
+Profiling of OpenNet operations.
+
+Profiler runs an operation under cProfile, SamplingProfiler samples the
+stack of the thread running it from a background thread, which costs far
+less on call-heavy code but only sees Python frames. Both break the time
+down into:
+
+- ns-3: Python code of the ns package and of the OpenNet modules driving
+  ns-3 through Cppyy. Cppyy calls are not separate functions for cProfile:
+  their time is counted in the Python function calling them.
+- shell: round trips to node shells and processes, i.e. Mininet node and
+  utility code and the reads, writes, polls and waits they block in.
+- python: everything else.
+
+The CLI exposes them as the profile command.
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Categories of the time spent in a profiled operation, in report order.
+
+CATEGORIES = ( 'ns-3', 'shell', 'python' )
+
+# Files of code driving ns-3, matched against the end of file names.
+
+ns3Files = ( 'ns3.py', 'opennet.py', 'wifi.py', 'lte.py' )
+
+# Directories of packages driving ns-3.
+
+ns3Packages = ( os.sep + 'ns' + os.sep, os.sep + 'cppyy' + os.sep )
+
+# Mininet files doing node shell and process I/O.
+
+shellFiles = ( os.path.join( 'mininet', 'node.py' ),
+               os.path.join( 'mininet', 'util.py' ),
+               'subprocess.py', 'selectors.py' )
+
+# Built-in functions blocking on node shells and processes.
+
+shellBuiltins = ( 'posix.read', 'posix.write', 'posix.waitpid',
+                  "'poll' of 'select.poll'", 'select.select' )
+
+def category( filename, funcname ):
+    """Return the category (one of CATEGORIES) of a function.
+       filename, funcname: as in the keys of pstats ( '~' for built-ins )"""
+    if filename == '~':
+        if any( name in funcname for name in shellBuiltins ):
+            return 'shell'
+        if 'cppyy' in funcname:
+            return 'ns-3'
+        return 'python'
+    if filename.endswith( ns3Files ) or any( package in filename
+                                             for package in ns3Packages ):
+        return 'ns-3'
+    if filename.endswith( shellFiles ):
+        return 'shell'
+    return 'python'
+
+def functionName( filename, lineno, funcname ):
+    "Short display name of a function."
+    if filename == '~':
+        return funcname
+    return '%s:%d(%s)' % ( os.path.basename( filename ), lineno, funcname )
+
+class Profiler( object ):
+    "Deterministic profiler of an operation, using cProfile."
+
+    def __init__( self ):
+        self.profile = cProfile.Profile()
+        self.elapsed = 0
+
+    def __enter__( self ):
+        self.start = time.time()
+        self.profile.enable()
+        return self
+
+    def __exit__( self, *_exc ):
+        self.profile.disable()
+        self.elapsed = time.time() - self.start
+
+    def stats( self ):
+        "Return pstats of the operation."
+        return pstats.Stats( self.profile )
+
+    def breakdown( self ):
+        "Return a dict mapping CATEGORIES to seconds of own time."
+        times = dict( ( c, 0.0 ) for c in CATEGORIES )
+        for ( filename, _lineno, funcname ), row in self.stats().stats.items():
+            times[ category( filename, funcname ) ] += row[ 2 ]
+        return times
+
+    def hotspots( self, count=20 ):
+        """Return the count functions with the most own time, as
+           ( own seconds, cumulative seconds, calls, name ) tuples."""
+        rows = [ ( row[ 2 ], row[ 3 ], row[ 1 ], functionName( *key ) )
+                 for key, row in self.stats().stats.items() ]
+        return sorted( rows, reverse=True )[ :count ]
+
+    def dump( self, path ):
+        "Write the profile to path, for pstats or snakeviz."
+        self.profile.dump_stats( path )
+
+class SamplingProfiler( object ):
+    """Statistical profiler of an operation: samples the stack of the
+       calling thread every interval seconds. The sampler only runs when
+       it gets the GIL, so each sample is weighted by the time since the
+       previous one."""
+
+    def __init__( self, interval=0.001 ):
+        self.interval = interval
+        # Samples and seconds by stack
+        self.stacks = {}
+        self.elapsed = 0
+        self.running = False
+
+    def __enter__( self ):
+        self.threadId = threading.get_ident()
+        self.running = True
+        self.thread = threading.Thread( target=self.sampler )
+        self.thread.daemon = True
+        self.start = time.time()
+        self.thread.start()
+        return self
+
+    def __exit__( self, *_exc ):
+        self.running = False
+        self.thread.join()
+        self.elapsed = time.time() - self.start
+
+    def sampler( self ):
+        "Sample the profiled thread until stopped, runs in its own thread."
+        last = time.time()
+        while self.running:
+            now = time.time()
+            frame = sys._current_frames().get( self.threadId )
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append( ( code.co_filename, code.co_firstlineno,
+                                code.co_name ) )
+                frame = frame.f_back
+            stack = tuple( reversed( stack ) )
+            samples, seconds = self.stacks.get( stack, ( 0, 0.0 ) )
+            self.stacks[ stack ] = ( samples + 1, seconds + now - last )
+            last = now
+            time.sleep( self.interval )
+
+    def breakdown( self ):
+        "Return a dict mapping CATEGORIES to seconds, by innermost frame."
+        times = dict( ( c, 0.0 ) for c in CATEGORIES )
+        for stack, ( _samples, seconds ) in self.stacks.items():
+            filename, _lineno, funcname = stack[ -1 ]
+            times[ category( filename, funcname ) ] += seconds
+        return times
+
+    def hotspots( self, count=20 ):
+        """Return the count functions with the most own time, as
+           ( own seconds, cumulative seconds, samples, name ) tuples."""
+        own = {}
+        total = {}
+        counts = {}
+        for stack, ( samples, seconds ) in self.stacks.items():
+            own[ stack[ -1 ] ] = own.get( stack[ -1 ], 0 ) + seconds
+            counts[ stack[ -1 ] ] = counts.get( stack[ -1 ], 0 ) + samples
+            for function in set( stack ):
+                total[ function ] = total.get( function, 0 ) + seconds
+        rows = [ ( own.get( f, 0 ), total[ f ], counts.get( f, 0 ),
+                   functionName( *f ) ) for f in total ]
+        return sorted( rows, reverse=True )[ :count ]
+
+    def dump( self, path ):
+        "Write the samples as collapsed stacks, for flame graph tools."
+        with open( path, 'w' ) as f:
+            for stack, ( samples, _seconds ) in self.stacks.items():
+                f.write( '%s %d\n' % ( ';'.join( functionName( *frame )
+                                                 for frame in stack ),
+                                       samples ) )
+
+# Profilers by name, for the CLI.
+
+profilers = { 'cprofile': Profiler, 'sample': SamplingProfiler }
+
+def report( profiler, count=20 ):
+    "Return a text report of the breakdown and hotspots of a profiler."
+    lines = [ '*** Elapsed time: %0.6f secs' % profiler.elapsed ]
+    breakdown = profiler.breakdown()
+    total = sum( breakdown.values() ) or 1
+    for name in CATEGORIES:
+        lines.append( '%-8s %10.4f s %5.1f%%' %
+                      ( name, breakdown[ name ],
+                        100.0 * breakdown[ name ] / total ) )
+    lines.append( '%10s %10s %8s  %s' % ( 'own s', 'cum s', 'calls',
+                                           'function' ) )
+    for own, cumulative, calls, name in profiler.hotspots( count ):
+        lines.append( '%10.4f %10.4f %8d  %s' %
+                      ( own, cumulative, calls, name ) )
+    return '\n'.join( lines ) + '\n'
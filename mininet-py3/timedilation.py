@@ -0,0 +1,89 @@
+"""
+Adaptive time dilation for OpenNet simulators.
+
+A realtime ns-3 simulator stays faithful as long as it keeps up with the
+wall clock. A probe event running inside the simulator thread records
+( wall time, simulated time, simulator thread CPU time ) samples; from a
+window of such samples TdfController derives the realtime lateness and the
+CPU saturation of the simulator, and picks the smallest time dilation
+factor (TDF) that keeps both under the configured limits.
+
+Lateness slope and CPU load are assumed to scale with 1/TDF, which holds
+for the LTE model where the patched ns-3 stretches TTIs and protocol timers
+by the factor.
+
+mininet.ns3, mininet.wifi and mininet.lte feed this controller with samples
+from their simulator; the chosen factor is kept in their runInfo so that
+throughput numbers can be normalized.
+"""
+
+defaultFactors = ( 1, 2, 3, 4, 6, 8, 12, 16, 24, 32 )
+
+class TdfController( object ):
+    "Pick the smallest time dilation factor keeping the simulator faithful."
+
+    def __init__( self, factors=defaultFactors, maxLateness=0.01, maxCpu=0.9, tdf=1 ):
+        """factors: candidate time dilation factors, in increasing order
+           maxLateness: tolerated realtime lateness in seconds
+           maxCpu: tolerated simulator thread CPU load (0.0 - 1.0)
+           tdf: time dilation factor the samples are taken with"""
+        self.factors = sorted( factors )
+        self.maxLateness = maxLateness
+        self.maxCpu = maxCpu
+        self.tdf = tdf
+        self.lateness = 0.0
+        self.slope = 0.0
+        self.cpu = 0.0
+
+    def observe( self, samples ):
+        """Update lateness, lateness slope and CPU load from a window of
+           ( wall, sim, cpu ) samples, all in seconds."""
+        if len( samples ) < 2:
+            return
+        wall0, sim0, cpu0 = samples[ 0 ]
+        wall1, sim1, cpu1 = samples[ -1 ]
+        elapsed = wall1 - wall0
+        if elapsed <= 0:
+            return
+        lateness = [ ( wall - wall0 ) - ( sim - sim0 ) for wall, sim, _cpu in samples ]
+        self.lateness = max( lateness )
+        self.slope = ( lateness[ -1 ] - lateness[ 0 ] ) / elapsed
+        self.cpu = ( cpu1 - cpu0 ) / elapsed
+
+    def faithful( self ):
+        "Is the simulator keeping up with the wall clock at the current factor?"
+        return self.lateness <= self.maxLateness and self.cpu <= self.maxCpu
+
+    def required( self ):
+        "Estimated (fractional) time dilation factor needed to stay faithful."
+        need = max( 1.0, self.cpu / self.maxCpu )
+        if self.slope >= 1.0:
+            return float( 'inf' )
+        if self.slope > 0:
+            need = max( need, 1.0 / ( 1.0 - self.slope ) )
+        return self.tdf * need
+
+    def recommend( self ):
+        "Smallest candidate factor not below the required one."
+        need = self.required()
+        for factor in self.factors:
+            if factor >= need:
+                return factor
+        return self.factors[ -1 ]
+
+    def step( self ):
+        """Return the next candidate factor to try when the simulator is not
+           faithful at the current one, None otherwise."""
+        if self.faithful():
+            return None
+        target = max( self.recommend(), self.tdf )
+        for factor in self.factors:
+            if factor > self.tdf and factor >= target:
+                return factor
+        return None
+
+    def info( self ):
+        "Measurements and chosen factor, for the run metadata."
+        return { 'tdf': self.tdf, 'recommendedTdf': self.recommend(),
+                 'lateness': self.lateness, 'latenessSlope': self.slope,
+                 'cpu': self.cpu, 'faithful': self.faithful() }
@@ -1,4 +1,5 @@
 import socket
+import struct
 from time import sleep
 
 import mininet.node
@@ -6,9 +7,13 @@ import mininet.link
 from mininet.log import info
 from mininet.util import moveIntf
 from mininet.cluster.link import RemoteLink
+from mininet.timedilation import TdfController
+# ns-3 event schedulers selectable with start (scheduler=...). mininet.ns3 loads the
+# ns-3 bindings on first use only, so importing it here does not load them.
+from mininet.ns3 import schedulers as SCHEDULERS
 
 class WIFI (object):
-    def __init__ (self, enableQos=True, rootSwitch=None, agentIP=None, agentPort=53724):
+    def __init__ (self, enableQos=True, rootSwitch=None, agentIP=None, agentPort=53724, checksum=True):
         self.rootSwitch = rootSwitch
         self.startAgent ()
         self.csock = None
@@ -16,9 +21,11 @@ class WIFI (object):
             self.csock = self.connectAgent (agentIP, agentPort)
 
         self.tapBridgeIntfs = []
+        self.runInfo = {'tdf': 1, 'checksumEnabled': bool (checksum)}
 
         self.csock.sendall (b'GlobalValue.Bind ("SimulatorImplementationType", StringValue ("ns3::RealtimeSimulatorImpl"))\n')
-        self.csock.sendall (b'GlobalValue.Bind ("ChecksumEnabled", BooleanValue (True))\n')
+        # ChecksumEnabled is global to the agent simulator, see checksumEnabled in mininet.ns3.
+        self.csock.sendall (('GlobalValue.Bind ("ChecksumEnabled", BooleanValue ({0}))\n'.format (bool (checksum))).encode ())
 
         self.csock.sendall (b'wifihelper = WifiHelper.Default()\n')
         self.csock.sendall (b'wifihelper.SetStandard (WIFI_PHY_STANDARD_80211g)\n')
@@ -38,6 +45,8 @@ class WIFI (object):
 
         self.csock.sendall (b'nsThread = Thread (target = run)\n')
         self.csock.sendall (b'tapBridges = []\n')
+        self.csock.sendall (b'backgroundTraffic = []\n')
+        self.backgroundCount = 0
 
     def startAgent (self):
         self.rootSwitch.cmd ("/usr/bin/opennet-agent.py start")
@@ -57,7 +66,14 @@ class WIFI (object):
             info ('Successed\n')
             return csock
 
-    def start (self):
+    def start (self, scheduler=None, cpus=None, policy=None, priority=None, nice=None):
+        """Start the agent simulator thread.
+        scheduler: ns-3 event scheduler (optional), a key of SCHEDULERS
+        (map, heap, list, calendar, priority) or an ns-3 TypeId name
+        cpus: CPU numbers the simulator and TapBridge reader threads are pinned to (optional)
+        policy: scheduling policy of these threads (optional): other, batch, fifo or rr
+        priority: realtime priority for the fifo and rr policies (optional), default: 50
+        nice: nice level of these threads (optional)"""
         self.csock.sendall (b'if nsThread.isAlive ():\n    csock.sendall ("True")\nelse:\n    csock.sendall ("False")\n')
         while True:
             data = self.csock.recv (1024)
@@ -68,6 +84,18 @@ class WIFI (object):
                 info ('*** Starting NS-3 thread\n')
                 break
 
+        self.csock.sendall (b'realtimeProbe = RealtimeProbe ()\n')
+        if scheduler != None:
+            typeId = SCHEDULERS.get (scheduler.lower (), scheduler)
+            self.csock.sendall (b'schedulerFactory = ObjectFactory ()\n')
+            self.csock.sendall (('schedulerFactory.SetTypeId ("{0}")\n'.format (typeId)).encode ())
+            self.csock.sendall (b'Simulator.SetScheduler (schedulerFactory)\n')
+            self.runInfo['scheduler'] = typeId
+        threadConfig = {'cpus': tuple (cpus) if cpus != None else None, 'policy': policy,
+                        'priority': priority, 'nice': nice}
+        if any (v != None for v in threadConfig.values ()):
+            self.csock.sendall (('nsThread = Thread (target = runSimulator, kwargs = {0!r})\n'.format (threadConfig)).encode ())
+            self.runInfo.update (('simulator' + k.capitalize (), v) for k, v in threadConfig.items () if v != None)
         self.csock.sendall (b'nsThread.start ()\n')
 
         info ('*** moveIntoNamespace\n')
@@ -76,6 +104,35 @@ class WIFI (object):
             tbIntf.moveIntoNamespace ()
         info ('\n')
 
+    def getProbeSamples (self, seconds=None):
+        """Fetch (wall, sim, cpu) realtime probe samples of the last seconds from the agent."""
+        self.csock.sendall (('realtimeProbe.send (csock, {0})\n'.format (seconds)).encode ())
+        count, = struct.unpack ('<I', self.recvAll (4))
+        return list (struct.iter_unpack ('<ddd', self.recvAll (24 * count)))
+
+    def calibrateTdf (self, warmup=5.0, controller=None):
+        """Measure realtime lateness and simulator CPU load for warmup seconds
+        and record the time dilation factor the scenario would need in runInfo.
+        The WiFi model has no dilation hook, so the simulation keeps running
+        at TDF 1; the recommended factor is meant to normalize results.
+        Must be called after start ().
+        Returns the recommended factor."""
+        if controller == None:
+            controller = TdfController ()
+        sleep (warmup)
+        controller.observe (self.getProbeSamples (warmup))
+        self.runInfo.update (controller.info ())
+        return controller.recommend ()
+
+    def recvAll (self, size):
+        data = b''
+        while len (data) < size:
+            chunk = self.csock.recv (size - len (data))
+            if not chunk:
+                raise socket.error ('opennet-agent closed the connection')
+            data += chunk
+        return data
+
     def stop (self):
         self.csock.sendall (b'Simulator.Stop (Seconds (1))\n')
         self.csock.sendall (b'while nsThread.isAlive ():\n    sleep (0.1)\n')
@@ -148,6 +205,54 @@ class WIFI (object):
         tbIntf = self.TapBridgeIntf (intfName, node, port, self.rootSwitch, self.csock)
         self.tapBridgeIntfs.append (tbIntf)
 
+    def addTraffic (self, count=2, mac='adhoc', channelNumber=1, ssid="default-ssid", positions=None,
+                    flows=None, network=None, **traffic):
+        """Connect hidden ns-3 nodes (no Mininet counterpart) to the channel and
+        run ns-3 traffic between them, see BackgroundTraffic in mininet.ns3.
+        count: number of hidden nodes
+        mac: adhoc (default) or sta, to associate the nodes with the AP of ssid
+        positions: list of (x, y, z) node positions (optional), default: origin
+        flows: list of (source index, destination index) pairs (optional), default: (0, 1), (2, 3), ...
+        network: network address of the hidden nodes (optional), /24 netmask, default: 172.31.N.0
+        traffic: pattern, rate, packetSize, burst, startTime, stopTime, port
+        Returns the index to pass to getTrafficRx ()."""
+        pattern = traffic.get ('pattern', 'onoff')
+        if pattern not in ('onoff', 'poisson', 'bulk'):
+            raise ValueError ('Unknown traffic pattern: {0}'.format (pattern))
+        if mac == 'sta':
+            self.csock.sendall ('machelper.SetType ("ns3::StaWifiMac", "Ssid", SsidValue (Ssid("{0}")), "ScanType", EnumValue (StaWifiMac.ACTIVE))\n'.format (ssid).encode())
+        else:
+            self.csock.sendall (b'machelper.SetType ("ns3::AdhocWifiMac")\n')
+        self.csock.sendall ('phyhelper.Set ("ChannelNumber", UintegerValue ({0}))\n'.format (channelNumber).encode())
+
+        self.csock.sendall (b'bgNodes = NodeContainer ()\n')
+        self.csock.sendall ('bgNodes.Create ({0})\n'.format (count).encode())
+        self.csock.sendall (b'mobilityhelper.SetMobilityModel ("ns3::ConstantPositionMobilityModel")\n')
+        self.csock.sendall (b'mobilityhelper.Install (bgNodes)\n')
+        for i, position in enumerate (positions or []):
+            self.csock.sendall ('bgNodes.Get ({0}).GetObject(MobilityModel.GetTypeId()).SetPosition(Vector({1}, {2}, {3}))\n'.format (i, position[0], position[1], position[2]).encode())
+        self.csock.sendall (b'bgDevs = wifihelper.Install (phyhelper, machelper, bgNodes)\n')
+
+        if network == None:
+            network = '172.31.{0}.0'.format (self.backgroundCount % 256)
+        self.backgroundCount += 1
+        self.csock.sendall (b'bgStack = InternetStackHelper ()\n')
+        self.csock.sendall (b'bgStack.Install (bgNodes)\n')
+        self.csock.sendall (b'bgAddress = Ipv4AddressHelper ()\n')
+        self.csock.sendall ('bgAddress.SetBase (Ipv4Address ("{0}"), Ipv4Mask ("255.255.255.0"))\n'.format (network).encode())
+        self.csock.sendall (b'bgIfaces = bgAddress.Assign (bgDevs)\n')
+
+        if flows == None:
+            flows = [(i, i + 1) for i in range (0, count - 1, 2)]
+        self.csock.sendall ('backgroundTraffic.append (BackgroundTraffic (bgNodes, bgIfaces, {0!r}, **{1!r}))\n'.format (list (flows), traffic).encode())
+        return self.backgroundCount - 1
+
+    def getTrafficRx (self, index=0):
+        """Fetch the bytes received by the sink of each flow of a background traffic."""
+        self.csock.sendall ('backgroundTraffic[{0}].send (csock)\n'.format (index).encode ())
+        count, = struct.unpack ('<I', self.recvAll (4))
+        return list (struct.unpack ('<{0}Q'.format (count), self.recvAll (8 * count)))
+
     class TapBridgeIntf (mininet.link.Intf):
         """
         TapBridgeIntf is a Linux TAP interface, which is bridged with an NS-3 NetDevice.
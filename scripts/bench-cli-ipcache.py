@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Node IP cache benchmark of the OpenNet CLI.
+
+Writes a CLI script of node commands naming other nodes (e.g. 'h1 echo h2
+h3'), whose names the CLI replaces with their IP addresses, and runs it
+with the source command twice: with the IP cache of the CLI, and with the
+lookup used before it, which ran updateIP() in the named node for every
+name of every line. Prints the wall time, the time per line and the number
+of updateIP() calls of each run.
+
+Usage (as root, with Mininet installed):
+    python3 bench-cli-ipcache.py [--hosts 8] [--lines 500] [--names 3] [--runs 3]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel, lg
+from mininet.cli import CLI
+
+
+class UncachedCLI(CLI):
+    """CLI looking up node IP addresses as before the cache."""
+
+    def nodeIP(self, name):
+        return self.mn[name].defaultIntf().updateIP()
+
+
+def writeScript(hosts, lines, names):
+    """Write the workload script, return its path."""
+    fd, path = tempfile.mkstemp(prefix='ipcache-', suffix='.cli')
+    with os.fdopen(fd, 'w') as f:
+        for i in range(lines):
+            src = hosts[i % len(hosts)]
+            dsts = [hosts[(i + k + 1) % len(hosts)] for k in range(names)]
+            f.write('%s echo %s\n' % (src.name, ' '.join(h.name for h in dsts)))
+    return path
+
+
+def countCalls(net):
+    """Count updateIP() calls of the default interfaces, return the counter."""
+    calls = [0]
+    for host in net.hosts:
+        intf = host.defaultIntf()
+        updateIP = intf.updateIP
+
+        def counted(updateIP=updateIP):
+            calls[0] += 1
+            return updateIP()
+        intf.updateIP = counted
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--hosts', type=int, default=8, help='Mininet hosts')
+    parser.add_argument('--lines', type=int, default=500, help='lines of the script')
+    parser.add_argument('--names', type=int, default=3, help='node names substituted per line')
+    parser.add_argument('--runs', type=int, default=3, help='runs of each variant')
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        print("ERROR: Mininet requires root")
+        sys.exit(1)
+
+    setLogLevel('output')
+    net = Mininet(controller=None)
+    switch = net.addSwitch('s1', failMode='standalone')
+    for i in range(args.hosts):
+        net.addLink(net.addHost('h%d' % (i + 1)), switch)
+    net.start()
+    script = writeScript(net.hosts, args.lines, args.names)
+    calls = countCalls(net)
+    variants = [('cached', CLI(net, script=os.devnull, batch=True)),
+                ('uncached', UncachedCLI(net, script=os.devnull, batch=True))]
+    # Command output is discarded.
+    streams = [handler.stream for handler in lg.handlers]
+    devnull = open(os.devnull, 'w')
+    results = []
+    for handler in lg.handlers:
+        handler.stream = devnull
+    try:
+        for name, cli in variants:
+            times = []
+            for _ in range(args.runs):
+                cli.ipCache.clear()
+                calls[0] = 0
+                start = time.time()
+                cli.do_source(script)
+                times.append(time.time() - start)
+            results.append((name, statistics.median(times), calls[0]))
+    finally:
+        for handler, stream in zip(lg.handlers, streams):
+            handler.stream = stream
+        net.stop()
+        os.unlink(script)
+
+    print(f"{args.lines} lines, {args.names} names per line, {args.hosts} hosts")
+    print(f"{'variant':<10} {'seconds':>9} {'ms/line':>9} {'updateIP':>9}")
+    for name, elapsed, count in results:
+        print(f"{name:<10} {elapsed:>9.3f} {1000 * elapsed / args.lines:>9.3f} {count:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Output relay benchmark of the OpenNet CLI.
+
+Runs a command producing a large amount of output on a Mininet host and
+relays it with CLI.waitForNode, in interactive mode (stdin forwarded to
+the node) and in batch mode, and with the previous relay loop, which read
+the node output through node.monitor() (1024 characters at a time) and
+polled its inputs three times per wakeup. Prints the throughput and the
+CPU time of each relay.
+
+Usage (as root, with Mininet installed):
+    python3 bench-cli-relay.py [--megabytes 64] [--runs 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+from select import poll, POLLIN
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel, lg
+from mininet.cli import CLI, isReadable
+
+
+def legacyWaitForNode(cli, node):
+    """The relay loop of waitForNode before persistent pollers and bulk reads."""
+    nodePoller = poll()
+    nodePoller.register(node.stdout)
+    bothPoller = poll()
+    bothPoller.register(cli.stdin, POLLIN)
+    bothPoller.register(node.stdout, POLLIN)
+    while True:
+        bothPoller.poll()
+        if isReadable(cli.inPoller):
+            key = cli.stdin.read(1)
+            node.write(key)
+        if isReadable(nodePoller):
+            data = node.monitor()
+            lg.output(data)
+        if not node.waiting:
+            break
+
+
+def run(cli, host, relay, megabytes):
+    """Relay the output of one command, return (MB/s, CPU seconds)."""
+    host.sendCmd('head -c %d /dev/zero | base64' % (megabytes << 20))
+    wall0, cpu0 = time.time(), time.process_time()
+    relay(cli, host)
+    wall1, cpu1 = time.time(), time.process_time()
+    # base64 output is 4/3 of its input
+    return megabytes * 4 / 3 / (wall1 - wall0), cpu1 - cpu0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--megabytes', type=int, default=64, help='input bytes of each command, in MB')
+    parser.add_argument('--runs', type=int, default=3, help='runs of each relay')
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        print("ERROR: Mininet requires root")
+        sys.exit(1)
+
+    setLogLevel('output')
+    net = Mininet(controller=None)
+    host = net.addHost('h1')
+    net.start()
+    # A pipe nobody writes to: stdin is polled but never readable.
+    stdin = os.fdopen(os.pipe()[0])
+    interactive = CLI(net, stdin=stdin, script=os.devnull, batch=False)
+    batch = CLI(net, stdin=stdin, script=os.devnull, batch=True)
+    relays = [('legacy', interactive, legacyWaitForNode),
+              ('interactive', interactive, CLI.waitForNode),
+              ('batch', batch, CLI.waitForNode)]
+    # Relayed output is discarded.
+    streams = [handler.stream for handler in lg.handlers]
+    devnull = open(os.devnull, 'w')
+    results = []
+    for handler in lg.handlers:
+        handler.stream = devnull
+    try:
+        for name, cli, relay in relays:
+            for _ in range(args.runs):
+                results.append((name,) + run(cli, host, relay, args.megabytes))
+    finally:
+        for handler, stream in zip(lg.handlers, streams):
+            handler.stream = stream
+        net.stop()
+
+    print(f"{'relay':<12} {'MB/s':>10} {'CPU s':>8}")
+    for name, rate, cpu in results:
+        print(f"{name:<12} {rate:>10.1f} {cpu:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
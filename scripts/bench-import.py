@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Import time and memory of the ns-3 bindings in OpenNet.
+
+Runs each scenario in a fresh Python interpreter and reports its wall time
+and peak RSS: importing mininet.ns3 alone (what Mininet-only runs pay now
+that the bindings are loaded on first use), importing it and touching
+ns-3, importing the bindings directly, and the same for the ns_compat
+shim. Prints the median of several runs of each scenario.
+
+Usage (with Mininet and ns-3.41 Python bindings installed):
+    python3 bench-import.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Directory holding ns_compat, next to this script in the OpenNet tree.
+COMPAT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mininet-py3')
+
+scenarios = [
+    ('mininet.ns3 import', 'import mininet.ns3'),
+    ('mininet.ns3 first use', 'import mininet.ns3; mininet.ns3.ns.core.Simulator'),
+    ('ns bindings', 'from ns import ns'),
+    ('ns_compat import', 'import ns_compat.core, ns_compat.csma'),
+    ('ns_compat first use', 'import ns_compat.csma; ns_compat.csma.CsmaHelper'),
+]
+
+measure = """
+import json, resource, time
+start = time.perf_counter()
+exec(%r)
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]))
+"""
+
+
+def run(code):
+    """Run code in a fresh interpreter, return (seconds, peak RSS in MB)."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [COMPAT_DIR, env.get('PYTHONPATH')]))
+    out = subprocess.run([sys.executable, '-c', measure % code], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    elapsed, rss = json.loads(out.strip().splitlines()[-1])
+    return elapsed, rss / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--runs', type=int, default=5, help='runs of each scenario')
+    args = parser.parse_args()
+
+    print(f"{'scenario':<24} {'seconds':>9} {'RSS MB':>9}")
+    for name, code in scenarios:
+        try:
+            results = [run(code) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<24} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        elapsed = statistics.median(r[0] for r in results)
+        rss = statistics.median(r[1] for r in results)
+        print(f"{name:<24} {elapsed:>9.3f} {rss:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Attribute access and startup microbenchmark of the ns_compat shim.
+
+Times attribute access through the old-style ns_compat modules after
+their first access (memoized plain module attributes) against a Cppyy
+lookup in the core namespace held in a variable, which is what the shim
+did on every access before it loaded the bindings lazily, and against the
+ns namespace itself. Then times the startup
+of a fresh interpreter loading the bindings through ns_compat, with
+Cppyy's default precompiled header location and with a persistent one set
+by ns_compat.usePchCache().
+
+Usage (with ns-3.41 Python bindings installed):
+    python3 bench-ns-compat.py [--accesses 1000000] [--runs 3] [--pch PATH]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+# Directory holding ns_compat, next to this script in the OpenNet tree.
+COMPAT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mininet-py3')
+sys.path.insert(0, COMPAT_DIR)
+
+startup = "import ns_compat, ns_compat.core; ns_compat.core.Simulator"
+
+
+def accessTimes(accesses):
+    """Return (name, ns per access) of the attribute access variants."""
+    import ns_compat.core
+    from ns import ns
+    core = ns.core
+    ns_compat.core.Seconds
+    variants = [
+        ('ns_compat memoized', lambda: ns_compat.core.Seconds),
+        ('Cppyy lookup (unmemoized)', lambda: getattr(core, 'Seconds')),
+        ('ns.core', lambda: ns.core.Seconds),
+    ]
+    return [(name, timeit.timeit(variant, number=accesses) / accesses * 1e9)
+            for name, variant in variants]
+
+
+def startupTime(env):
+    """Wall seconds of a fresh interpreter loading the bindings through ns_compat."""
+    env = dict(os.environ, **env)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [COMPAT_DIR, env.get('PYTHONPATH')]))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', startup], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--accesses', type=int, default=1000000, help='attribute accesses per variant')
+    parser.add_argument('--runs', type=int, default=3, help='interpreter starts per startup variant')
+    parser.add_argument('--pch', default=os.path.join(tempfile.gettempdir(), 'ns_compat-bench.pch'),
+                        help='persistent precompiled header path')
+    args = parser.parse_args()
+
+    print(f"{'attribute access':<28} {'ns/access':>10}")
+    for name, ns in accessTimes(args.accesses):
+        print(f"{name:<28} {ns:>10.1f}")
+
+    print(f"\n{'startup':<28} {'seconds':>10}")
+    # The first start with a new PCH path builds it: warm it up.
+    startupTime({'NS_COMPAT_PCH': args.pch})
+    for name, env in [('default PCH', {}), ('persistent PCH', {'NS_COMPAT_PCH': args.pch})]:
+        elapsed = statistics.median(startupTime(env) for _ in range(args.runs))
+        print(f"{name:<28} {elapsed:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Event scheduler benchmark of mininet.ns3.
+
+Builds representative OpenNet topologies (a CSMA segment, a WiFi cell with
+one AP and many stations, and a WiFi range-culled ad hoc field) and runs
+each of them once per ns-3 event scheduler. While every host pings the
+first host, the benchmark counts the simulator events executed and reads
+the realtime probe of mininet.ns3. Prints one line per topology and
+scheduler with events per second, simulator CPU load and the maximum
+realtime lateness.
+
+Usage (as root, with Mininet and ns-3.41 Python bindings installed):
+    python3 bench-schedulers.py [--schedulers map,heap,list,calendar]
+                                [--topologies csma,wifi,range] [--nodes 32] [--time 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet import ns3
+from mininet.timedilation import TdfController
+
+
+def build_csma(net, hosts):
+    """All hosts on one CSMA segment."""
+    segment = ns3.CSMASegment(DataRate="100Mbps", Delay="1us")
+    for host in hosts:
+        segment.add(host)
+
+
+def build_wifi(net, hosts):
+    """One AP and many stations around it."""
+    segment = ns3.WIFISegment()
+    segment.addAps(hosts[:1], positions=[(0, 0, 0)])
+    segment.addStas(hosts[1:], positions=[(5 + i % 10, 5 + i // 10, 0) for i in range(len(hosts) - 1)])
+
+
+def build_range(net, hosts):
+    """Ad hoc nodes spread on a large field, culled by range."""
+    segment = ns3.WIFIRangeSegment(maxRange=100.0)
+    segment.machelper.SetType("ns3::AdhocWifiMac")
+    segment.addMany(hosts, positions=[(60 * (i % 8), 60 * (i // 8), 0) for i in range(len(hosts))])
+
+
+topologies = {'csma': build_csma, 'wifi': build_wifi, 'range': build_range}
+
+
+def run(topology, scheduler, nodes, seconds):
+    """Run one topology with one scheduler, return (events/s, cpu load, lateness)."""
+    net = Mininet(controller=None, autoSetMacs=True)
+    hosts = [net.addHost('h%d' % (i + 1), ip='10.0.%d.%d/16' % ((i + 1) // 250, (i + 1) % 250 + 1))
+             for i in range(nodes)]
+    topologies[topology](net, hosts)
+    net.start()
+    ns3.start(scheduler=scheduler, realtimeProbe=True)
+    try:
+        target = hosts[0].IP()
+        for host in hosts[1:]:
+            host.cmd('ping -q -i 0.2 -w %d %s > /dev/null 2>&1 &' % (seconds, target))
+        events0 = ns3.ns.core.Simulator.GetEventCount()
+        wall0 = time.time()
+        time.sleep(seconds)
+        events1 = ns3.ns.core.Simulator.GetEventCount()
+        wall1 = time.time()
+        controller = TdfController()
+        controller.observe(ns3.probe.window(seconds))
+    finally:
+        for host in hosts[1:]:
+            host.cmd('kill %ping')
+        ns3.stop()
+        ns3.clear()
+        net.stop()
+    return (events1 - events0) / (wall1 - wall0), controller.cpu, controller.lateness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--schedulers', default='map,heap,list,calendar',
+                        help='comma separated schedulers (keys of ns3.schedulers)')
+    parser.add_argument('--topologies', default='csma,wifi,range',
+                        help='comma separated topologies (%s)' % ', '.join(topologies))
+    parser.add_argument('--nodes', type=int, default=32, help='Mininet hosts per topology')
+    parser.add_argument('--time', type=int, default=20, help='measurement duration in seconds')
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        print("ERROR: Mininet requires root")
+        sys.exit(1)
+
+    setLogLevel('warning')
+    print(f"{'topology':<10} {'scheduler':<10} {'events/s':>12} {'CPU':>6} {'lateness s':>11}")
+    for topology in args.topologies.split(','):
+        for scheduler in args.schedulers.split(','):
+            rate, cpu, lateness = run(topology, scheduler, args.nodes, args.time)
+            print(f"{topology:<10} {scheduler:<10} {rate:>12.0f} {cpu:>6.2f} {lateness:>11.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of the ns-3 bridging backends of mininet.ns3.
+
+Builds two hosts connected by a CSMALink for each backend (TapBridge,
+EmuFdNetDevice and optionally netmap), starts the ns-3 simulator and runs
+an iperf TCP test between the hosts. Prints one line per backend with the
+measured throughput and the CPU time used by this process (which hosts the
+ns-3 realtime thread).
+
+Usage (as root, with Mininet and ns-3.41 Python bindings installed):
+    python3 bench-tbintf-backends.py [--backends tapbridge,fd] [--rate 1Gbps] [--time 10]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet import ns3
+
+
+def run_backend(backend, rate, seconds):
+    """Measure iperf throughput over a CSMALink using the given backend."""
+    net = Mininet(controller=None, autoSetMacs=True)
+    h1 = net.addHost('h1', ip='10.0.0.1/24')
+    h2 = net.addHost('h2', ip='10.0.0.2/24')
+    ns3.CSMALink(h1, h2, DataRate=rate, backend=backend)
+    net.start()
+    ns3.start()
+    try:
+        # In the background, not daemonized (-D): kill %iperf must be able to stop it.
+        h2.cmd('iperf -s > /dev/null 2>&1 &')
+        time.sleep(1)
+        cpu0 = os.times()
+        out = h1.cmd('iperf -c 10.0.0.2 -f m -t %d' % seconds)
+        cpu1 = os.times()
+    finally:
+        h2.cmd('kill %iperf')
+        ns3.stop()
+        ns3.clear()
+        net.stop()
+    match = re.findall(r'([0-9.]+) Mbits/sec', out)
+    mbps = float(match[-1]) if match else 0.0
+    cpu = (cpu1.user + cpu1.system) - (cpu0.user + cpu0.system)
+    return mbps, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--backends', default='tapbridge,fd',
+                        help='comma separated backends (tapbridge, fd, netmap)')
+    parser.add_argument('--rate', default='1Gbps', help='CSMA DataRate')
+    parser.add_argument('--time', type=int, default=10, help='iperf duration in seconds')
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        print("ERROR: Mininet requires root")
+        sys.exit(1)
+
+    setLogLevel('warning')
+    print(f"{'backend':<12} {'Mbit/s':>10} {'CPU s':>8} {'Mbit/CPU s':>12}")
+    for backend in args.backends.split(','):
+        mbps, cpu = run_backend(backend, args.rate, args.time)
+        per_cpu = mbps * args.time / cpu if cpu > 0 else 0.0
+        print(f"{backend:<12} {mbps:>10.1f} {cpu:>8.2f} {per_cpu:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
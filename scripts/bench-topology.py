@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Topology construction benchmark of mininet.ns3.
+
+Builds parameterised topologies (a chain of N SimpleLinks, a chain of N
+CSMALinks, a WLAN of one AP and N stations, and a mix of a CSMA chain and a
+WLAN), starts the simulator, then stops and clears it. Every step of the
+Python orchestration layer is timed as a phase: ns-3 segment objects, TBIntf
+set-up, tap creation, TapBridge install, mobility install, simulator thread
+start and tap namespace moves. Prints per phase the calls, wall time, own
+wall time (without nested phases), read/write syscalls, shell commands and
+RSS growth.
+
+The benchmark runs against the ns-3.41 Cppyy bindings when they are
+installed, otherwise against a stand-in ns namespace whose objects accept
+every call, so the Python cost of ns3.py can be tracked in CI. As root, the
+topologies are built on Mininet hosts; otherwise on stand-in nodes, and the
+shell commands of ns3.py are counted but not run.
+
+Usage:
+    python3 bench-topology.py [--ns auto|real|stub] [--hosts auto|mininet|standin]
+                              [--topologies links,csma,wlan,mixed] [--sizes 10,50,100]
+                              [--json results.json]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import sys
+import time
+import types
+
+
+# Stand-in for the ns-3 Cppyy bindings.
+
+class StandInType(type):
+    """Metaclass of stand-in ns-3 classes: class attributes (static methods,
+    enum values) are stand-ins and any object is an instance, so the
+    isinstance() checks of ns3.py pass."""
+
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return StandIn()
+
+    def __instancecheck__(cls, instance):
+        return True
+
+
+class StandIn(metaclass=StandInType):
+    """Stand-in for any ns-3 object, method or value."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return StandIn()
+
+    def __call__(self, *args, **kwargs):
+        return StandIn()
+
+    def __index__(self):
+        return 0
+
+    __int__ = __index__
+
+    def __float__(self):
+        return 0.0
+
+    def __iter__(self):
+        return iter(())
+
+
+class StandInModule(object):
+    """Stand-in for an ns-3 module (ns.core, ns.network, ...), one stand-in class per
+    name, or for a function of the ns namespace (ns.CreateObject)."""
+
+    def __init__(self):
+        self.classes = {}
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name not in self.classes:
+            self.classes[name] = StandInType(name, (StandIn,), {})
+        return self.classes[name]
+
+    def __call__(self, *args, **kwargs):
+        return StandIn()
+
+
+class StandInNamespace(object):
+    """Stand-in for the ns namespace of the bindings."""
+
+    def __init__(self):
+        self.modules = {}
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self.modules.setdefault(name, StandInModule())
+
+
+def installStandInNs():
+    """Make 'from ns import ns' return a StandInNamespace."""
+    module = types.ModuleType('ns')
+    module.ns = StandInNamespace()
+    sys.modules['ns'] = module
+
+
+# Phase accounting.
+
+def readCounters():
+    """Return (read/write syscalls, RSS bytes) of this process, syscalls are None
+    without /proc/self/io."""
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(':') for line in f)
+        syscalls = int(fields['syscr']) + int(fields['syscw'])
+    except (IOError, KeyError):
+        syscalls = None
+    with open('/proc/self/statm') as f:
+        rss = int(f.read().split()[1]) * resource.getpagesize()
+    return syscalls, rss
+
+
+class Phases(object):
+    """Accumulates calls, wall time, own time, syscalls, shell commands and
+    RSS growth of nested phases. Syscalls of the counter reads are subtracted."""
+
+    def __init__(self):
+        self.totals = {}
+        self.stack = []
+        self.commands = 0
+        # Syscalls of one readCounters() call.
+        first, _ = readCounters()
+        second, _ = readCounters()
+        self.overhead = second - first if first is not None else 0
+
+    def wrap(self, name, func):
+        """Return func timed as phase name."""
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return timed
+
+    def phase(self, name):
+        return Phase(self, name)
+
+    def add(self, name, elapsed, own, syscalls, commands, rss):
+        row = self.totals.setdefault(name, dict(calls=0, seconds=0.0, own=0.0,
+                                                syscalls=0, commands=0, rss=0))
+        row['calls'] += 1
+        row['seconds'] += elapsed
+        row['own'] += own
+        if syscalls is None:
+            row['syscalls'] = None
+        elif row['syscalls'] is not None:
+            row['syscalls'] += syscalls
+        row['commands'] += commands
+        row['rss'] += rss
+
+
+class Phase(object):
+    """One timed call of a phase, see Phases."""
+
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+        # Time, syscalls, commands, RSS and counter reads of nested phases.
+        self.nested = [0.0, 0, 0, 0, 0]
+
+    def __enter__(self):
+        self.phases.stack.append(self)
+        self.syscalls, self.rss = readCounters()
+        self.commands = self.phases.commands
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *_exc):
+        elapsed = time.time() - self.start
+        syscalls, rss = readCounters()
+        phases = self.phases
+        phases.stack.pop()
+        commands = phases.commands - self.commands
+        reads = self.nested[4]
+        if syscalls is not None:
+            # Our exit read, and the two reads of each nested phase.
+            syscalls -= self.syscalls + phases.overhead * (1 + reads)
+        own = [elapsed - self.nested[0], None, commands - self.nested[2],
+               rss - self.rss - self.nested[3]]
+        if syscalls is not None:
+            own[1] = syscalls - self.nested[1]
+        phases.add(self.name, elapsed, own[0], own[1], own[2], own[3])
+        if phases.stack:
+            parent = phases.stack[-1].nested
+            parent[0] += elapsed
+            parent[1] += syscalls or 0
+            parent[2] += commands
+            parent[3] += rss - self.rss
+            parent[4] += reads + 2
+
+
+# Nodes.
+
+class StandInNode(object):
+    """Stand-in for a Mininet host in its own namespace: keeps the interface
+    bookkeeping of mininet.node.Node and counts shell commands."""
+
+    inNamespace = True
+
+    def __init__(self, name, phases):
+        self.name = name
+        self.phases = phases
+        self.intfs = {}
+        self.ports = {}
+        self.nameToIntf = {}
+
+    def newPort(self):
+        return max(self.intfs) + 1 if self.intfs else 0
+
+    def addIntf(self, intf, port=None, moveIntfFn=None):
+        if port is None:
+            port = self.newPort()
+        self.intfs[port] = intf
+        self.ports[intf] = port
+        self.nameToIntf[intf.name] = intf
+        # TBIntfs are moved by ns3.start().
+        if not getattr(intf, 'delayedMove', False) and moveIntfFn is not None:
+            moveIntfFn(intf.name, self)
+
+    def cmd(self, *args, **kwargs):
+        self.phases.commands += 1
+        return ''
+
+    def __repr__(self):
+        return '<StandInNode %s>' % self.name
+
+
+def counted(phases, func):
+    """Return func counting its calls as shell commands."""
+    def run(*args, **kwargs):
+        phases.commands += 1
+        return func(*args, **kwargs)
+    return run
+
+
+# Timed ns-3 mobility helpers: MobilityHelper.Install() is not Python code of
+# ns3.py, so the ns namespace seen by ns3.py is wrapped to time it.
+
+class TimedHelper(object):
+    """MobilityHelper timing its Install() calls as the mobility phase."""
+
+    def __init__(self, phases, helper):
+        self.phases = phases
+        self.helper = helper
+
+    def Install(self, *args):
+        with self.phases.phase('mobility'):
+            return self.helper.Install(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.helper, name)
+
+
+class TimedModule(object):
+    """ns.mobility returning TimedHelpers."""
+
+    def __init__(self, phases, module):
+        self.phases = phases
+        self.module = module
+
+    def MobilityHelper(self, *args):
+        return TimedHelper(self.phases, self.module.MobilityHelper(*args))
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+
+class TimedNs(object):
+    """ns namespace whose mobility module is a TimedModule."""
+
+    def __init__(self, phases, ns):
+        self.phases = phases
+        self.ns = ns
+
+    def __getattr__(self, name):
+        if name == 'mobility':
+            return TimedModule(self.phases, self.ns.mobility)
+        return getattr(self.ns, name)
+
+
+def instrument(ns3, phases, standIn):
+    """Time the construction steps of ns3.py as phases."""
+    ns3.ns = TimedNs(phases, ns3.ns.load() if not ns3.loaded() else ns3.ns)
+    for cls, method, name in ((ns3.SimpleLink, '__init__', 'segment'),
+                              (ns3.CSMALink, '__init__', 'segment'),
+                              (ns3.WIFISegment, '__init__', 'segment'),
+                              (ns3.WIFISegment, 'addAp', 'segment'),
+                              (ns3.WIFISegment, 'addSta', 'segment'),
+                              (ns3.TBIntf, '__init__', 'intf'),
+                              (ns3.TBIntf, 'createTap', 'tap'),
+                              (ns3.TBIntf, 'nsInstall', 'tapbridge'),
+                              (ns3.TBIntf, 'namespaceMove', 'move')):
+        setattr(cls, method, phases.wrap(name, getattr(cls, method)))
+    ns3.start = phases.wrap('start', ns3.start)
+    if standIn:
+        ns3.quietRun = counted(phases, lambda cmd, **kwargs: '')
+        ns3.errRun = counted(phases, lambda *cmd, **kwargs: ('', '', 0))
+        ns3.moveIntf = counted(phases, lambda intf, dstNode, **kwargs: True)
+    else:
+        from mininet.node import Node
+        ns3.quietRun = counted(phases, ns3.quietRun)
+        ns3.errRun = counted(phases, ns3.errRun)
+        ns3.moveIntf = counted(phases, ns3.moveIntf)
+        Node.cmd = counted(phases, Node.cmd)
+
+
+# Topologies, each built on n + 1 nodes.
+
+def buildLinks(ns3, nodes):
+    """Chain of SimpleLinks."""
+    for node1, node2 in zip(nodes, nodes[1:]):
+        ns3.SimpleLink(node1, node2)
+
+
+def buildCsma(ns3, nodes):
+    """Chain of CSMALinks."""
+    for node1, node2 in zip(nodes, nodes[1:]):
+        ns3.CSMALink(node1, node2, DataRate='100Mbps', Delay='1us')
+
+
+def buildWlan(ns3, nodes):
+    """One AP and stations."""
+    segment = ns3.WIFISegment()
+    segment.addAp(nodes[0])
+    for node in nodes[1:]:
+        segment.addSta(node)
+
+
+def buildMixed(ns3, nodes):
+    """CSMA chain from the AP of a WLAN, half of the nodes each."""
+    half = (len(nodes) + 1) // 2
+    buildCsma(ns3, nodes[:half])
+    buildWlan(ns3, nodes[:1] + nodes[half:])
+
+
+topologies = {'links': buildLinks, 'csma': buildCsma, 'wlan': buildWlan, 'mixed': buildMixed}
+
+PHASES = ('hosts', 'segment', 'intf', 'tap', 'tapbridge', 'mobility', 'start', 'move')
+
+
+def run(ns3, phases, topology, size, standIn):
+    """Build, start, stop and clear one topology, return (totals, wall, peak RSS)."""
+    phases.totals = {}
+    net = None
+    wall = time.time()
+    with phases.phase('hosts'):
+        if standIn:
+            nodes = [StandInNode('h%d' % i, phases) for i in range(size + 1)]
+        else:
+            from mininet.net import Mininet
+            net = Mininet(controller=None)
+            nodes = [net.addHost('h%d' % i) for i in range(size + 1)]
+    try:
+        topologies[topology](ns3, nodes)
+        ns3.start()
+        wall = time.time() - wall
+    finally:
+        ns3.stop()
+        ns3.clear()
+        if net is not None:
+            net.stop()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return phases.totals, wall, peak
+
+
+def report(topology, size, totals, wall, peak):
+    print(f"\n{topology}, n={size}: {wall:.3f} s until started, peak RSS {peak / 2**20:.1f} MiB")
+    print(f"{'phase':<10} {'calls':>6} {'wall s':>9} {'own s':>9} {'own ms/call':>12} "
+          f"{'syscalls':>9} {'cmds':>6} {'RSS KiB':>9}")
+    for name in PHASES:
+        row = totals.get(name)
+        if row is None:
+            continue
+        syscalls = '-' if row['syscalls'] is None else row['syscalls']
+        print(f"{name:<10} {row['calls']:>6} {row['seconds']:>9.4f} {row['own']:>9.4f} "
+              f"{1000 * row['own'] / row['calls']:>12.3f} {syscalls:>9} {row['commands']:>6} "
+              f"{row['rss'] // 1024:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--ns', choices=('auto', 'real', 'stub'), default='auto',
+                        help='ns-3 bindings or stand-in namespace, default: bindings if installed')
+    parser.add_argument('--hosts', choices=('auto', 'mininet', 'standin'), default='auto',
+                        help='Mininet hosts or stand-in nodes, default: Mininet hosts as root')
+    parser.add_argument('--topologies', default='links,csma,wlan,mixed',
+                        help='comma separated topologies (%s)' % ', '.join(topologies))
+    parser.add_argument('--sizes', default='10,50,100',
+                        help='comma separated numbers of links or stations')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    useNs = args.ns
+    if useNs == 'auto':
+        useNs = 'real' if importlib.util.find_spec('ns') is not None else 'stub'
+    if useNs == 'stub':
+        installStandInNs()
+    hosts = args.hosts
+    if hosts == 'auto':
+        hosts = 'mininet' if os.geteuid() == 0 else 'standin'
+    if hosts == 'mininet' and os.geteuid() != 0:
+        print("ERROR: Mininet requires root")
+        sys.exit(1)
+    standIn = hosts == 'standin'
+
+    from mininet.log import setLogLevel
+    from mininet import ns3
+    setLogLevel('warning')
+    phases = Phases()
+    instrument(ns3, phases, standIn)
+    print(f"ns: {useNs}, hosts: {hosts}, Python {sys.version.split()[0]}")
+
+    results = []
+    for topology in args.topologies.split(','):
+        for size in [int(s) for s in args.sizes.split(',')]:
+            totals, wall, peak = run(ns3, phases, topology, size, standIn)
+            report(topology, size, totals, wall, peak)
+            results.append(dict(topology=topology, size=size, ns=useNs, hosts=hosts,
+                                wall=wall, peakRss=peak, phases=totals))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()